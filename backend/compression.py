@@ -0,0 +1,125 @@
+"""Response compression middleware (brotli when available, otherwise gzip).
+
+Starlette's GZipMiddleware has no way to skip bodies that are already
+compressed, so the gzip NDJSON export would be compressed twice. This one
+leaves alone responses that set Content-Encoding or carry an already-compressed
+media type, and passes small bodies through untouched. Streaming responses are
+compressed chunk by chunk with a sync flush so clients still see progress.
+
+Brotli comes from the `Brotli` package in requirements.txt; where it isn't
+installed, responses fall back to gzip and a warning is logged at startup.
+"""
+import logging
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SKIP_MEDIA_TYPES = ("application/gzip", "application/zip", "application/x-gzip", "image/", "video/", "audio/")
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._b = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self._b.process(data) + self._b.flush()
+
+    def finish(self, data=b""):
+        return self._b.process(data) + self._b.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, gzip_level=4, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        if brotli is None:  # the middleware stack is built once per app
+            logger.warning("Brotli package not installed; compressing responses with gzip only")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accept:
+            encoding = "br"
+        elif "gzip" in accept:
+            encoding = "gzip"
+        else:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSend(self, encoding, send))
+
+
+class _CompressingSend:
+    def __init__(self, config, encoding, send):
+        self.config = config
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.pending = []  # body chunks held back until we know whether minimum_size is reached
+        self.compressor = None
+        self.passthrough = False
+
+    def _new_compressor(self):
+        if self.encoding == "br":
+            return _Brotli(self.config.brotli_quality)
+        return _Gzip(self.config.gzip_level)
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.start is not None:
+            headers = Headers(raw=self.start["headers"])
+            if "content-encoding" in headers or headers.get("content-type", "").startswith(SKIP_MEDIA_TYPES):
+                self.passthrough = True
+                await self.send(self.start)
+                return await self.send(message)
+
+            self.pending.append(body)
+            body = b"".join(self.pending)
+            if more_body and len(body) < self.config.minimum_size:
+                return
+            start, self.start, self.pending = self.start, None, []
+            if not more_body and len(body) < self.config.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                return await self.send({"type": "http.response.body", "body": body})
+
+            self.compressor = self._new_compressor()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                return await self.send({"type": "http.response.body", "body": body})
+            await self.send(start)
+
+        data = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
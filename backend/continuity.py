@@ -0,0 +1,125 @@
+"""Ordered frame-continuity index for one project's shots.
+
+Shots are kept sorted by (shot_number, id). Each entry carries the neighbouring
+frames and its continuity issues, and a change to one shot only relinks the
+entries on either side of its old and new positions.
+"""
+from bisect import bisect_left
+
+CONTINUITY_FIELDS = ("shot_number", "description", "first_frame_url", "last_frame_url", "transition_in", "transition_out")
+
+# transition_out -> the transition_in the following shot needs to complete it
+PAIRED_TRANSITIONS = {
+    "fade_to_black": "fade_from_black",
+    "dissolve": "dissolve",
+    "match_cut": "match_cut",
+    "continuous": "continuous",
+}
+PAIRED_TRANSITIONS_IN = {v: k for k, v in PAIRED_TRANSITIONS.items()}
+
+
+def _entry(shot):
+    return {
+        "shot_id": shot["id"],
+        "shot_number": shot.get("shot_number", 0),
+        "description": shot.get("description", ""),
+        "first_frame_url": shot.get("first_frame_url", ""),
+        "last_frame_url": shot.get("last_frame_url", ""),
+        "transition_in": shot.get("transition_in", "cut"),
+        "transition_out": shot.get("transition_out", "cut"),
+    }
+
+
+def _key(entry):
+    return (entry["shot_number"], entry["shot_id"])
+
+
+def transition_issue(prev, cur):
+    """Describe a transition that one side sets up but the other doesn't complete, or None."""
+    out, into = prev["transition_out"], cur["transition_in"]
+    if out in PAIRED_TRANSITIONS and into != PAIRED_TRANSITIONS[out]:
+        return f"{out} followed by {into}"
+    if into in PAIRED_TRANSITIONS_IN and out != PAIRED_TRANSITIONS_IN[into]:
+        return f"{into} after {out}"
+    return None
+
+
+class ContinuityIndex:
+    def __init__(self, shots, revision=0):
+        self.revision = revision  # project revision the index is current for
+        self.entries = sorted((_entry(s) for s in shots), key=_key)
+        self.keys = [_key(e) for e in self.entries]
+        self.by_id = {e["shot_id"]: e for e in self.entries}
+        for i in range(len(self.entries)):
+            self._link(i)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _link(self, i):
+        if not 0 <= i < len(self.entries):
+            return
+        entry = self.entries[i]
+        prev = self.entries[i - 1] if i > 0 else None
+        nxt = self.entries[i + 1] if i < len(self.entries) - 1 else None
+        entry["prev_shot_last_frame"] = prev["last_frame_url"] if prev else ""
+        entry["next_shot_first_frame"] = nxt["first_frame_url"] if nxt else ""
+
+        issues = []
+        if not entry["first_frame_url"]:
+            issues.append({"type": "missing_first_frame"})
+        if not entry["last_frame_url"]:
+            issues.append({"type": "missing_last_frame"})
+        if prev:
+            if prev["shot_number"] == entry["shot_number"]:
+                issues.append({"type": "duplicate_shot_number", "other_shot_id": prev["shot_id"]})
+            mismatch = transition_issue(prev, entry)
+            if mismatch:
+                issues.append({"type": "transition_mismatch", "prev_shot_id": prev["shot_id"], "detail": mismatch})
+        entry["issues"] = issues
+
+    def _position(self, entry):
+        return bisect_left(self.keys, _key(entry))
+
+    def upsert(self, shot):
+        """Insert or update one shot. `shot` may be partial if the shot is already indexed."""
+        old = self.by_id.get(shot["id"])
+        if old:
+            i = self._position(old)
+            del self.entries[i], self.keys[i]
+            self._link(i - 1)
+            self._link(i)
+            shot = {"id": old["shot_id"], **{f: old[f] for f in CONTINUITY_FIELDS}, **{f: shot[f] for f in CONTINUITY_FIELDS if f in shot}}
+        entry = _entry(shot)
+        i = self._position(entry)
+        self.entries.insert(i, entry)
+        self.keys.insert(i, _key(entry))
+        self.by_id[entry["shot_id"]] = entry
+        for j in (i - 1, i, i + 1):
+            self._link(j)
+
+    def remove(self, shot_id):
+        entry = self.by_id.pop(shot_id, None)
+        if entry is None:
+            return
+        i = self._position(entry)
+        del self.entries[i], self.keys[i]
+        self._link(i - 1)
+        self._link(i)
+
+    def neighbours(self, shot_id):
+        """(previous shot's last frame, next shot's first frame) for a shot, or empty strings."""
+        entry = self.by_id.get(shot_id)
+        if entry is None:
+            return "", ""
+        return entry["prev_shot_last_frame"], entry["next_shot_first_frame"]
+
+    def chain(self):
+        return [{k: v for k, v in e.items() if k != "issues"} for e in self.entries]
+
+    def gaps(self):
+        report = []
+        for e in self.entries:
+            for issue in e["issues"]:
+                report.append({"shot_id": e["shot_id"], "shot_number": e["shot_number"], **issue})
+        return report
@@ -0,0 +1,134 @@
+"""LLM backends behind call_llm.
+
+`emergent` sends prompts to the hosted model through emergentintegrations' LlmChat.
+`local` never leaves the process: it answers with JSON shaped like the schema the
+system prompt asks for, after a simulated latency, and can be told to fail or to
+return malformed JSON at given rates. Its draws are seeded from the prompt and the
+attempt number, so a run is reproducible regardless of how calls interleave.
+
+The backend is chosen per call from the LLM_PROVIDER secret, then the LLM_PROVIDER
+environment variable (default `emergent`). The local backend reads LOCAL_LLM_*.
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+
+class LLMProvider(abc.ABC):
+    name = ""
+    requires_api_key = True
+
+    def route(self, provider, model):
+        """The (provider, model) that actually serves a request for `provider`/`model`."""
+        return provider, model
+
+    @abc.abstractmethod
+    async def complete(self, *, operation, provider, model, system_message, text, api_key, attempt):
+        """The raw response text for one attempt; raises on failure so call_llm can retry."""
+
+
+class EmergentProvider(LLMProvider):
+    name = "emergent"
+
+    async def complete(self, *, operation, provider, model, system_message, text, api_key, attempt):
+        session_id = f"{operation}-{os.urandom(8).hex()}"
+        chat = LlmChat(api_key=api_key, session_id=session_id, system_message=system_message).with_model(provider, model)
+        return await chat.send_message(UserMessage(text=text))
+
+
+class LocalProviderError(Exception):
+    pass
+
+
+def _json_template(system_message):
+    """The first JSON object in the prompt after the word JSON, or None."""
+    decoder = json.JSONDecoder()
+    start = system_message.find("JSON")
+    while start != -1:
+        brace = system_message.find("{", start)
+        if brace == -1:
+            return None
+        try:
+            template, _ = decoder.raw_decode(system_message, brace)
+            if isinstance(template, dict):
+                return template
+        except json.JSONDecodeError:
+            pass
+        start = system_message.find("JSON", brace)
+    return None
+
+
+def _fill(template, words, rng):
+    if isinstance(template, dict):
+        return {k: _fill(v, words, rng) if isinstance(v, (dict, list)) else f"{k}: {' '.join(rng.sample(words, min(len(words), 12)))}"
+                for k, v in template.items()}
+    return []
+
+
+class LocalProvider(LLMProvider):
+    """Deterministic in-process stand-in for load and failure testing."""
+    name = "local"
+    requires_api_key = False
+    DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(self, latency="lognormal", latency_ms=800.0, sigma=0.5, error_rate=0.0, malformed_rate=0.0, seed=0):
+        if latency not in self.DISTRIBUTIONS:
+            raise ValueError(f"LOCAL_LLM_LATENCY must be one of {', '.join(self.DISTRIBUTIONS)}")
+        self.latency, self.latency_ms, self.sigma = latency, latency_ms, sigma
+        self.error_rate, self.malformed_rate, self.seed = error_rate, malformed_rate, seed
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.environ.get("LOCAL_LLM_LATENCY", "lognormal"),
+            latency_ms=float(os.environ.get("LOCAL_LLM_LATENCY_MS", "800")),
+            sigma=float(os.environ.get("LOCAL_LLM_LATENCY_SIGMA", "0.5")),
+            error_rate=float(os.environ.get("LOCAL_LLM_ERROR_RATE", "0")),
+            malformed_rate=float(os.environ.get("LOCAL_LLM_MALFORMED_RATE", "0")),
+            seed=int(os.environ.get("LOCAL_LLM_SEED", "0")),
+        )
+
+    def route(self, provider, model):
+        return "local", model
+
+    def _delay(self, rng):
+        """Seconds to wait. latency_ms is the median for lognormal, the mean for the others."""
+        if self.latency == "fixed":
+            ms = self.latency_ms
+        elif self.latency == "uniform":
+            ms = rng.uniform(0, 2 * self.latency_ms)
+        elif self.latency == "exponential":
+            ms = rng.expovariate(1 / self.latency_ms) if self.latency_ms > 0 else 0
+        else:
+            ms = self.latency_ms * rng.lognormvariate(0, self.sigma)
+        return ms / 1000
+
+    async def complete(self, *, operation, provider, model, system_message, text, api_key, attempt):
+        digest = hashlib.sha256(f"{system_message}\x00{text}".encode()).hexdigest()
+        rng = random.Random(f"{self.seed}:{operation}:{digest}:{attempt}")
+        await asyncio.sleep(self._delay(rng))
+        if rng.random() < self.error_rate:
+            raise LocalProviderError(f"Simulated {operation} failure")
+
+        words = text.split()[-40:] or [operation]
+        template = _json_template(system_message)
+        body = json.dumps(_fill(template, words, rng) if template is not None else {"text": " ".join(words)})
+        if rng.random() < self.malformed_rate:
+            return body[: len(body) // 2]
+        return body
+
+
+_providers = {}
+
+
+def get_provider(name):
+    """Shared provider instance for `name`. Raises KeyError for unknown names."""
+    if name not in _providers:
+        factories = {"emergent": EmergentProvider, "local": LocalProvider.from_env}
+        _providers[name] = factories[name]()
+    return _providers[name]
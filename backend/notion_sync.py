@@ -0,0 +1,152 @@
+"""Rate-limited Notion API client used by the sync endpoints.
+
+Notion allows roughly 3 requests/second per integration. Every request goes
+through a shared token bucket, and 429/5xx responses and transport errors
+(timeouts, refused connections) are retried after the server's Retry-After (or
+an exponential backoff). Page creates are not idempotent, so they are only
+retried when Notion cannot have acted on them: a 429 or a failed connect. A 5xx
+or timeout may arrive after the page was committed. NOTION_API_BASE can point
+at a local stand-in server for testing.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+DEFAULT_NOTION_API_BASE = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CREATE_RETRY_STATUSES = {429}
+
+logger = logging.getLogger(__name__)
+
+
+class NotionError(Exception):
+    def __init__(self, status_code, body):
+        super().__init__(f"Notion API {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def defer(self, seconds):
+        """Drain the bucket and hold off all callers for `seconds` (used on 429)."""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class NotionClient:
+    """Async Notion client. Use as `async with NotionClient(token) as notion:`.
+
+    `transport` is passed to httpx (tests use an httpx.MockTransport); `backoff` is the first retry delay.
+    """
+
+    def __init__(self, token, base_url=None, rate=None, max_retries=5, timeout=30.0, backoff=1.0, transport=None):
+        # Read at construction time so values from backend/.env (loaded by server.py) apply
+        self.base_url = (base_url or os.environ.get("NOTION_API_BASE", DEFAULT_NOTION_API_BASE)).rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}", "Notion-Version": NOTION_VERSION, "Content-Type": "application/json"}
+        self.bucket = TokenBucket(rate or float(os.environ.get("NOTION_RATE_PER_SEC", "3")))
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.transport = transport
+        self.requests_sent = 0
+        self._http = None
+
+    async def __aenter__(self):
+        self._http = httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=self.timeout, transport=self.transport)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._http.aclose()
+
+    async def request(self, method, path, json=None, idempotent=True):
+        """Send one request, retrying rate-limited and transient failures. Returns the decoded JSON body.
+
+        With idempotent=False only failures Notion cannot have acted on (429, failed connects) are retried.
+        """
+        retry_statuses = RETRY_STATUSES if idempotent else CREATE_RETRY_STATUSES
+        retry_errors = httpx.TransportError if idempotent else httpx.ConnectError
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            self.requests_sent += 1
+            try:
+                resp = await self._http.request(method, path, json=json)
+            except retry_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.backoff * 2 ** attempt, 30)
+                logger.warning(f"Notion {method} {path} failed ({e!r}); retrying in {delay:g}s")
+                await asyncio.sleep(delay)
+                continue
+            if resp.status_code == 200:
+                return resp.json()
+            if resp.status_code not in retry_statuses or attempt == self.max_retries:
+                raise NotionError(resp.status_code, resp.text)
+            delay = _retry_after(resp) or min(self.backoff * 2 ** attempt, 30)
+            logger.warning(f"Notion {method} {path} returned {resp.status_code}; retrying in {delay:g}s")
+            if resp.status_code == 429:
+                self.bucket.defer(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def query_database(self, database_id, filter=None, sorts=None, page_size=100):
+        """Yield every page of a database query, following has_more/next_cursor."""
+        body = {"page_size": page_size}
+        if filter: body["filter"] = filter
+        if sorts: body["sorts"] = sorts
+        while True:
+            data = await self.request("POST", f"/databases/{database_id}/query", json=body)
+            for page in data.get("results", []):
+                yield page
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            body["start_cursor"] = data["next_cursor"]
+
+    async def index_by_text_property(self, database_id, prop="StoryForge ID"):
+        """Map the plain-text value of `prop` to page id for every page in the database."""
+        index = {}
+        async for page in self.query_database(database_id):
+            value = rich_text_value(page, prop)
+            if value:
+                index[value] = page["id"]
+        return index
+
+    async def create_page(self, database_id, properties):
+        return await self.request("POST", "/pages", json={"parent": {"database_id": database_id}, "properties": properties}, idempotent=False)
+
+    async def update_page(self, page_id, properties):
+        return await self.request("PATCH", f"/pages/{page_id}", json={"properties": properties})
+
+
+def rich_text_value(page, prop):
+    parts = page.get("properties", {}).get(prop, {}).get("rich_text", [])
+    return parts[0].get("text", {}).get("content", "") if parts else ""
+
+
+def _retry_after(resp):
+    try:
+        return max(float(resp.headers.get("Retry-After", "")), 0)
+    except ValueError:
+        return None
@@ -0,0 +1,45 @@
+"""Short-lived in-process snapshot of the secrets collection."""
+import asyncio
+import time
+
+
+class SecretsCache:
+    """Caches every key/value in `collection` for `ttl` seconds.
+
+    The collection only holds a handful of API keys, so one query refreshes the
+    whole snapshot. Writers in this process call invalidate() for immediate
+    effect; writes from other workers are picked up once the TTL lapses.
+    """
+
+    def __init__(self, collection, ttl=5.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._values = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def _snapshot(self):
+        if self._values is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._values
+        async with self._lock:
+            if self._values is None or time.monotonic() - self._loaded_at >= self.ttl:
+                # An invalidate() during the read means the result may predate that write; read again
+                while True:
+                    generation = self._generation
+                    values = await self._load()
+                    if generation == self._generation:
+                        break
+                self._values, self._loaded_at = values, time.monotonic()
+        return self._values
+
+    async def _load(self):
+        docs = await self.collection.find({}, {"_id": 0, "key": 1, "value": 1}).to_list(None)
+        return {d["key"]: d.get("value", "") for d in docs}
+
+    async def get(self, key, default=""):
+        return (await self._snapshot()).get(key) or default
+
+    def invalidate(self):
+        self._generation += 1
+        self._values = None
@@ -1,25 +1,49 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+import httpx
 import os
 import logging
+import re
+import time
+import base64
 import json
+import orjson
+import hashlib
+import zlib
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict
 import uuid
-from datetime import datetime, timezone
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import asyncio
+from datetime import datetime, timezone, timedelta
+from cache import TTLCache
+from secrets_cache import SecretsCache
+from continuity import CONTINUITY_FIELDS, ContinuityIndex
+from similarity import SimilarityIndex
+import llm_providers
+from compression import CompressionMiddleware
+from metrics import LLM_REQUEST_DURATION, MetricsMiddleware, MongoCommandMetrics, render_metrics
+from notion_sync import NotionClient, NotionError, rich_text_value
+from storage import MemoryClient, parse_text_search, text_tokens
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# STORAGE_ENGINE=memory keeps everything in process (storage.py): no MongoDB needed, nothing persisted
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "mongo")
+if STORAGE_ENGINE == "memory":
+    client = MemoryClient()
+else:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI(title="StoryForge API", description="AI Filmmaking Production Engine", version="1.0.0")
+app = FastAPI(title="StoryForge API", description="AI Filmmaking Production Engine", version="1.0.0", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 logger = logging.getLogger(__name__)
@@ -34,11 +58,20 @@ TRANSITION_TYPES = ["cut", "dissolve", "match_cut", "smash_cut", "fade_to_black"
 def utcnow(): return datetime.now(timezone.utc).isoformat()
 def new_id(): return str(uuid.uuid4())
 
+secrets_cache = SecretsCache(db.secrets, ttl=float(os.environ.get("SECRETS_CACHE_TTL_SEC", "5")))
+
 async def get_api_key():
-    secret = await db.secrets.find_one({"key": "EMERGENT_LLM_KEY"}, {"_id": 0})
-    if secret and secret.get("value"):
-        return secret["value"]
-    return os.environ.get("EMERGENT_LLM_KEY", "")
+    return await secrets_cache.get("EMERGENT_LLM_KEY") or os.environ.get("EMERGENT_LLM_KEY", "")
+
+async def get_llm_provider():
+    name = await secrets_cache.get("LLM_PROVIDER") or os.environ.get("LLM_PROVIDER", "emergent")
+    try:
+        return llm_providers.get_provider(name)
+    except KeyError:
+        raise HTTPException(400, f"Unknown LLM_PROVIDER '{name}' (expected emergent or local)")
+
+async def llm_configured():
+    return not (await get_llm_provider()).requires_api_key or bool(await get_api_key())
 
 # --- Pydantic Models ---
 class ProjectCreate(BaseModel):
@@ -159,6 +192,8 @@ class ShotUpdate(BaseModel):
     reference_images: Optional[List[str]] = None
     notes: Optional[str] = None
 
+SIMILAR_COMPILE_THRESHOLD = float(os.environ.get("SIMILAR_COMPILE_THRESHOLD", "0.8"))
+
 class CompileRequest(BaseModel):
     project_id: str
     scene_description: str
@@ -174,6 +209,9 @@ class CompileRequest(BaseModel):
     prev_shot_last_frame: str = ""
     next_shot_first_frame: str = ""
     shot_id: Optional[str] = None
+    force: bool = False
+    reuse_similar: bool = False  # serve the closest earlier compile with the same parameters instead of calling the LLM
+    similarity_threshold: float = Field(default=SIMILAR_COMPILE_THRESHOLD, ge=0.5, le=1.0)
 
 class ImageDescribeRequest(BaseModel):
     image_url: str
@@ -196,8 +234,75 @@ def clean_doc(doc):
 def clean_docs(docs):
     return [clean_doc(d) for d in docs]
 
+def fast_json(content, response: Response = None):
+    """Serialize plain Mongo documents straight to orjson, skipping FastAPI's jsonable_encoder pass.
+
+    Headers set on an injected `response` (e.g. X-Next-Cursor) are carried over.
+    """
+    result = ORJSONResponse(content)
+    if response is not None:
+        for key, value in response.headers.items():
+            if key != "content-length":
+                result.headers[key] = value
+    return result
+
+# ==================== LIST PAGINATION ====================
+# List endpoints take limit/after for keyset pagination on (sort field, id) and fields= for a
+# projection. Without limit the whole list is returned. When more rows remain, the cursor for the
+# next page is sent in the X-Next-Cursor header so the list bodies keep their shape.
+
+MAX_PAGE_SIZE = 1000
+
+class ListParams(BaseModel):
+    limit: Optional[int] = None
+    after: Optional[str] = None
+    fields: Optional[str] = None
+
+def list_params(limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None):
+    return ListParams(limit=limit, after=after, fields=fields)
+
+def encode_cursor(doc, sort_field):
+    return base64.urlsafe_b64encode(json.dumps([doc.get(sort_field), doc["id"]]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+    return value, last_id
+
+FIELD_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")  # top-level API fields only: no _id, $operators or dotted paths
+
+def list_projection(fields, sort_field):
+    if not fields:
+        return {"_id": 0}
+    keep = {f.strip() for f in fields.split(",") if f.strip()}
+    invalid = sorted(f for f in keep if not FIELD_NAME.match(f))
+    if invalid:
+        raise HTTPException(400, f"Invalid field name: {', '.join(invalid)}")
+    return {**{f: 1 for f in keep | {"id", sort_field}}, "_id": 0}
+
+async def find_page(coll, query, sort_field, direction, page: ListParams, response: Response):
+    if page.after:
+        value, last_id = decode_cursor(page.after)
+        op = "$gt" if direction == 1 else "$lt"
+        query = {"$and": [query, {"$or": [{sort_field: {op: value}}, {sort_field: value, "id": {op: last_id}}]}]}
+    cursor = coll.find(query, list_projection(page.fields, sort_field)).sort([(sort_field, direction), ("id", direction)])
+    if page.limit is None:
+        return await cursor.to_list(None)
+    docs = await cursor.limit(page.limit + 1).to_list(None)
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1], sort_field)
+    return docs
+
 # ==================== HEALTH & STARTUP ====================
 
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: request, Mongo command and LLM latency histograms for this worker."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @api_router.get("/health")
 async def health_check():
     try:
@@ -213,10 +318,27 @@ async def create_indexes():
     await db.characters.create_index([("project_id", 1), ("id", 1)])
     await db.objects.create_index([("project_id", 1), ("id", 1)])
     await db.scenes.create_index([("project_id", 1), ("scene_number", 1)])
+    await db.projects.create_index([("created_at", 1), ("id", 1)])
+    for coll in (db.worlds, db.characters, db.objects):
+        await coll.create_index([("project_id", 1), ("created_at", 1), ("id", 1)])
     await db.shots.create_index([("project_id", 1), ("scene_id", 1), ("shot_number", 1)])
     await db.shots.create_index([("project_id", 1), ("production_status", 1)])
+    await db.shots.create_index([("project_id", 1), ("shot_number", 1), ("id", 1)])
+    await db.scenes.create_index("id")  # parent lookups in the orphan GC
+    await db.shots.create_index("id")
+    await db.compilations.create_index("id")
     await db.compilations.create_index([("project_id", 1), ("shot_id", 1)])
+    await db.compilations.create_index([("prompt_hash", 1), ("timestamp", -1)])
+    await db.compilations.create_index([("project_id", 1), ("timestamp", -1), ("id", -1)])
+    await db.llm_calls.create_index([("project_id", 1), ("timestamp", 1)])
     await db.secrets.create_index("key", unique=True)
+    await db.project_stats.create_index("project_id", unique=True)
+    await db.notion_pages.create_index([("project_id", 1), ("shot_id", 1)], unique=True)
+    await db.notion_sync_log.create_index([("project_id", 1), ("action", 1), ("timestamp", -1)])
+    await db.compile_jobs.create_index("id", unique=True)
+    await db.compile_jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.compile_jobs.create_index([("project_id", 1), ("created_at", -1)])
+    await create_search_indexes()
     logger.info("MongoDB indexes created")
 
 # ==================== SECRETS MANAGEMENT ====================
@@ -229,13 +351,181 @@ async def list_secrets():
 @api_router.put("/secrets")
 async def update_secret(data: SecretUpdate):
     await db.secrets.update_one({"key": data.key}, {"$set": {"key": data.key, "value": data.value, "updated_at": utcnow()}}, upsert=True)
+    secrets_cache.invalidate()
     return {"status": "updated", "key": data.key}
 
 @api_router.delete("/secrets/{key}")
 async def delete_secret(key: str):
     await db.secrets.delete_one({"key": key})
+    secrets_cache.invalidate()
     return {"status": "deleted"}
 
+# ==================== PROJECT SUMMARIES ====================
+
+SUMMARY_COUNT_COLLECTIONS = {"world_count": "worlds", "character_count": "characters", "scene_count": "scenes", "object_count": "objects"}
+
+async def _count_by_project(coll, project_ids):
+    pipeline = [{"$match": {"project_id": {"$in": project_ids}}}, {"$group": {"_id": "$project_id", "n": {"$sum": 1}}}]
+    return {r["_id"]: r["n"] async for r in coll.aggregate(pipeline)}
+
+async def _shot_totals_by_project(project_ids):
+    pipeline = [
+        {"$match": {"project_id": {"$in": project_ids}}},
+        {"$group": {
+            "_id": {"project_id": "$project_id", "status": "$production_status"},
+            "n": {"$sum": 1},
+            "duration": {"$sum": {"$ifNull": ["$duration_target_sec", 0]}},
+        }},
+    ]
+    totals = {}
+    async for r in db.shots.aggregate(pipeline):
+        t = totals.setdefault(r["_id"]["project_id"], _empty_stats())
+        t["shot_count"] += r["n"]
+        t["total_duration"] += r["duration"]
+        if r["_id"].get("status") in t["stage_counts"]:
+            t["stage_counts"][r["_id"]["status"]] += r["n"]
+    return totals
+
+async def project_summaries(project_ids, detailed=False):
+    """Counts, completion % and duration for many projects with one $group pipeline per collection.
+
+    Shot totals come from the project_stats rollups. Returns {project_id: summary}.
+    Scene/object counts are only computed when detailed=True.
+    """
+    count_keys = ["world_count", "character_count"] + (["scene_count", "object_count"] if detailed else [])
+    results = await asyncio.gather(
+        get_project_stats(project_ids),
+        *[_count_by_project(db[SUMMARY_COUNT_COLLECTIONS[k]], project_ids) for k in count_keys],
+    )
+    shot_totals, counts = results[0], dict(zip(count_keys, results[1:]))
+    summaries = {}
+    for pid in project_ids:
+        t = shot_totals[pid]
+        summary = {k: counts[k].get(pid, 0) for k in count_keys}
+        summary["shot_count"] = t["shot_count"]
+        summary["completion_pct"] = round((t["stage_counts"]["final"] / t["shot_count"] * 100) if t["shot_count"] > 0 else 0, 1)
+        summary["total_duration"] = t["total_duration"]
+        summary["stage_counts"] = t["stage_counts"]
+        summaries[pid] = summary
+    return summaries
+
+# ==================== PROJECT STATS ROLLUPS ====================
+# One small project_stats doc per project ({shot_count, total_duration, stage_counts}),
+# kept current with $inc by every handler that creates, deletes or re-stages shots.
+# A project without a doc (created before rollups existed, or whose doc was lost) is rebuilt
+# from the shots collection instead, by readers and by the first write that touches it.
+
+def _empty_stats():
+    return {"shot_count": 0, "total_duration": 0, "stage_counts": {stage: 0 for stage in PRODUCTION_STAGES}}
+
+def _normalize_stats(doc):
+    stats = _empty_stats()
+    if doc:
+        stats["shot_count"] = doc.get("shot_count", 0)
+        stats["total_duration"] = doc.get("total_duration", 0)
+        for stage in PRODUCTION_STAGES:
+            stats["stage_counts"][stage] = (doc.get("stage_counts") or {}).get(stage, 0)
+    return stats
+
+async def inc_project_stats(project_id, shots=0, duration=0, stages=None):
+    """Atomically apply deltas to a project's rollup. Unknown stages are ignored.
+
+    Called after the shot write it describes, so when the project has no rollup yet a rebuild
+    from the shots collection already includes the change and the deltas are dropped.
+    """
+    inc = {}
+    if shots: inc["shot_count"] = shots
+    if duration: inc["total_duration"] = duration
+    for stage, n in (stages or {}).items():
+        if stage in PRODUCTION_STAGES and n:
+            inc[f"stage_counts.{stage}"] = n
+    if inc:
+        result = await db.project_stats.update_one({"project_id": project_id}, {"$inc": inc, "$set": {"updated_at": utcnow()}})
+        if result.matched_count == 0:
+            await rebuild_project_stats([project_id])
+
+async def apply_shot_stats(project_id, before=None, after=None):
+    """Roll up a shot going from `before` to `after`; pass None for the create/delete side."""
+    shots, duration, stages = 0, 0, {}
+    for shot, sign in ((before, -1), (after, 1)):
+        if shot is None: continue
+        shots += sign
+        duration += sign * (shot.get("duration_target_sec") or 0)
+        status = shot.get("production_status")
+        stages[status] = stages.get(status, 0) + sign
+    await inc_project_stats(project_id, shots, duration, stages)
+
+async def rebuild_project_stats(project_ids):
+    """Recompute rollups from the shots collection and overwrite them."""
+    totals = await _shot_totals_by_project(project_ids)
+    rebuilt = {}
+    for pid in project_ids:
+        stats = totals.get(pid) or _empty_stats()
+        await db.project_stats.replace_one({"project_id": pid}, {"project_id": pid, **stats, "updated_at": utcnow()}, upsert=True)
+        rebuilt[pid] = stats
+    return rebuilt
+
+async def get_project_stats(project_ids):
+    """Rollups for the given projects, building any that don't exist yet."""
+    stats = {d["project_id"]: _normalize_stats(d) async for d in db.project_stats.find({"project_id": {"$in": project_ids}}, {"_id": 0})}
+    missing = [pid for pid in project_ids if pid not in stats]
+    if missing:
+        stats.update(await rebuild_project_stats(missing))
+    return stats
+
+# ==================== PROJECT REVISIONS ====================
+# Every project carries a `revision` that goes up whenever anything in it may have changed: a
+# POST/PUT/PATCH/DELETE on a route under /api/projects/{project_id} bumps it unless it was rejected
+# with a 4xx, and background work bumps it explicitly. GETs under the same prefix answer with a revision-based ETag
+# and short-circuit If-None-Match with a 304 after one indexed lookup.
+
+PROJECT_PATH = re.compile(r"^/api/projects/([^/]+)(?:/|$)")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+async def bump_revision(project_id):
+    """Increment the project's revision. Callers must already have applied their own changes to in-process caches."""
+    project = await db.projects.find_one_and_update(
+        {"id": project_id}, {"$inc": {"revision": 1}}, projection={"_id": 0, "revision": 1}, return_document=ReturnDocument.AFTER,
+    )
+    if project is not None:
+        continuity_revision_bumped(project_id, project["revision"])
+
+def revision_etag(project_id, revision):
+    return f'W/"{project_id}:{revision}"'
+
+@app.middleware("http")
+async def project_revisions(request: Request, call_next):
+    match = PROJECT_PATH.match(request.url.path)
+    if not match:
+        return await call_next(request)
+    project_id = match.group(1)
+    if request.method in WRITE_METHODS:
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # A 4xx is rejected before anything is written; a handler that answers 5xx or raises may
+            # have written part of its changes, so those still bump. The router fills in path_params:
+            # routes without {project_id} (POST /projects/import) touch no existing project.
+            if not 400 <= status < 500 and "project_id" in request.scope.get("path_params", {}):
+                await bump_revision(project_id)
+    if request.method != "GET":
+        return await call_next(request)
+
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "revision": 1})
+    if project is None:
+        return await call_next(request)
+    etag = revision_etag(project_id, project.get("revision", 0))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
 # ==================== PROJECTS ====================
 
 @api_router.post("/projects")
@@ -248,57 +538,60 @@ async def create_project(data: ProjectCreate):
     return clean_doc(doc)
 
 @api_router.get("/projects")
-async def list_projects():
-    projects = await db.projects.find({}, {"_id": 0}).to_list(100)
+async def list_projects(response: Response, page: ListParams = Depends(list_params)):
+    projects = await find_page(db.projects, {}, "created_at", 1, page, response)
+    summaries = await project_summaries([p["id"] for p in projects])
     for p in projects:
-        pid = p["id"]
-        p["world_count"] = await db.worlds.count_documents({"project_id": pid})
-        p["character_count"] = await db.characters.count_documents({"project_id": pid})
-        p["shot_count"] = await db.shots.count_documents({"project_id": pid})
-        shots = await db.shots.find({"project_id": pid}, {"_id": 0, "production_status": 1, "duration_target_sec": 1}).to_list(1000)
-        total = len(shots)
-        done = sum(1 for s in shots if s.get("production_status") == "final")
-        p["completion_pct"] = round((done / total * 100) if total > 0 else 0, 1)
-        p["total_duration"] = sum(s.get("duration_target_sec", 0) for s in shots)
+        summary = summaries[p["id"]]
+        for key in ("world_count", "character_count", "shot_count", "completion_pct", "total_duration"):
+            p[key] = summary[key]
         p["target_duration_sec"] = p.get("target_duration_sec", 300)
-    return projects
+    return fast_json(projects, response)
 
 @api_router.get("/projects/{project_id}")
 async def get_project(project_id: str):
     doc = await db.projects.find_one({"id": project_id}, {"_id": 0})
     if not doc:
         raise HTTPException(404, "Project not found")
-    pid = project_id
-    doc["world_count"] = await db.worlds.count_documents({"project_id": pid})
-    doc["character_count"] = await db.characters.count_documents({"project_id": pid})
-    doc["shot_count"] = await db.shots.count_documents({"project_id": pid})
-    doc["scene_count"] = await db.scenes.count_documents({"project_id": pid})
-    doc["object_count"] = await db.objects.count_documents({"project_id": pid})
-    shots = await db.shots.find({"project_id": pid}, {"_id": 0, "production_status": 1, "duration_target_sec": 1}).to_list(1000)
-    done = sum(1 for s in shots if s.get("production_status") == "final")
-    doc["completion_pct"] = round((done / len(shots) * 100) if shots else 0, 1)
-    doc["total_duration"] = sum(s.get("duration_target_sec", 0) for s in shots)
-    doc["stage_counts"] = {stage: sum(1 for s in shots if s.get("production_status") == stage) for stage in PRODUCTION_STAGES}
+    summary = (await project_summaries([project_id], detailed=True))[project_id]
+    for key in ("world_count", "character_count", "shot_count", "scene_count", "object_count", "completion_pct", "total_duration", "stage_counts"):
+        doc[key] = summary[key]
     return doc
 
 @api_router.put("/projects/{project_id}")
 async def update_project(project_id: str, data: ProjectCreate):
     update = data.model_dump()
     update["updated_at"] = utcnow()
-    result = await db.projects.update_one({"id": project_id}, {"$set": update})
+    result = await db.projects.update_one({"id": project_id}, {"$set": update, "$inc": {"context_version": 1}})
+    invalidate_fragment("project", project_id)
     if result.matched_count == 0:
         raise HTTPException(404, "Project not found")
     return await get_project(project_id)
 
+PROJECT_CHILD_COLLECTIONS = ["worlds", "characters", "objects", "scenes", "shots", "compilations", "project_stats", "compile_jobs", "notion_pages", "notion_sync_log", "llm_calls"]
+background_deletes = set()
+
+async def cascade_delete_project(project_id):
+    results = await asyncio.gather(*[db[c].delete_many({"project_id": project_id}) for c in PROJECT_CHILD_COLLECTIONS])
+    return {c: r.deleted_count for c, r in zip(PROJECT_CHILD_COLLECTIONS, results)}
+
 @api_router.delete("/projects/{project_id}")
-async def delete_project(project_id: str):
-    for coll in [db.projects, db.worlds, db.characters, db.objects, db.scenes, db.shots, db.compilations]:
-        q = {"id": project_id} if coll == db.projects else {"project_id": project_id}
-        if coll == db.projects:
-            await coll.delete_one(q)
-        else:
-            await coll.delete_many(q)
-    return {"status": "deleted"}
+async def delete_project(project_id: str, background: bool = False):
+    """Delete a project and everything in it, clearing the child collections concurrently.
+
+    The project document goes first so the project disappears immediately. With background=true the
+    cascade runs after a 202 response; the orphan GC picks up anything an interrupted cascade leaves.
+    """
+    invalidate_fragment("project", project_id)
+    drop_continuity_index(project_id)
+    similarity_indexes.pop(project_id)
+    await db.projects.delete_one({"id": project_id})
+    if background:
+        task = asyncio.create_task(cascade_delete_project(project_id))
+        background_deletes.add(task)
+        task.add_done_callback(background_deletes.discard)
+        return JSONResponse({"status": "deleting", "project_id": project_id}, status_code=202)
+    return {"status": "deleted", "deleted": await cascade_delete_project(project_id)}
 
 # ==================== WORLDS ====================
 
@@ -308,12 +601,13 @@ async def create_world(project_id: str, data: WorldCreate):
     doc["id"] = new_id()
     doc["project_id"] = project_id
     doc["created_at"] = utcnow()
+    doc["updated_at"] = doc["created_at"]
     await db.worlds.insert_one(doc)
     return clean_doc(doc)
 
 @api_router.get("/projects/{project_id}/worlds")
-async def list_worlds(project_id: str):
-    return clean_docs(await db.worlds.find({"project_id": project_id}, {"_id": 0}).to_list(500))
+async def list_worlds(project_id: str, response: Response, page: ListParams = Depends(list_params)):
+    return fast_json(await find_page(db.worlds, {"project_id": project_id}, "created_at", 1, page, response), response)
 
 @api_router.get("/projects/{project_id}/worlds/{world_id}")
 async def get_world(project_id: str, world_id: str):
@@ -323,13 +617,20 @@ async def get_world(project_id: str, world_id: str):
 
 @api_router.put("/projects/{project_id}/worlds/{world_id}")
 async def update_world(project_id: str, world_id: str, data: WorldCreate):
-    result = await db.worlds.update_one({"id": world_id, "project_id": project_id}, {"$set": data.model_dump()})
+    result = await db.worlds.update_one({"id": world_id, "project_id": project_id}, {"$set": {**data.model_dump(), "updated_at": utcnow()}})
+    invalidate_fragment("world", world_id)
     if result.matched_count == 0: raise HTTPException(404, "World not found")
+    await bump_context_version(project_id)
     return await get_world(project_id, world_id)
 
 @api_router.delete("/projects/{project_id}/worlds/{world_id}")
 async def delete_world(project_id: str, world_id: str):
-    await db.worlds.delete_one({"id": world_id, "project_id": project_id})
+    await asyncio.gather(
+        db.worlds.delete_one({"id": world_id, "project_id": project_id}),
+        db.scenes.update_many({"project_id": project_id, "world_id": world_id}, {"$set": {"world_id": None}}),
+    )
+    invalidate_fragment("world", world_id)
+    await bump_context_version(project_id)
     return {"status": "deleted"}
 
 # ==================== CHARACTERS ====================
@@ -340,12 +641,13 @@ async def create_character(project_id: str, data: CharacterCreate):
     doc["id"] = new_id()
     doc["project_id"] = project_id
     doc["created_at"] = utcnow()
+    doc["updated_at"] = doc["created_at"]
     await db.characters.insert_one(doc)
     return clean_doc(doc)
 
 @api_router.get("/projects/{project_id}/characters")
-async def list_characters(project_id: str):
-    return clean_docs(await db.characters.find({"project_id": project_id}, {"_id": 0}).to_list(500))
+async def list_characters(project_id: str, response: Response, page: ListParams = Depends(list_params)):
+    return fast_json(await find_page(db.characters, {"project_id": project_id}, "created_at", 1, page, response), response)
 
 @api_router.get("/projects/{project_id}/characters/{char_id}")
 async def get_character(project_id: str, char_id: str):
@@ -355,13 +657,20 @@ async def get_character(project_id: str, char_id: str):
 
 @api_router.put("/projects/{project_id}/characters/{char_id}")
 async def update_character(project_id: str, char_id: str, data: CharacterCreate):
-    result = await db.characters.update_one({"id": char_id, "project_id": project_id}, {"$set": data.model_dump()})
+    result = await db.characters.update_one({"id": char_id, "project_id": project_id}, {"$set": {**data.model_dump(), "updated_at": utcnow()}})
+    invalidate_fragment("character", char_id)
     if result.matched_count == 0: raise HTTPException(404, "Character not found")
+    await bump_context_version(project_id)
     return await get_character(project_id, char_id)
 
 @api_router.delete("/projects/{project_id}/characters/{char_id}")
 async def delete_character(project_id: str, char_id: str):
-    await db.characters.delete_one({"id": char_id, "project_id": project_id})
+    await asyncio.gather(
+        db.characters.delete_one({"id": char_id, "project_id": project_id}),
+        db.scenes.update_many({"project_id": project_id, "character_ids": char_id}, {"$pull": {"character_ids": char_id}}),
+    )
+    invalidate_fragment("character", char_id)
+    await bump_context_version(project_id)
     return {"status": "deleted"}
 
 # ==================== OBJECTS/PROPS ====================
@@ -376,8 +685,8 @@ async def create_object(project_id: str, data: ObjectCreate):
     return clean_doc(doc)
 
 @api_router.get("/projects/{project_id}/objects")
-async def list_objects(project_id: str):
-    return clean_docs(await db.objects.find({"project_id": project_id}, {"_id": 0}).to_list(500))
+async def list_objects(project_id: str, response: Response, page: ListParams = Depends(list_params)):
+    return fast_json(await find_page(db.objects, {"project_id": project_id}, "created_at", 1, page, response), response)
 
 @api_router.get("/projects/{project_id}/objects/{obj_id}")
 async def get_object(project_id: str, obj_id: str):
@@ -408,11 +717,16 @@ async def create_scene(project_id: str, data: SceneCreate):
     return clean_doc(doc)
 
 @api_router.get("/projects/{project_id}/scenes")
-async def list_scenes(project_id: str):
-    scenes = clean_docs(await db.scenes.find({"project_id": project_id}, {"_id": 0}).sort("scene_number", 1).to_list(500))
+async def list_scenes(project_id: str, response: Response, page: ListParams = Depends(list_params)):
+    scenes = await find_page(db.scenes, {"project_id": project_id}, "scene_number", 1, page, response)
+    counts = await db.shots.aggregate([
+        {"$match": {"project_id": project_id, "scene_id": {"$in": [s["id"] for s in scenes]}}},
+        {"$group": {"_id": "$scene_id", "n": {"$sum": 1}}},
+    ]).to_list(None)
+    counts = {c["_id"]: c["n"] for c in counts}
     for s in scenes:
-        s["shot_count"] = await db.shots.count_documents({"scene_id": s["id"], "project_id": project_id})
-    return scenes
+        s["shot_count"] = counts.get(s["id"], 0)
+    return fast_json(scenes, response)
 
 @api_router.get("/projects/{project_id}/scenes/{scene_id}")
 async def get_scene(project_id: str, scene_id: str):
@@ -429,7 +743,14 @@ async def update_scene(project_id: str, scene_id: str, data: SceneCreate):
 @api_router.delete("/projects/{project_id}/scenes/{scene_id}")
 async def delete_scene(project_id: str, scene_id: str):
     await db.scenes.delete_one({"id": scene_id, "project_id": project_id})
-    await db.shots.delete_many({"scene_id": scene_id, "project_id": project_id})
+    scene_shots = {"scene_id": scene_id, "project_id": project_id}
+    removed = await db.shots.aggregate([
+        {"$match": scene_shots},
+        {"$group": {"_id": "$production_status", "n": {"$sum": 1}, "duration": {"$sum": {"$ifNull": ["$duration_target_sec", 0]}}}},
+    ]).to_list(None)
+    await db.shots.delete_many(scene_shots)
+    drop_continuity_index(project_id)
+    await inc_project_stats(project_id, shots=-sum(g["n"] for g in removed), duration=-sum(g["duration"] for g in removed), stages={g["_id"]: -g["n"] for g in removed})
     return {"status": "deleted"}
 
 # ==================== SHOTS ====================
@@ -442,14 +763,16 @@ async def create_shot(project_id: str, data: ShotCreate):
     doc["created_at"] = utcnow()
     doc["ai_generation_log"] = []
     await db.shots.insert_one(doc)
+    await apply_shot_stats(project_id, after=doc)
+    continuity_changed(project_id, upserts=[doc])
     return clean_doc(doc)
 
 @api_router.get("/projects/{project_id}/shots")
-async def list_shots(project_id: str, scene_id: Optional[str] = None, status: Optional[str] = None):
+async def list_shots(project_id: str, response: Response, scene_id: Optional[str] = None, status: Optional[str] = None, page: ListParams = Depends(list_params)):
     query = {"project_id": project_id}
     if scene_id: query["scene_id"] = scene_id
     if status: query["production_status"] = status
-    return clean_docs(await db.shots.find(query, {"_id": 0}).sort("shot_number", 1).to_list(1000))
+    return fast_json(await find_page(db.shots, query, "shot_number", 1, page, response), response)
 
 @api_router.get("/projects/{project_id}/shots/{shot_id}")
 async def get_shot(project_id: str, shot_id: str):
@@ -461,34 +784,56 @@ async def get_shot(project_id: str, shot_id: str):
 async def update_shot(project_id: str, shot_id: str, data: ShotUpdate):
     update = {k: v for k, v in data.model_dump(exclude_unset=True).items()}
     if not update: raise HTTPException(400, "No fields to update")
-    result = await db.shots.update_one({"id": shot_id, "project_id": project_id}, {"$set": update})
-    if result.matched_count == 0: raise HTTPException(404, "Shot not found")
-    return await get_shot(project_id, shot_id)
+    before = await db.shots.find_one_and_update(
+        {"id": shot_id, "project_id": project_id}, {"$set": update},
+        projection={"_id": 0, "production_status": 1, "duration_target_sec": 1}, return_document=ReturnDocument.BEFORE,
+    )
+    if before is None: raise HTTPException(404, "Shot not found")
+    if "production_status" in update or "duration_target_sec" in update:
+        await apply_shot_stats(project_id, before=before, after={**before, **update})
+    shot = await get_shot(project_id, shot_id)
+    continuity_changed(project_id, upserts=[shot])
+    return shot
 
 @api_router.patch("/projects/{project_id}/shots/{shot_id}/status")
 async def update_shot_status(project_id: str, shot_id: str, status: str = Query(...)):
     if status not in PRODUCTION_STAGES:
         raise HTTPException(400, f"Invalid status. Must be one of: {PRODUCTION_STAGES}")
-    result = await db.shots.update_one({"id": shot_id, "project_id": project_id}, {"$set": {"production_status": status}})
-    if result.matched_count == 0: raise HTTPException(404, "Shot not found")
+    before = await db.shots.find_one_and_update(
+        {"id": shot_id, "project_id": project_id}, {"$set": {"production_status": status}},
+        projection={"_id": 0, "production_status": 1}, return_document=ReturnDocument.BEFORE,
+    )
+    if before is None: raise HTTPException(404, "Shot not found")
+    if before.get("production_status") != status:
+        await inc_project_stats(project_id, stages={before.get("production_status"): -1, status: 1})
     return {"status": "updated", "new_status": status}
 
 @api_router.post("/projects/{project_id}/shots/batch-status")
 async def batch_update_status(project_id: str, data: BatchStatusUpdate):
     if data.status not in PRODUCTION_STAGES:
         raise HTTPException(400, f"Invalid status")
-    result = await db.shots.update_many(
-        {"id": {"$in": data.shot_ids}, "project_id": project_id},
-        {"$set": {"production_status": data.status}}
-    )
-    return {"status": "updated", "modified": result.modified_count}
+    # Update one previous-status bucket at a time so each modified_count is an exact rollup delta.
+    query = {"id": {"$in": data.shot_ids}, "project_id": project_id}
+    modified = 0
+    for old_status in await db.shots.distinct("production_status", {**query, "production_status": {"$ne": data.status}}):
+        result = await db.shots.update_many({**query, "production_status": old_status}, {"$set": {"production_status": data.status}})
+        await inc_project_stats(project_id, stages={old_status: -result.modified_count, data.status: result.modified_count})
+        modified += result.modified_count
+    # Shots without a status field aren't counted in any stage yet
+    result = await db.shots.update_many({**query, "production_status": {"$ne": data.status}}, {"$set": {"production_status": data.status}})
+    await inc_project_stats(project_id, stages={data.status: result.modified_count})
+    modified += result.modified_count
+    return {"status": "updated", "modified": modified}
 
 @api_router.delete("/projects/{project_id}/shots/{shot_id}")
 async def delete_shot(project_id: str, shot_id: str):
-    await db.shots.delete_one({"id": shot_id, "project_id": project_id})
+    deleted = await db.shots.find_one_and_delete({"id": shot_id, "project_id": project_id}, projection={"_id": 0, "production_status": 1, "duration_target_sec": 1})
+    if deleted:
+        await apply_shot_stats(project_id, before=deleted)
+        continuity_changed(project_id, removed=[shot_id])
     return {"status": "deleted"}
 
-# ==================== SHOT REORDER ====================
+# ==================== SHOT REORDER & BULK EDIT ====================
 
 class ShotReorder(BaseModel):
     shot_ids: List[str]
@@ -496,23 +841,77 @@ class ShotReorder(BaseModel):
 @api_router.post("/projects/{project_id}/shots/reorder")
 async def reorder_shots(project_id: str, data: ShotReorder):
     """Reorder shots - shot_ids list defines the new order (index+1 = shot_number)."""
-    for i, sid in enumerate(data.shot_ids):
-        await db.shots.update_one({"id": sid, "project_id": project_id}, {"$set": {"shot_number": i + 1}})
+    if data.shot_ids:
+        await db.shots.bulk_write(
+            [UpdateOne({"id": sid, "project_id": project_id}, {"$set": {"shot_number": i + 1}}) for i, sid in enumerate(data.shot_ids)],
+            ordered=False,
+        )
+        continuity_changed(project_id, upserts=[{"id": sid, "shot_number": i + 1} for i, sid in enumerate(data.shot_ids)])
     return {"status": "reordered", "count": len(data.shot_ids)}
 
+class ShotBulkItem(ShotUpdate):
+    id: str
+
+class ShotBulkUpdate(BaseModel):
+    updates: List[ShotBulkItem]
+
+@api_router.patch("/projects/{project_id}/shots/bulk")
+async def bulk_update_shots(project_id: str, data: ShotBulkUpdate):
+    """Apply per-shot field updates in one unordered bulk_write. Results follow the order of `updates`."""
+    ids = list({item.id for item in data.updates})
+    current = {s["id"]: s async for s in db.shots.find(
+        {"project_id": project_id, "id": {"$in": ids}}, {"_id": 0, "id": 1, "production_status": 1, "duration_target_sec": 1}
+    )}
+
+    ops, results, changed = [], [], []
+    duration_delta, stages_delta = 0, {}
+    for item in data.updates:
+        update = item.model_dump(exclude_unset=True, exclude={"id"})
+        if item.id not in current:
+            results.append({"id": item.id, "error": "Shot not found"}); continue
+        if not update:
+            results.append({"id": item.id, "error": "No fields to update"}); continue
+        if "production_status" in update and update["production_status"] not in PRODUCTION_STAGES:
+            results.append({"id": item.id, "error": f"Invalid status. Must be one of: {PRODUCTION_STAGES}"}); continue
+        ops.append(UpdateOne({"id": item.id, "project_id": project_id}, {"$set": update}))
+        changed.append({"id": item.id, **update})
+        results.append({"id": item.id, "status": "updated", "fields": sorted(update)})
+        before = current[item.id]
+        after = current[item.id] = {**before, **update}
+        duration_delta += (after.get("duration_target_sec") or 0) - (before.get("duration_target_sec") or 0)
+        for status, sign in ((before.get("production_status"), -1), (after.get("production_status"), 1)):
+            stages_delta[status] = stages_delta.get(status, 0) + sign
+
+    modified = 0
+    if ops:
+        # Repeated ids must apply in request order to match the rollup deltas computed above
+        has_repeats = len(ops) != len({r["id"] for r in results if "error" not in r})
+        modified = (await db.shots.bulk_write(ops, ordered=has_repeats)).modified_count
+        await inc_project_stats(project_id, duration=duration_delta, stages=stages_delta)
+        continuity_changed(project_id, upserts=changed)
+    return {"status": "updated", "modified": modified, "results": results}
+
 # ==================== BATCH COMPILE ====================
 
+BATCH_COMPILE_CONCURRENCY = int(os.environ.get("BATCH_COMPILE_CONCURRENCY", "4"))
+BATCH_COMPILE_TIMEOUT_SEC = float(os.environ.get("BATCH_COMPILE_TIMEOUT_SEC", "120"))
+
 class BatchCompileRequest(BaseModel):
     shot_ids: List[str]
+    concurrency: int = Field(default=BATCH_COMPILE_CONCURRENCY, ge=1, le=16)
+    timeout_sec: float = Field(default=BATCH_COMPILE_TIMEOUT_SEC, gt=0)
+    background: bool = False
+    force: bool = False
 
-@api_router.post("/projects/{project_id}/batch-compile")
-async def batch_compile(project_id: str, data: BatchCompileRequest):
-    """Compile multiple shots at once. Returns list of results."""
+async def load_batch_context(project_id, shot_ids):
+    """The batch's shots plus scene/world lookups and the continuity index shared by every shot in it.
+
+    Also primes the compiler's context fragments so per-shot compiles don't hit the DB for them.
+    """
     project = await db.projects.find_one({"id": project_id}, {"_id": 0})
     if not project: raise HTTPException(404, "Project not found")
 
-    all_shots = clean_docs(await db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(1000))
-    shot_index = {s["id"]: (i, s) for i, s in enumerate(all_shots)}
+    shots = {s["id"]: s async for s in db.shots.find({"project_id": project_id, "id": {"$in": list(shot_ids)}}, {"_id": 0})}
     scenes_map = {}
     for sc in clean_docs(await db.scenes.find({"project_id": project_id}, {"_id": 0}).to_list(100)):
         scenes_map[sc["id"]] = sc
@@ -520,44 +919,224 @@ async def batch_compile(project_id: str, data: BatchCompileRequest):
     for w in clean_docs(await db.worlds.find({"project_id": project_id}, {"_id": 0}).to_list(100)):
         worlds_map[w["id"]] = w
     chars = clean_docs(await db.characters.find({"project_id": project_id}, {"_id": 0}).to_list(100))
+    prime_context_fragments(project, worlds_map.values(), chars)
+    continuity = await get_continuity_index(project_id)
+    return {"project": project, "shots": shots, "scenes_map": scenes_map, "worlds_map": worlds_map, "continuity": continuity}
+
+async def compile_batch_shot(project_id, sid, ctx, timeout_sec, force=False):
+    """Compile one shot of a batch. Never raises: failures become an `error` entry."""
+    if sid not in ctx["shots"]:
+        return {"shot_id": sid, "error": "Shot not found"}
+
+    shot = ctx["shots"][sid]
+    scene = ctx["scenes_map"].get(shot.get("scene_id", ""), {})
+    prev_frame, next_frame = ctx["continuity"].neighbours(sid)
+
+    compile_data = CompileRequest(
+        project_id=project_id,
+        scene_description=shot.get("description", ""),
+        world_id=scene.get("world_id", ""),
+        character_ids=scene.get("character_ids", []),
+        emotional_zone=scene.get("emotional_zone", "contemplative"),
+        framing=shot.get("framing", "medium"),
+        camera_movement=shot.get("camera_movement", "static"),
+        reference_images=shot.get("reference_images", []),
+        prev_shot_last_frame=prev_frame,
+        next_shot_first_frame=next_frame,
+        shot_id=sid,
+        force=force,
+    )
 
-    results = []
-    api_key = await get_api_key()
-    if not api_key:
+    try:
+        result = await asyncio.wait_for(compile_scene(project_id, compile_data), timeout=timeout_sec)
+        return {"shot_id": sid, "shot_number": shot["shot_number"], **result}
+    except asyncio.TimeoutError:
+        return {"shot_id": sid, "shot_number": shot["shot_number"], "error": f"Compilation timed out after {timeout_sec:g}s"}
+    except Exception as e:
+        return {"shot_id": sid, "shot_number": shot["shot_number"], "error": str(e)}
+
+@api_router.post("/projects/{project_id}/batch-compile")
+async def batch_compile(project_id: str, data: BatchCompileRequest):
+    """Compile multiple shots at once, up to `concurrency` in flight. Results keep the order of shot_ids.
+
+    With background=true the batch is queued as a compile job and its id is returned immediately.
+    """
+    ctx = await load_batch_context(project_id, data.shot_ids)
+
+    if not await llm_configured():
         raise HTTPException(400, "No API key configured")
 
-    for sid in data.shot_ids:
-        if sid not in shot_index:
-            results.append({"shot_id": sid, "error": "Shot not found"})
-            continue
+    if data.background:
+        job = await enqueue_compile_job(project_id, data)
+        return {"status": "queued", "job_id": job["id"], "total": job["total"]}
 
-        idx, shot = shot_index[sid]
-        scene = scenes_map.get(shot.get("scene_id", ""), {})
-        world = worlds_map.get(scene.get("world_id", ""), {})
-        prev_frame = all_shots[idx-1].get("last_frame_url", "") if idx > 0 else ""
-        next_frame = all_shots[idx+1].get("first_frame_url", "") if idx < len(all_shots)-1 else ""
-
-        compile_data = CompileRequest(
-            project_id=project_id,
-            scene_description=shot.get("description", ""),
-            world_id=scene.get("world_id", ""),
-            character_ids=scene.get("character_ids", []),
-            emotional_zone=scene.get("emotional_zone", "contemplative"),
-            framing=shot.get("framing", "medium"),
-            camera_movement=shot.get("camera_movement", "static"),
-            reference_images=shot.get("reference_images", []),
-            prev_shot_last_frame=prev_frame,
-            next_shot_first_frame=next_frame,
-            shot_id=sid,
-        )
+    semaphore = asyncio.Semaphore(data.concurrency)
+
+    async def compile_one(sid):
+        async with semaphore:
+            return await compile_batch_shot(project_id, sid, ctx, data.timeout_sec, data.force)
+
+    results = await asyncio.gather(*[compile_one(sid) for sid in data.shot_ids])
+    return {"status": "batch_compiled", "results": results, "total": len(results)}
 
+# ==================== BATCH COMPILE JOBS ====================
+# Background batches live in compile_jobs and are drained by an in-process worker pool.
+# Per-shot results are written as they finish, and a running job holds a lease that its
+# worker keeps renewing, so a job orphaned by a restart is picked up again once the lease
+# lapses and only its unfinished shots are compiled. Each claim writes a fresh lease_owner
+# token and every later write to the job matches on it, so a worker whose lease was taken
+# over stops instead of recording results next to the new owner's.
+
+COMPILE_JOB_WORKERS = int(os.environ.get("COMPILE_JOB_WORKERS", "2"))
+COMPILE_JOB_LEASE_SEC = 60
+COMPILE_JOB_POLL_SEC = 15
+
+job_queue: Optional[asyncio.Queue] = None
+job_worker_tasks: List[asyncio.Task] = []
+
+def _lease_deadline():
+    return (datetime.now(timezone.utc) + timedelta(seconds=COMPILE_JOB_LEASE_SEC)).isoformat()
+
+async def enqueue_compile_job(project_id, data: BatchCompileRequest):
+    shot_ids = list(dict.fromkeys(data.shot_ids))
+    job = {
+        "id": new_id(), "project_id": project_id, "status": "queued",
+        "shot_ids": shot_ids, "concurrency": data.concurrency, "timeout_sec": data.timeout_sec, "force": data.force,
+        "total": len(shot_ids), "completed": 0, "failed": 0, "results": [],
+        "error": "", "lease_expires_at": "", "lease_owner": "", "created_at": utcnow(), "updated_at": utcnow(),
+        "started_at": "", "finished_at": "",
+    }
+    await db.compile_jobs.insert_one(job)
+    if job_queue is not None:
+        job_queue.put_nowait(job["id"])
+    return clean_doc(job)
+
+async def claim_compile_job(job_id):
+    """Take ownership of a queued job, or of a running one whose lease has lapsed."""
+    return await db.compile_jobs.find_one_and_update(
+        {"id": job_id, "$or": [{"status": "queued"}, {"status": "running", "lease_expires_at": {"$lt": utcnow()}}]},
+        {"$set": {"status": "running", "lease_expires_at": _lease_deadline(), "lease_owner": new_id(), "updated_at": utcnow()}},
+        projection={"_id": 0}, return_document=ReturnDocument.AFTER,
+    )
+
+async def run_compile_job(job):
+    job_id, project_id = job["id"], job["project_id"]
+    owned = {"id": job_id, "lease_owner": job["lease_owner"]}
+    lease_lost = asyncio.Event()
+
+    async def update_job(update, **filters):
+        """Apply `update` if this worker still owns the job; returns whether it matched."""
+        matched = (await db.compile_jobs.update_one({**owned, **filters}, update)).matched_count
+        if not matched and not await db.compile_jobs.count_documents(owned, limit=1):
+            lease_lost.set()
+        return matched
+
+    if not job.get("started_at"):
+        await update_job({"$set": {"started_at": utcnow()}})
+
+    async def renew_lease():
+        renewed = time.monotonic()
+        while not lease_lost.is_set():
+            await asyncio.sleep(COMPILE_JOB_LEASE_SEC / 3)
+            try:
+                await update_job({"$set": {"lease_expires_at": _lease_deadline()}})
+                renewed = time.monotonic()
+            except Exception as e:
+                logger.error(f"Compile job {job_id} lease renewal failed: {e}")
+                # Once the last renewed lease has lapsed another worker may claim the job; stop rather than race it
+                if time.monotonic() - renewed >= COMPILE_JOB_LEASE_SEC:
+                    lease_lost.set()
+
+    heartbeat = asyncio.create_task(renew_lease())
+    finished = False
+    try:
+        done = {r["shot_id"] for r in job.get("results", [])}
+        pending = [sid for sid in job["shot_ids"] if sid not in done]
+        ctx = await load_batch_context(project_id, pending)
+        semaphore = asyncio.Semaphore(job.get("concurrency", BATCH_COMPILE_CONCURRENCY))
+
+        async def run_one(sid):
+            async with semaphore:
+                if lease_lost.is_set():
+                    return
+                result = await compile_batch_shot(project_id, sid, ctx, job.get("timeout_sec", BATCH_COMPILE_TIMEOUT_SEC), job.get("force", False))
+            recorded = await update_job(
+                {"$push": {"results": result}, "$set": {"updated_at": utcnow()}, "$inc": {"completed": 1, "failed": 1 if result.get("error") else 0}},
+                **{"results.shot_id": {"$ne": sid}},
+            )
+            if recorded:
+                await bump_revision(project_id)
+
+        await asyncio.gather(*[run_one(sid) for sid in pending])
+        if not lease_lost.is_set():
+            finished = await update_job({"$set": {"status": "completed", "finished_at": utcnow(), "updated_at": utcnow()}})
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Compile job {job_id} failed: {detail}")
+        finished = await update_job({"$set": {"status": "failed", "error": detail, "finished_at": utcnow(), "updated_at": utcnow()}})
+    finally:
+        if lease_lost.is_set():
+            logger.warning(f"Compile job {job_id} lost its lease; stopped and left it to the new owner")
+        heartbeat.cancel()
+        # Recorded results bumped as they landed; the final status only counts if this worker wrote it
+        if finished:
+            await bump_revision(project_id)
+
+async def compile_job_worker():
+    while True:
         try:
-            result = await compile_scene(project_id, compile_data)
-            results.append({"shot_id": sid, "shot_number": shot["shot_number"], **result})
+            job_id = await asyncio.wait_for(job_queue.get(), timeout=COMPILE_JOB_POLL_SEC)
+        except asyncio.TimeoutError:
+            # Pick up jobs queued by other processes or orphaned by a crashed worker
+            try:
+                await requeue_unfinished_jobs()
+            except Exception as e:
+                logger.error(f"Compile job poll failed: {e}")
+            continue
+        try:
+            job = await claim_compile_job(job_id)
+            if job:
+                await run_compile_job(job)
         except Exception as e:
-            results.append({"shot_id": sid, "shot_number": shot["shot_number"], "error": str(e)})
+            logger.error(f"Compile job worker error on {job_id}: {e}")
 
-    return {"status": "batch_compiled", "results": results, "total": len(results)}
+async def requeue_unfinished_jobs():
+    unfinished = await db.compile_jobs.find(
+        {"$or": [{"status": "queued"}, {"status": "running", "lease_expires_at": {"$lt": utcnow()}}]}, {"_id": 0, "id": 1}
+    ).sort("created_at", 1).to_list(100)
+    for j in unfinished:
+        job_queue.put_nowait(j["id"])
+
+@app.on_event("startup")
+async def start_compile_job_workers():
+    global job_queue
+    job_queue = asyncio.Queue()
+    await requeue_unfinished_jobs()
+    job_worker_tasks.extend(asyncio.create_task(compile_job_worker()) for _ in range(COMPILE_JOB_WORKERS))
+
+@app.on_event("shutdown")
+async def stop_compile_job_workers():
+    for task in job_worker_tasks:
+        task.cancel()
+
+def _job_view(job):
+    results = {r["shot_id"]: r for r in job.get("results", [])}
+    job["results"] = [results[sid] for sid in job["shot_ids"] if sid in results]
+    job["progress_pct"] = round((job["completed"] / job["total"] * 100) if job["total"] else 100, 1)
+    return job
+
+@api_router.get("/jobs/{job_id}")
+async def get_compile_job(job_id: str):
+    job = await db.compile_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job: raise HTTPException(404, "Job not found")
+    return _job_view(job)
+
+@api_router.get("/projects/{project_id}/jobs")
+async def list_compile_jobs(project_id: str):
+    jobs = await db.compile_jobs.find({"project_id": project_id}, {"_id": 0, "results": 0}).sort("created_at", -1).to_list(50)
+    for j in jobs:
+        j["progress_pct"] = round((j["completed"] / j["total"] * 100) if j["total"] else 100, 1)
+    return jobs
 
 # ==================== NOTION SYNC ====================
 
@@ -566,17 +1145,36 @@ FRAMING_NOTION_MAP = {"extreme_wide":"Extreme wide","wide":"Wide","medium_wide":
 STATUS_NOTION_MAP = {"concept":"Not Started","world_built":"Not Started","blocked":"Not Started","generated":"In Progress","audio_layered":"In Progress","mixed":"Complete","final":"Complete"}
 
 async def get_notion_creds():
-    token_doc = await db.secrets.find_one({"key": "NOTION_API_KEY"}, {"_id": 0})
-    db_doc = await db.secrets.find_one({"key": "NOTION_DB_ID"}, {"_id": 0})
-    token = token_doc["value"] if token_doc else ""
-    db_id = db_doc["value"] if db_doc else ""
-    return token, db_id
+    return await secrets_cache.get("NOTION_API_KEY"), await secrets_cache.get("NOTION_DB_ID")
+
+NOTION_PUSH_CONCURRENCY = int(os.environ.get("NOTION_PUSH_CONCURRENCY", "3"))
+
+def notion_shot_properties(shot, scene, project):
+    return {
+        "Name": {"title": [{"text": {"content": shot.get("description", "")[:100]}}]},
+        "Shot Number": {"number": shot["shot_number"]},
+        "Scene": {"select": {"name": scene.get("title", "Unknown")}},
+        "Status": {"status": {"name": STATUS_NOTION_MAP.get(shot.get("production_status", "concept"), "Not Started")}},
+        "Framing": {"select": {"name": FRAMING_NOTION_MAP.get(shot.get("framing", ""), "Medium")}},
+        "Camera": {"select": {"name": CAMERA_NOTION_MAP.get(shot.get("camera_movement", ""), "Static")}},
+        "Duration": {"number": shot.get("duration_target_sec", 0)},
+        "Zone": {"select": {"name": scene.get("emotional_zone", "contemplative")}},
+        "StoryForge ID": {"rich_text": [{"text": {"content": shot["id"]}}]},
+        "Project": {"select": {"name": project.get("name", "")[:100]}},
+    }
 
-@api_router.post("/projects/{project_id}/notion/push")
-async def notion_push_status(project_id: str):
-    """Push all shot statuses directly to the Notion database."""
-    import httpx
+def notion_payload_hash(props):
+    return hashlib.sha256(json.dumps(props, sort_keys=True).encode()).hexdigest()
 
+@api_router.post("/projects/{project_id}/notion/push")
+async def notion_push_status(project_id: str, force: bool = False):
+    """Push changed shot statuses directly to the Notion database.
+
+    Existing pages are matched on "StoryForge ID" across every page of the database. A shot is
+    only written when its property payload hash differs from the last push (kept in
+    notion_pages) or its page is missing remotely; force=true pushes everything. Writes run
+    concurrently under the client's rate limit.
+    """
     project = await db.projects.find_one({"id": project_id}, {"_id": 0})
     if not project: raise HTTPException(404, "Project not found")
 
@@ -584,94 +1182,346 @@ async def notion_push_status(project_id: str):
     if not notion_token or not notion_db_id:
         raise HTTPException(400, "Notion credentials not set. Go to Settings > Secrets and set NOTION_API_KEY and NOTION_DB_ID.")
 
-    scenes = {s["id"]: s for s in clean_docs(await db.scenes.find({"project_id": project_id}, {"_id": 0}).to_list(100))}
-    shots = clean_docs(await db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(1000))
-
-    headers = {"Authorization": f"Bearer {notion_token}", "Notion-Version": "2022-06-28", "Content-Type": "application/json"}
-
-    # First, query existing pages to check for updates vs creates
-    existing = {}
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(f"https://api.notion.com/v1/databases/{notion_db_id}/query", headers=headers, json={"page_size": 100})
-        if resp.status_code == 200:
-            for page in resp.json().get("results", []):
-                sf_id_prop = page.get("properties", {}).get("StoryForge ID", {}).get("rich_text", [])
-                if sf_id_prop:
-                    sf_id = sf_id_prop[0].get("text", {}).get("content", "")
-                    if sf_id:
-                        existing[sf_id] = page["id"]
-
-    created = 0
-    updated = 0
-    errors = 0
-
-    async with httpx.AsyncClient() as client:
-        for shot in shots:
-            scene = scenes.get(shot.get("scene_id", ""), {})
-            props = {
-                "Name": {"title": [{"text": {"content": shot.get("description", "")[:100]}}]},
-                "Shot Number": {"number": shot["shot_number"]},
-                "Scene": {"select": {"name": scene.get("title", "Unknown")}},
-                "Status": {"status": {"name": STATUS_NOTION_MAP.get(shot.get("production_status", "concept"), "Not Started")}},
-                "Framing": {"select": {"name": FRAMING_NOTION_MAP.get(shot.get("framing", ""), "Medium")}},
-                "Camera": {"select": {"name": CAMERA_NOTION_MAP.get(shot.get("camera_movement", ""), "Static")}},
-                "Duration": {"number": shot.get("duration_target_sec", 0)},
-                "Zone": {"select": {"name": scene.get("emotional_zone", "contemplative")}},
-                "StoryForge ID": {"rich_text": [{"text": {"content": shot["id"]}}]},
-                "Project": {"select": {"name": project.get("name", "")[:100]}},
-            }
-
-            if shot["id"] in existing:
-                # Update existing page
-                resp = await client.patch(f"https://api.notion.com/v1/pages/{existing[shot['id']]}", headers=headers, json={"properties": props})
-                if resp.status_code == 200:
-                    updated += 1
-                else:
-                    errors += 1
-                    logger.error(f"Notion update failed for shot #{shot['shot_number']}: {resp.text[:200]}")
-            else:
-                # Create new page
-                resp = await client.post("https://api.notion.com/v1/pages", headers=headers, json={"parent": {"database_id": notion_db_id}, "properties": props})
-                if resp.status_code == 200:
-                    created += 1
-                else:
-                    errors += 1
-                    logger.error(f"Notion create failed for shot #{shot['shot_number']}: {resp.text[:200]}")
-
-    await db.notion_sync_log.insert_one({"id": new_id(), "project_id": project_id, "timestamp": utcnow(), "action": "push", "created": created, "updated": updated, "errors": errors})
-
-    return {"status": "pushed", "created": created, "updated": updated, "errors": errors, "total": len(shots)}
+    scenes = {s["id"]: s for s in clean_docs(await db.scenes.find({"project_id": project_id}, {"_id": 0}).to_list(None))}
+    shots = clean_docs(await db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(None))
+    last_pushed = {d["shot_id"]: d async for d in db.notion_pages.find({"project_id": project_id}, {"_id": 0, "shot_id": 1, "page_id": 1, "payload_hash": 1})}
+    pushed_state = []
 
+    async with NotionClient(notion_token) as notion:
+        try:
+            existing = await notion.index_by_text_property(notion_db_id, "StoryForge ID")
+        except (NotionError, httpx.HTTPError) as e:
+            raise HTTPException(502, f"Notion query failed: {e}")
+
+        semaphore = asyncio.Semaphore(NOTION_PUSH_CONCURRENCY)
+
+        async def push_one(shot):
+            props = notion_shot_properties(shot, scenes.get(shot.get("scene_id", ""), {}), project)
+            payload_hash = notion_payload_hash(props)
+            page_id = existing.get(shot["id"])
+            prev = last_pushed.get(shot["id"])
+            if not force and page_id and prev and prev.get("page_id") == page_id and prev.get("payload_hash") == payload_hash:
+                return "skipped"
+            async with semaphore:
+                try:
+                    if page_id:
+                        await notion.update_page(page_id, props)
+                        outcome = "updated"
+                    else:
+                        page_id = (await notion.create_page(notion_db_id, props))["id"]
+                        outcome = "created"
+                    pushed_state.append(UpdateOne(
+                        {"project_id": project_id, "shot_id": shot["id"]},
+                        {"$set": {"page_id": page_id, "payload_hash": payload_hash, "pushed_at": utcnow()}},
+                        upsert=True,
+                    ))
+                    return outcome
+                except (NotionError, httpx.HTTPError) as e:
+                    logger.error(f"Notion push failed for shot #{shot['shot_number']}: {e}")
+                    return "errors"
+
+        outcomes = await asyncio.gather(*[push_one(s) for s in shots])
+
+    if pushed_state:
+        await db.notion_pages.bulk_write(pushed_state, ordered=False)
+    counts = {k: outcomes.count(k) for k in ("created", "updated", "skipped", "errors")}
+    await db.notion_sync_log.insert_one({"id": new_id(), "project_id": project_id, "timestamp": utcnow(), "action": "push", **counts})
+
+    return {"status": "pushed", **counts, "total": len(shots)}
+
+
+def invert_notion_map(mapping, preferred=None):
+    """Notion option -> StoryForge value. Lossy maps resolve to `preferred`, else a same-named key, else the first key."""
+    inverted = dict(preferred or {})
+    for key, option in mapping.items():
+        if key == option.lower().replace(" ", "_"):
+            inverted.setdefault(option, key)
+    for key, option in mapping.items():
+        inverted.setdefault(option, key)
+    return inverted
+
+STATUS_FROM_NOTION = invert_notion_map(STATUS_NOTION_MAP, {"Not Started": "concept", "In Progress": "generated", "Complete": "final"})
+FRAMING_FROM_NOTION = invert_notion_map(FRAMING_NOTION_MAP)
+CAMERA_FROM_NOTION = invert_notion_map(CAMERA_NOTION_MAP)
+
+# (shot field, Notion property, property type, StoryForge -> Notion map, Notion -> StoryForge map)
+NOTION_PULL_FIELDS = [
+    ("production_status", "Status", "status", STATUS_NOTION_MAP, STATUS_FROM_NOTION),
+    ("framing", "Framing", "select", FRAMING_NOTION_MAP, FRAMING_FROM_NOTION),
+    ("camera_movement", "Camera", "select", CAMERA_NOTION_MAP, CAMERA_FROM_NOTION),
+    ("duration_target_sec", "Duration", "number", None, None),
+]
+
+def notion_page_changes(page, shot):
+    """Fields on `shot` that the Notion page disagrees with.
+
+    The option maps are lossy (e.g. world_built and blocked are both "Not Started"), so a field only
+    changes when the page's option differs from what the shot's current value maps to.
+    """
+    props = page.get("properties", {})
+    changes = {}
+    for field, prop, kind, to_notion, from_notion in NOTION_PULL_FIELDS:
+        value = (props.get(prop) or {}).get(kind)
+        if kind == "number":
+            if value is not None and value != shot.get(field):
+                changes[field] = value
+            continue
+        option = (value or {}).get("name")
+        if option and option in from_notion and option != to_notion.get(shot.get(field, "")):
+            changes[field] = from_notion[option]
+    return changes
+
+@api_router.post("/projects/{project_id}/notion/pull")
+async def notion_pull_status(project_id: str):
+    """Apply status/framing/camera/duration edits made in Notion since the last pull.
+
+    Only pages edited on or after the watermark stored in notion_sync_log are fetched, so a
+    pull with no remote edits is a single query. Changes land in one bulk_write.
+    """
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "id": 1})
+    if not project: raise HTTPException(404, "Project not found")
+
+    notion_token, notion_db_id = await get_notion_creds()
+    if not notion_token or not notion_db_id:
+        raise HTTPException(400, "Notion credentials not set. Go to Settings > Secrets and set NOTION_API_KEY and NOTION_DB_ID.")
+
+    last_pull = await db.notion_sync_log.find_one({"project_id": project_id, "action": "pull"}, {"_id": 0, "watermark": 1}, sort=[("timestamp", -1)])
+    watermark = (last_pull or {}).get("watermark", "")
+    # Notion rounds last_edited_time to the minute, so re-read the watermark minute itself;
+    # re-applying a page is a no-op because only differing fields are written.
+    query_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}} if watermark else None
+
+    pages = []
+    async with NotionClient(notion_token) as notion:
+        try:
+            async for page in notion.query_database(notion_db_id, filter=query_filter):
+                pages.append(page)
+        except (NotionError, httpx.HTTPError) as e:
+            raise HTTPException(502, f"Notion query failed: {e}")
+
+    by_shot = {rich_text_value(p, "StoryForge ID"): p for p in pages}
+    by_shot.pop("", None)
+    shots = {s["id"]: s async for s in db.shots.find(
+        {"project_id": project_id, "id": {"$in": list(by_shot)}},
+        {"_id": 0, "id": 1, "production_status": 1, "framing": 1, "camera_movement": 1, "duration_target_sec": 1},
+    )}
+
+    ops, stats_delta = [], {"duration": 0, "stages": {}}
+    for sid, shot in shots.items():
+        changes = notion_page_changes(by_shot[sid], shot)
+        if not changes: continue
+        ops.append(UpdateOne({"id": sid, "project_id": project_id}, {"$set": changes}))
+        after = {**shot, **changes}
+        stats_delta["duration"] += (after.get("duration_target_sec") or 0) - (shot.get("duration_target_sec") or 0)
+        for status, sign in ((shot.get("production_status"), -1), (after.get("production_status"), 1)):
+            stats_delta["stages"][status] = stats_delta["stages"].get(status, 0) + sign
+    if ops:
+        await db.shots.bulk_write(ops, ordered=False)
+        await inc_project_stats(project_id, duration=stats_delta["duration"], stages=stats_delta["stages"])
+
+    new_watermark = max([watermark] + [p.get("last_edited_time", "") for p in pages])
+    await db.notion_sync_log.insert_one({"id": new_id(), "project_id": project_id, "timestamp": utcnow(), "action": "pull", "watermark": new_watermark, "fetched": len(pages), "matched": len(shots), "applied": len(ops)})
+
+    return {"status": "pulled", "fetched": len(pages), "matched": len(shots), "applied": len(ops), "watermark": new_watermark}
 
 # ==================== FRAME CONTINUITY ====================
+# One ContinuityIndex per project, cached in-process and patched in place by the shot handlers.
+# Each index records the project revision it is current for and is rebuilt when a read sees a
+# different one, so writes from other workers (which bump the revision) are picked up at once.
+# bump_revision moves a cached index forward when it was current for the revision just before
+# the bump, because then every write in between was this worker's and already patched in.
+
+continuity_indexes = TTLCache(maxsize=256, ttl=float("inf"))
+# project_id -> [loads in flight, changes seen]; a load that overlaps a change is retried. Entries
+# only live while a load is running, so the dict stays as small as the number of concurrent loads.
+continuity_loads = {}
+
+async def get_continuity_index(project_id):
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "revision": 1})
+    revision = (project or {}).get("revision", 0)
+    index = continuity_indexes.get(project_id)
+    if index is None or index.revision != revision:
+        load = continuity_loads.setdefault(project_id, [0, 0])
+        load[0] += 1
+        try:
+            while True:
+                changes = load[1]
+                shots = await db.shots.find({"project_id": project_id}, {"_id": 0, "id": 1, **{f: 1 for f in CONTINUITY_FIELDS}}).to_list(None)
+                if changes == load[1]:
+                    break
+        finally:
+            load[0] -= 1
+            if not load[0]:
+                del continuity_loads[project_id]
+        index = ContinuityIndex(shots, revision)
+        continuity_indexes.set(project_id, index)
+    return index
+
+def _mark_continuity_changed(project_id):
+    load = continuity_loads.get(project_id)
+    if load:
+        load[1] += 1
+
+def continuity_revision_bumped(project_id, revision):
+    index = continuity_indexes.get(project_id)
+    if index is not None and index.revision == revision - 1:
+        index.revision = revision
+
+def continuity_changed(project_id, upserts=(), removed=()):
+    """Apply shot changes to the project's cached index, if there is one.
+
+    `upserts` are shot dicts with an id and any changed fields; fields outside CONTINUITY_FIELDS are ignored.
+    """
+    _mark_continuity_changed(project_id)
+    index = continuity_indexes.get(project_id)
+    if index is None:
+        return
+    for shot in upserts:
+        if not any(f in shot for f in CONTINUITY_FIELDS):
+            continue
+        if shot["id"] not in index.by_id and not all(f in shot for f in CONTINUITY_FIELDS):
+            continuity_indexes.pop(project_id)  # partial change to a shot this index never saw
+            return
+        index.upsert(shot)
+    for shot_id in removed:
+        index.remove(shot_id)
+
+def drop_continuity_index(project_id):
+    _mark_continuity_changed(project_id)
+    continuity_indexes.pop(project_id)
 
 @api_router.get("/projects/{project_id}/continuity")
 async def get_continuity_chain(project_id: str):
     """Returns all shots in order with frame continuity data for the entire project."""
-    shots = clean_docs(await db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(1000))
-    chain = []
-    for i, shot in enumerate(shots):
-        entry = {
-            "shot_id": shot["id"],
-            "shot_number": shot["shot_number"],
-            "description": shot.get("description", ""),
-            "first_frame_url": shot.get("first_frame_url", ""),
-            "last_frame_url": shot.get("last_frame_url", ""),
-            "transition_in": shot.get("transition_in", "cut"),
-            "transition_out": shot.get("transition_out", "cut"),
-            "prev_shot_last_frame": shots[i - 1].get("last_frame_url", "") if i > 0 else "",
-            "next_shot_first_frame": shots[i + 1].get("first_frame_url", "") if i < len(shots) - 1 else "",
-        }
-        chain.append(entry)
-    return chain
+    return fast_json((await get_continuity_index(project_id)).chain())
+
+@api_router.get("/projects/{project_id}/continuity/gaps")
+async def get_continuity_gaps(project_id: str):
+    """Missing first/last frames, duplicate shot numbers and transitions the next shot doesn't complete."""
+    index = await get_continuity_index(project_id)
+    gaps = index.gaps()
+    counts = {}
+    for g in gaps:
+        counts[g["type"]] = counts.get(g["type"], 0) + 1
+    return {"shot_count": len(index), "gap_count": len(gaps), "counts": counts, "gaps": gaps}
+
+# ==================== LLM CALLS ====================
+# Every model call goes through call_llm. It retries failures, records per-attempt latency in the metrics
+# histogram and returns an accounting dict. Callers add parse_ok and store it with record_llm_call:
+# llm_calls backs /llm-usage, and compilations also embed it as `llm`. The backend comes from
+# llm_providers (LLM_PROVIDER); the hosted one doesn't report token counts, so prompt and response
+# sizes are in characters.
+
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SEC = float(os.environ.get("LLM_RETRY_BACKOFF_SEC", "1"))
+
+class LLMCallError(Exception):
+    """Raised by call_llm once retries run out; carries the accounting for the failed call."""
+    def __init__(self, cause, usage):
+        super().__init__(str(cause))
+        self.usage = usage
+
+async def call_llm(operation, provider, model, system_message, text):
+    """Send one prompt. Returns (response text, usage); usage names the provider/model that served it."""
+    llm = await get_llm_provider()
+    provider, model = llm.route(provider, model)
+    api_key = await get_api_key() if llm.requires_api_key else ""
+    usage = {
+        "operation": operation, "provider": provider, "model": model, "timestamp": utcnow(),
+        "prompt_chars": len(system_message) + len(text), "response_chars": 0, "retries": 0, "outcome": "ok",
+    }
+    started = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        usage["retries"] = attempt
+        attempt_started, outcome = time.perf_counter(), "error"
+        try:
+            response = await llm.complete(operation=operation, provider=provider, model=model, system_message=system_message,
+                                          text=text, api_key=api_key, attempt=attempt)
+            outcome = "ok"
+            break
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES:
+                usage.update(outcome="error", error=str(e)[:500], wall_ms=round((time.perf_counter() - started) * 1000))
+                raise LLMCallError(e, usage)
+            logger.warning(f"LLM {operation} call failed (attempt {attempt + 1}): {e}")
+        finally:
+            LLM_REQUEST_DURATION.observe(time.perf_counter() - attempt_started, operation, provider, model, outcome)
+        await asyncio.sleep(LLM_RETRY_BACKOFF_SEC * 2 ** attempt)
+    usage["wall_ms"] = round((time.perf_counter() - started) * 1000)
+    usage["response_chars"] = len(response)
+    return response, usage
+
+def parse_llm_json(response):
+    """(parsed object or None, response text with any code fence removed)."""
+    text = response.strip()
+    if text.startswith("```"): text = "\n".join(text.split("\n")[1:-1])
+    try:
+        return json.loads(text), text
+    except json.JSONDecodeError:
+        return None, text
+
+async def record_llm_call(project_id, usage, compilation_id=None):
+    await db.llm_calls.insert_one({"id": new_id(), "project_id": project_id, "compilation_id": compilation_id, **usage})
+
+def _usage_group_fields(latencies=True):
+    fields = {
+        "calls": {"$sum": 1},
+        "errors": {"$sum": {"$cond": [{"$eq": ["$outcome", "error"]}, 1, 0]}},
+        "parse_failures": {"$sum": {"$cond": [{"$eq": ["$parse_ok", False]}, 1, 0]}},
+        "retries": {"$sum": "$retries"},
+        "prompt_chars": {"$sum": "$prompt_chars"},
+        "response_chars": {"$sum": "$response_chars"},
+        "wall_ms_total": {"$sum": "$wall_ms"},
+    }
+    if latencies:
+        fields["latencies"] = {"$push": "$wall_ms"}  # already sorted by the pipeline's $sort
+    return fields
+
+def _percentile(p):
+    return {"$arrayElemAt": ["$latencies", {"$toInt": {"$floor": {"$multiply": [{"$subtract": [{"$size": "$latencies"}, 1]}, p]}}}]}
+
+_USAGE_PERCENTILES = {"$addFields": {"p50_ms": _percentile(0.5), "p95_ms": _percentile(0.95)}}
+
+@api_router.get("/projects/{project_id}/llm-usage")
+async def llm_usage(project_id: str, days: int = Query(30, ge=1, le=365)):
+    """LLM calls over the last `days`: totals, per provider/model/operation (with p50/p95 latency) and per day."""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    [report] = await db.llm_calls.aggregate([
+        {"$match": {"project_id": project_id, "timestamp": {"$gte": since}}},
+        {"$sort": {"wall_ms": 1}},
+        {"$facet": {
+            "totals": [{"$group": {"_id": None, **_usage_group_fields()}}, _USAGE_PERCENTILES, {"$project": {"_id": 0, "latencies": 0}}],
+            "by_model": [
+                {"$group": {"_id": {"provider": "$provider", "model": "$model", "operation": "$operation"}, **_usage_group_fields()}},
+                _USAGE_PERCENTILES,
+                {"$project": {"latencies": 0}},
+                {"$sort": {"calls": -1}},
+            ],
+            "by_day": [
+                {"$group": {"_id": {"day": {"$substrBytes": ["$timestamp", 0, 10]}, "model": "$model"}, **_usage_group_fields(latencies=False)}},
+                {"$sort": {"_id.day": 1, "_id.model": 1}},
+            ],
+        }},
+    ]).to_list(None)
+    cache_hits = await db.compilations.count_documents({"project_id": project_id, "cache_hit": True, "timestamp": {"$gte": since}})
+    return {
+        "project_id": project_id,
+        "days": days,
+        "totals": report["totals"][0] if report["totals"] else {"calls": 0},
+        "cache_hits": cache_hits,
+        "by_model": [{**g.pop("_id"), **g} for g in report["by_model"]],
+        "by_day": [{**g.pop("_id"), **g} for g in report["by_day"]],
+    }
 
 # ==================== AI IMAGE DESCRIPTION ====================
 
 @api_router.post("/projects/{project_id}/describe-image")
 async def describe_image(project_id: str, data: ImageDescribeRequest):
     """AI describes an image URL and generates structured entity description."""
-    api_key = await get_api_key()
-    if not api_key:
+    if not await llm_configured():
         raise HTTPException(400, "No API key configured. Set EMERGENT_LLM_KEY in Settings > Secrets.")
 
     prompts_by_type = {
@@ -686,39 +1536,168 @@ async def describe_image(project_id: str, data: ImageDescribeRequest):
 Output ONLY valid JSON. Be cinematic, specific, and production-ready in your descriptions."""
 
     try:
-        chat = LlmChat(api_key=api_key, session_id=f"describe-{new_id()}", system_message=system_msg).with_model("openai", "gpt-5.2")
-        response = await chat.send_message(UserMessage(text=f"Analyze this image for production use: {data.image_url}"))
-        text = response.strip()
-        if text.startswith("```"): text = "\n".join(text.split("\n")[1:-1])
-        result = json.loads(text)
-        return {"status": "described", "entity_type": data.entity_type, "result": result, "source_image": data.image_url}
-    except json.JSONDecodeError:
-        return {"status": "described", "entity_type": data.entity_type, "result": {"raw_response": text}, "source_image": data.image_url}
+        response, usage = await call_llm("describe_image", "openai", "gpt-5.2", system_msg, f"Analyze this image for production use: {data.image_url}")
+    except LLMCallError as e:
+        await record_llm_call(project_id, e.usage)
+        raise HTTPException(500, f"Image description failed: {str(e)}")
     except Exception as e:
         raise HTTPException(500, f"Image description failed: {str(e)}")
+    result, text = parse_llm_json(response)
+    usage["parse_ok"] = result is not None
+    await record_llm_call(project_id, usage)
+    return {"status": "described", "entity_type": data.entity_type, "result": result if result is not None else {"raw_response": text}, "source_image": data.image_url}
+
+# ==================== COMPILER CONTEXT FRAGMENTS ====================
+# The project brand block and per-world/per-character context strings are cached by entity id
+# together with the project's `context_version`, which every project/world/character PUT and
+# world/character DELETE increments. A compile reads that one field (an indexed, projected lookup)
+# and rebuilds any fragment cached under an older version, so writes made by other workers are seen
+# immediately. Local handlers also drop their own entries right away.
+
+context_fragments = TTLCache(maxsize=4096, ttl=float("inf"))
+
+async def bump_context_version(project_id):
+    await db.projects.update_one({"id": project_id}, {"$inc": {"context_version": 1}})
+
+async def get_context_version(project_id):
+    """The project's context_version, or None if the project doesn't exist."""
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "context_version": 1})
+    return None if project is None else project.get("context_version", 0)
+
+def _project_fragment(project):
+    brand = f"\nPROJECT: {project.get('name','')}\nBrand: {project.get('brand_primary','')}\nStyle: {project.get('visual_style','')}\nCompliance: {', '.join(project.get('compliance_notes',[]))}\nForbidden: {', '.join(project.get('forbidden_elements',[]))}"
+    return {"brand": brand, "default_time_of_day": project.get("default_time_of_day", "day"), "default_weather": project.get("default_weather", "clear")}
+
+def _world_fragment(world):
+    text = f"\nWORLD: {world.get('name','')}\nDescription: {world.get('description','')}\nZone: {world.get('emotional_zone','')}\nAtmosphere: {world.get('atmosphere','')}\nLighting: {world.get('lighting_notes','')}\nSpatial: {world.get('spatial_character','')}"
+    if world.get("reference_images"):
+        text += f"\nWorld Reference Images: {', '.join(world['reference_images'][:3])}"
+    return text
+
+def _character_fragment(c):
+    text = f"\nCHARACTER: {c.get('name','')} ({c.get('role','')})\nDescription: {c.get('description','')}\nVisual: {c.get('visual_notes','')}\nPersonality: {c.get('personality','')}"
+    if c.get("identity_images"):
+        text += f"\nIdentity Reference: {', '.join(c['identity_images'][:2])}"
+    return text
+
+FRAGMENT_BUILDERS = {"project": _project_fragment, "world": _world_fragment, "character": _character_fragment}
+
+def _cache_fragment(kind, doc, version):
+    entry = {"version": version, "project_id": doc.get("project_id"), "fragment": FRAGMENT_BUILDERS[kind](doc)}
+    context_fragments.set((kind, doc["id"]), entry)
+    return entry
+
+def _cached_fragment(kind, entity_id, version):
+    entry = context_fragments.get((kind, entity_id))
+    return entry if entry is not None and entry["version"] == version else None
+
+def invalidate_fragment(kind, entity_id):
+    context_fragments.pop((kind, entity_id))
+
+def prime_context_fragments(project, worlds=(), characters=()):
+    """Seed the cache from docs a caller already loaded with the project; current entries are left alone."""
+    version = project.get("context_version", 0)
+    for kind, docs in (("project", [project]), ("world", worlds), ("character", characters)):
+        for doc in docs:
+            if _cached_fragment(kind, doc["id"], version) is None:
+                _cache_fragment(kind, doc, version)
+
+async def get_project_fragment(project_id, version):
+    cached = _cached_fragment("project", project_id, version)
+    if cached is None:
+        project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+        if not project: return None
+        cached = _cache_fragment("project", project, version)
+    return cached["fragment"]
+
+async def get_world_fragment(project_id, world_id, version):
+    cached = _cached_fragment("world", world_id, version)
+    if cached is None:
+        world = await db.worlds.find_one({"id": world_id, "project_id": project_id}, {"_id": 0})
+        if not world: return ""
+        cached = _cache_fragment("world", world, version)
+    return cached["fragment"] if cached["project_id"] == project_id else ""
+
+async def get_character_fragments(project_id, character_ids, version):
+    entries = {cid: _cached_fragment("character", cid, version) for cid in character_ids[:20]}
+    missing = [cid for cid, e in entries.items() if e is None]
+    if missing:
+        for c in await db.characters.find({"id": {"$in": missing}, "project_id": project_id}, {"_id": 0}).to_list(len(missing)):
+            entries[c["id"]] = _cache_fragment("character", c, version)
+    return "".join(e["fragment"] for e in entries.values() if e and e["project_id"] == project_id)
 
 # ==================== AI SCENE COMPILER ====================
 
+COMPILER_MODEL = ("openai", "gpt-5.2")
+
+# Compile results are content-addressed by a hash of (model, system prompt, user prompt).
+# Hot hashes live in an in-process LRU; the compilations collection is the durable tier.
+COMPILE_CACHE_SIZE = int(os.environ.get("COMPILE_CACHE_SIZE", "512"))
+COMPILE_CACHE_TTL_SEC = float(os.environ.get("COMPILE_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+compile_cache = TTLCache(maxsize=COMPILE_CACHE_SIZE, ttl=COMPILE_CACHE_TTL_SEC)
+compile_cache_counts = {"hits": 0, "misses": 0, "similar_hits": 0}
+
+def prompt_hash(provider, model, system_prompt, user_prompt):
+    return hashlib.sha256(json.dumps([provider, model, system_prompt, user_prompt]).encode()).hexdigest()
+
+async def lookup_compiled(phash):
+    """Most recent fresh compilation for a prompt hash, or None."""
+    cached = compile_cache.get(phash)
+    if cached is not None:
+        return cached
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=COMPILE_CACHE_TTL_SEC)).isoformat()
+    doc = await db.compilations.find_one(
+        {"prompt_hash": phash, "cache_hit": {"$ne": True}, "timestamp": {"$gte": cutoff}},
+        {"_id": 0, "id": 1, "output": 1, "timestamp": 1}, sort=[("timestamp", -1)],
+    )
+    if doc:
+        age = (datetime.now(timezone.utc) - datetime.fromisoformat(doc["timestamp"])).total_seconds()
+        compile_cache.set(phash, doc, ttl=max(COMPILE_CACHE_TTL_SEC - age, 0))
+    return doc
+
+# Near-duplicate reuse (reuse_similar=true): one SimilarityIndex per project over the inputs of its
+# fresh, parsed compilations within COMPILE_CACHE_TTL_SEC. New compiles are added in place; other
+# workers' compiles show up once SIMILARITY_INDEX_TTL_SEC lapses.
+SIMILARITY_INDEX_TTL_SEC = float(os.environ.get("SIMILARITY_INDEX_TTL_SEC", "300"))
+similarity_indexes = TTLCache(maxsize=256, ttl=SIMILARITY_INDEX_TTL_SEC)
+
+async def get_similarity_index(project_id):
+    index = similarity_indexes.get(project_id)
+    if index is None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=COMPILE_CACHE_TTL_SEC)).isoformat()
+        index = SimilarityIndex(await db.compilations.find(
+            {"project_id": project_id, "prompt_hash": {"$exists": True}, "cache_hit": {"$ne": True}, "timestamp": {"$gte": cutoff}},
+            {"_id": 0, "id": 1, "input": 1, "timestamp": 1, "llm.provider": 1, "context_hash": 1},
+        ).to_list(None))
+        similarity_indexes.set(project_id, index)
+    return index
+
+async def lookup_similar(project_id, data, provider, context_hash):
+    """(compilation, similarity) for the closest fresh earlier compile of near-identical input, or None.
+
+    context_hash covers the rendered brand/world/character blocks, so editing any of them rules out
+    compiles made against the old text.
+    """
+    index = await get_similarity_index(project_id)
+    request = data.model_dump()
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=COMPILE_CACHE_TTL_SEC)).isoformat()
+    while True:
+        match = index.closest(request, provider, context_hash, data.similarity_threshold)
+        if match is None:
+            return None
+        doc = await db.compilations.find_one({"id": match[0], "timestamp": {"$gte": cutoff}}, {"_id": 0, "id": 1, "output": 1})
+        if doc is not None:
+            return doc, match[1]
+        index.remove(match[0])  # expired or deleted since the index was built
+
 @api_router.post("/projects/{project_id}/compile")
 async def compile_scene(project_id: str, data: CompileRequest):
-    project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+    version = await get_context_version(project_id)
+    project = await get_project_fragment(project_id, version) if version is not None else None
     if not project: raise HTTPException(404, "Project not found")
 
-    world_context = ""
-    if data.world_id:
-        world = await db.worlds.find_one({"id": data.world_id}, {"_id": 0})
-        if world:
-            world_context = f"\nWORLD: {world.get('name','')}\nDescription: {world.get('description','')}\nZone: {world.get('emotional_zone','')}\nAtmosphere: {world.get('atmosphere','')}\nLighting: {world.get('lighting_notes','')}\nSpatial: {world.get('spatial_character','')}"
-            if world.get("reference_images"):
-                world_context += f"\nWorld Reference Images: {', '.join(world['reference_images'][:3])}"
-
-    char_context = ""
-    if data.character_ids:
-        chars = clean_docs(await db.characters.find({"id": {"$in": data.character_ids}, "project_id": project_id}, {"_id": 0}).to_list(20))
-        for c in chars:
-            char_context += f"\nCHARACTER: {c.get('name','')} ({c.get('role','')})\nDescription: {c.get('description','')}\nVisual: {c.get('visual_notes','')}\nPersonality: {c.get('personality','')}"
-            if c.get("identity_images"):
-                char_context += f"\nIdentity Reference: {', '.join(c['identity_images'][:2])}"
+    world_context = await get_world_fragment(project_id, data.world_id, version) if data.world_id else ""
+    char_context = await get_character_fragments(project_id, data.character_ids, version) if data.character_ids else ""
 
     frame_context = ""
     if data.prev_shot_last_frame:
@@ -732,7 +1711,7 @@ async def compile_scene(project_id: str, data: CompileRequest):
     if data.reference_images:
         ref_images_context = f"\nSHOT REFERENCE IMAGES (use as visual guidance): {', '.join(data.reference_images[:5])}"
 
-    brand = f"\nPROJECT: {project.get('name','')}\nBrand: {project.get('brand_primary','')}\nStyle: {project.get('visual_style','')}\nCompliance: {', '.join(project.get('compliance_notes',[]))}\nForbidden: {', '.join(project.get('forbidden_elements',[]))}"
+    brand = project["brand"]
 
     system_prompt = """You are StoryForge Scene Compiler — expert AI cinematographer and production designer.
 Generate structured prompts from natural language scene descriptions.
@@ -765,68 +1744,539 @@ RULES:
 
 SHOT PARAMETERS:
 Zone: {data.emotional_zone} | Framing: {data.framing} | Camera: {data.camera_movement}
-Time: {data.time_of_day or project.get('default_time_of_day', 'day')}
-Weather: {data.weather or project.get('default_weather', 'clear')}
+Time: {data.time_of_day or project['default_time_of_day']}
+Weather: {data.weather or project['default_weather']}
 {f'Context: {data.additional_context}' if data.additional_context else ''}
 
 SCENE: {data.scene_description}
 
 Generate production prompts as JSON."""
 
-    try:
-        api_key = await get_api_key()
-        chat = LlmChat(api_key=api_key, session_id=f"compile-{new_id()}", system_message=system_prompt).with_model("openai", "gpt-5.2")
-        response = await chat.send_message(UserMessage(text=user_prompt))
-        text = response.strip()
-        if text.startswith("```"): text = "\n".join(text.split("\n")[1:-1])
-        compiled = json.loads(text)
-
-        log_entry = {"id": new_id(), "project_id": project_id, "shot_id": data.shot_id or "", "timestamp": utcnow(), "input": data.model_dump(), "output": compiled}
+    # Keyed on the serving backend so local stand-in output is never served once the real model is back
+    route = (await get_llm_provider()).route(*COMPILER_MODEL)
+    phash = prompt_hash(*route, system_prompt, user_prompt)
+    cached = None if data.force else await lookup_compiled(phash)
+    if cached:
+        compile_cache_counts["hits"] += 1
+        # Still logged per shot so history stays complete; cache_hit entries are never served as cache sources.
+        log_entry = {"id": new_id(), "project_id": project_id, "shot_id": data.shot_id or "", "timestamp": utcnow(), "input": data.model_dump(), "output": cached["output"], "prompt_hash": phash, "cache_hit": True, "cached_from": cached["id"]}
         await db.compilations.insert_one(log_entry)
-        del log_entry["_id"]
+        return {"status": "compiled", "result": cached["output"], "compilation_id": log_entry["id"], "cache_hit": True}
+    compile_cache_counts["misses"] += 1
+
+    context_hash = hashlib.sha256(f"{brand}{world_context}{char_context}".encode()).hexdigest()
+    similar = await lookup_similar(project_id, data, route[0], context_hash) if data.reuse_similar and not data.force else None
+    if similar:
+        doc, similarity = similar
+        compile_cache_counts["similar_hits"] += 1
+        log_entry = {"id": new_id(), "project_id": project_id, "shot_id": data.shot_id or "", "timestamp": utcnow(), "input": data.model_dump(), "output": doc["output"], "prompt_hash": phash, "cache_hit": True, "cached_from": doc["id"], "similarity": similarity}
+        await db.compilations.insert_one(log_entry)
+        return {"status": "compiled", "result": doc["output"], "compilation_id": log_entry["id"], "cache_hit": True, "similar_to": doc["id"], "similarity": similarity}
 
-        return {"status": "compiled", "result": compiled, "compilation_id": log_entry["id"]}
-    except json.JSONDecodeError:
-        return {"status": "compiled", "result": {"raw_response": text}, "parse_error": True}
+    try:
+        response, usage = await call_llm("compile", *COMPILER_MODEL, system_prompt, user_prompt)
+        compiled, text = parse_llm_json(response)
+        usage["parse_ok"] = compiled is not None
+
+        log_entry = {"id": new_id(), "project_id": project_id, "shot_id": data.shot_id or "", "timestamp": utcnow(), "input": data.model_dump(), "output": compiled, "llm": usage}
+        if compiled is None:
+            # Kept for accounting, but without prompt_hash so it is never served as a cache hit
+            log_entry["output"] = {"raw_response": text}
+        else:
+            log_entry["prompt_hash"] = phash
+            log_entry["context_hash"] = context_hash
+        await db.compilations.insert_one(log_entry)
+        await record_llm_call(project_id, usage, log_entry["id"])
+        if compiled is None:
+            return {"status": "compiled", "result": {"raw_response": text}, "parse_error": True, "compilation_id": log_entry["id"], "cache_hit": False}
+        compile_cache.set(phash, {"id": log_entry["id"], "output": compiled, "timestamp": log_entry["timestamp"]})
+        index = similarity_indexes.get(project_id)
+        if index is not None:
+            index.add(log_entry["id"], log_entry["input"], usage["provider"], context_hash, log_entry["timestamp"])
+
+        return {"status": "compiled", "result": compiled, "compilation_id": log_entry["id"], "cache_hit": False}
+    except LLMCallError as e:
+        await record_llm_call(project_id, e.usage)
+        logger.error(f"Compilation error: {e}")
+        raise HTTPException(500, f"AI compilation failed: {str(e)}")
     except Exception as e:
         logger.error(f"Compilation error: {e}")
         raise HTTPException(500, f"AI compilation failed: {str(e)}")
 
+@api_router.get("/compile-cache/stats")
+async def compile_cache_stats():
+    lookups = compile_cache_counts["hits"] + compile_cache_counts["misses"]
+    return {
+        **compile_cache_counts,
+        "hit_ratio": round(compile_cache_counts["hits"] / lookups, 3) if lookups else 0.0,
+        "memory": compile_cache.stats(),
+        "ttl_sec": COMPILE_CACHE_TTL_SEC,
+    }
+
 # ==================== COMPILATION HISTORY ====================
 
 @api_router.get("/projects/{project_id}/compilations")
-async def list_compilations(project_id: str, shot_id: Optional[str] = None):
+async def list_compilations(project_id: str, response: Response, shot_id: Optional[str] = None, page: ListParams = Depends(list_params)):
     query = {"project_id": project_id}
     if shot_id: query["shot_id"] = shot_id
-    comps = clean_docs(await db.compilations.find(query, {"_id": 0}).sort("timestamp", -1).to_list(100))
-    return comps
+    return fast_json(await find_page(db.compilations, query, "timestamp", -1, page, response), response)
+
+# ==================== SEARCH ====================
+# One text index per collection ("search_text"), prefixed with project_id so a search only walks
+# that project's index entries. MongoDB allows a single text index per collection, so changing
+# SEARCH_FIELDS means dropping search_text first; create_indexes then builds the new one.
+
+SEARCH_FIELDS = {
+    # type: (collection, {field: weight})
+    "world": ("worlds", {"name": 10, "description": 5, "atmosphere": 2, "lighting_notes": 1, "spatial_character": 1}),
+    "character": ("characters", {"name": 10, "description": 5, "personality": 2, "visual_notes": 1}),
+    "object": ("objects", {"name": 10, "description": 5, "narrative_significance": 1, "usage_notes": 1}),
+    "shot": ("shots", {"description": 5, "notes": 2, "camera_notes": 1}),
+    "compilation": ("compilations", {"input.scene_description": 3, "output.image_prompt": 1, "output.video_prompt": 1, "output.director_notes": 1}),
+}
+SEARCH_EXTRA_FIELDS = {
+    "world": ("name",), "character": ("name",), "object": ("name",),
+    "shot": ("shot_number", "scene_id", "production_status"),
+    "compilation": ("shot_id", "timestamp"),
+}
+SNIPPET_CHARS = 160
+
+async def create_search_indexes():
+    for collection, weights in SEARCH_FIELDS.values():
+        await db[collection].create_index([("project_id", 1), *((f, "text") for f in weights)], name="search_text", weights=weights)
+
+def _field_value(doc, path):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc if isinstance(doc, str) else ""
+
+def highlighter(q):
+    """Function returning the (start, end) spans of `q` in a text: quoted phrases, and words that stem like an
+    unquoted term. Stop words and -negated words are dropped the way the text index parses `q`."""
+    quoted = re.findall(r'"([^"]+)"', q)
+    phrases = re.compile("|".join(r"\b" + re.escape(p) for p in quoted), re.IGNORECASE) if quoted else None
+    terms, negated, _ = parse_text_search(re.sub(r'"[^"]*"', " ", q))
+    terms -= negated
+
+    def find(text):
+        spans = [m.span() for m in phrases.finditer(text)] if phrases else []
+        spans += [m.span() for m in re.finditer(r"\w+", text) if set(text_tokens(m.group())) & terms]
+        found = []
+        for span in sorted(spans):
+            if not found or span[0] >= found[-1][1]:  # drop words inside an already highlighted phrase
+                found.append(span)
+        return found
+    return find
+
+def make_snippet(doc, fields, find_highlights):
+    """Window of the first field (by weight) that mentions a query word, with [start, end] highlight offsets."""
+    for field in sorted(fields, key=fields.get, reverse=True):
+        text = _field_value(doc, field)
+        found = find_highlights(text) if text else []
+        if not found:
+            continue
+        start = max(0, found[0][0] - SNIPPET_CHARS // 4)
+        if start:
+            start = text.find(" ", start) + 1 or start  # don't cut the first word
+        end = min(len(text), start + SNIPPET_CHARS)
+        snippet = ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+        shift = start - (1 if start else 0)
+        highlights = [[a - shift, b - shift] for a, b in found if a >= start and b <= end]
+        return {"field": field, "snippet": snippet, "highlights": highlights}
+    field = next((f for f in fields if _field_value(doc, f)), None)  # matched on a stemmed form only
+    text = _field_value(doc, field) if field else ""
+    return {"field": field, "snippet": text[:SNIPPET_CHARS] + ("…" if len(text) > SNIPPET_CHARS else ""), "highlights": []}
+
+def _search_title(kind, doc):
+    if kind == "shot":
+        return f"Shot #{doc.get('shot_number', '?')}"
+    if kind == "compilation":
+        return f"Compilation {doc.get('timestamp', '')[:16].replace('T', ' ')}"
+    return doc.get("name", "")
+
+@api_router.get("/projects/{project_id}/search")
+async def search_project(project_id: str, q: str = Query(..., min_length=1, max_length=200), types: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    """Ranked full-text search over the world bible, shots and compiled prompts.
+
+    `q` uses MongoDB text syntax ("exact phrase", -excluded); `types` filters to e.g. `shot,world`.
+    """
+    kinds = [t.strip() for t in types.split(",") if t.strip()] if types else list(SEARCH_FIELDS)
+    unknown = [k for k in kinds if k not in SEARCH_FIELDS]
+    if unknown:
+        raise HTTPException(400, f"Unknown search types: {', '.join(unknown)} (expected {', '.join(SEARCH_FIELDS)})")
+
+    async def search_kind(kind):
+        collection, weights = SEARCH_FIELDS[kind]
+        query = {"project_id": project_id, "$text": {"$search": q}}
+        if kind == "compilation":
+            query["cache_hit"] = {"$ne": True}  # cache hits repeat an earlier compilation's output
+        projection = {"_id": 0, "id": 1, "score": {"$meta": "textScore"}, **{f: 1 for f in weights}, **{f: 1 for f in SEARCH_EXTRA_FIELDS[kind]}}
+        docs = await db[collection].find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+        return [(kind, d) for d in docs]
+
+    found = [hit for hits in await asyncio.gather(*[search_kind(k) for k in kinds]) for hit in hits]
+    found.sort(key=lambda hit: hit[1]["score"], reverse=True)
+    find_highlights = highlighter(q)
+    results = []
+    for kind, doc in found[:limit]:
+        weights = SEARCH_FIELDS[kind][1]
+        results.append({
+            "type": kind, "id": doc["id"], "score": round(doc["score"], 4), "title": _search_title(kind, doc),
+            **{f: doc[f] for f in SEARCH_EXTRA_FIELDS[kind] if f in doc and f != "name"},
+            **make_snippet(doc, weights, find_highlights),
+        })
+    return {"query": q, "types": kinds, "total": len(results), "results": results}
 
 # ==================== EXPORT ====================
+# format=json returns the project with nested lists (the original shape). format=ndjson streams
+# one {"type": ..., "data": ...} record per line straight from Motor cursors, so memory stays
+# flat however many shots or compilations a project has; gzip=true compresses the stream.
+
+EXPORT_SECTIONS = [
+    # (record type, collection, JSON key, sort)
+    ("world", "worlds", "worlds", None),
+    ("character", "characters", "characters", None),
+    ("object", "objects", "objects", None),
+    ("scene", "scenes", "scenes", ("scene_number", 1)),
+    ("shot", "shots", "shots", ("shot_number", 1)),
+]
+COMPILATION_EXPORT_SECTION = ("compilation", "compilations", "compilations", ("timestamp", 1))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def _export_sections(include_compilations):
+    return EXPORT_SECTIONS + ([COMPILATION_EXPORT_SECTION] if include_compilations else [])
+
+def _export_cursor(collection, project_id, sort):
+    cursor = db[collection].find({"project_id": project_id}, {"_id": 0}, batch_size=500)
+    return cursor.sort(*sort) if sort else cursor
+
+async def iter_export_records(project, include_compilations=False):
+    yield "project", project
+    for kind, collection, _, sort in _export_sections(include_compilations):
+        async for doc in _export_cursor(collection, project["id"], sort):
+            yield kind, doc
+
+async def ndjson_stream(records, compress=False):
+    """Encode (type, doc) records as NDJSON in ~64KB chunks, optionally gzip-compressed."""
+    gz = zlib.compressobj(wbits=31) if compress else None
+    buf, size = [], 0
+    async for kind, doc in records:
+        line = orjson.dumps({"type": kind, "data": doc}, default=str) + b"\n"
+        buf.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(buf)
+            buf, size = [], 0
+            chunk = gz.compress(chunk) if gz else chunk
+            if chunk: yield chunk
+    chunk = b"".join(buf)
+    if gz:
+        chunk = gz.compress(chunk) + gz.flush()
+    if chunk: yield chunk
 
 @api_router.get("/projects/{project_id}/export")
-async def export_project(project_id: str):
+async def export_project(project_id: str, format: str = Query("json", pattern="^(json|ndjson)$"), gzip: bool = False, include_compilations: bool = False):
     project = await db.projects.find_one({"id": project_id}, {"_id": 0})
     if not project: raise HTTPException(404, "Project not found")
-    project["worlds"] = clean_docs(await db.worlds.find({"project_id": project_id}, {"_id": 0}).to_list(500))
-    project["characters"] = clean_docs(await db.characters.find({"project_id": project_id}, {"_id": 0}).to_list(500))
-    project["objects"] = clean_docs(await db.objects.find({"project_id": project_id}, {"_id": 0}).to_list(500))
-    project["scenes"] = clean_docs(await db.scenes.find({"project_id": project_id}, {"_id": 0}).sort("scene_number", 1).to_list(500))
-    project["shots"] = clean_docs(await db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(1000))
-    return project
+
+    if format == "ndjson":
+        filename = f"storyforge-{project_id}.ndjson" + (".gz" if gzip else "")
+        return StreamingResponse(
+            ndjson_stream(iter_export_records(project, include_compilations), compress=gzip),
+            media_type="application/gzip" if gzip else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    for _, collection, key, sort in _export_sections(include_compilations):
+        project[key] = await _export_cursor(collection, project_id, sort).to_list(None)
+    return fast_json(project)
+
+# ==================== IMPORT ====================
+# Accepts either export format. Rows are validated with the same models as the CRUD endpoints,
+# every id is remapped to a fresh one, and documents are written in insert_many(ordered=False)
+# batches. Problems are reported per row instead of failing the whole import.
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_MODELS = {"world": WorldCreate, "character": CharacterCreate, "object": ObjectCreate, "scene": SceneCreate, "shot": ShotCreate}
+IMPORT_COLLECTIONS = {kind: collection for kind, collection, _, _ in EXPORT_SECTIONS + [COMPILATION_EXPORT_SECTION]}
+
+class ProjectImporter:
+    def __init__(self):
+        self.project_id = None
+        self.id_map = {kind: {} for kind in IMPORT_COLLECTIONS}
+        self.buffers = {kind: [] for kind in IMPORT_COLLECTIONS}
+        self.inserted = {kind: 0 for kind in IMPORT_COLLECTIONS}
+        self.rows = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, row, kind, message):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "type": kind, "error": message})
+
+    async def add(self, kind, data, row):
+        self.rows += 1
+        if kind == "project":
+            if self.project_id:
+                return self.error(row, kind, "Duplicate project record")
+            return await self._add_project(data)
+        if not self.project_id:
+            raise HTTPException(400, "The first record must be the project")
+        if kind not in IMPORT_COLLECTIONS or not isinstance(data, dict):
+            return self.error(row, kind, "Unknown record type")
+        try:
+            doc = self._build(kind, data)
+        except ValidationError as e:
+            first = e.errors()[0]
+            return self.error(row, kind, f"{'.'.join(str(p) for p in first['loc'])}: {first['msg']}")
+        except ValueError as e:
+            return self.error(row, kind, str(e))
+        if data.get("id"):
+            self.id_map[kind][data["id"]] = doc["id"]
+        self.buffers[kind].append((row, doc))
+        if len(self.buffers[kind]) >= IMPORT_BATCH_SIZE:
+            # Write parents first so the orphan GC never sees a shot whose scene is still buffered
+            for k in IMPORT_COLLECTIONS:
+                await self.flush(k)
+                if k == kind: break
+
+    async def _add_project(self, data):
+        try:
+            doc = ProjectCreate(**data).model_dump()
+        except ValidationError as e:
+            raise HTTPException(400, f"Invalid project record: {e.errors()[0]['msg']}")
+        doc["id"] = self.project_id = new_id()
+        doc["created_at"] = doc["updated_at"] = utcnow()
+        await db.projects.insert_one(doc)
+
+    def _build(self, kind, data):
+        data = dict(data)
+        if kind == "scene":
+            data["world_id"] = self.id_map["world"].get(data.get("world_id") or "")
+            data["character_ids"] = [self.id_map["character"][c] for c in data.get("character_ids") or [] if c in self.id_map["character"]]
+        elif kind == "shot":
+            if data.get("scene_id") not in self.id_map["scene"]:
+                raise ValueError(f"Unknown scene_id: {data.get('scene_id')}")
+            data["scene_id"] = self.id_map["scene"][data["scene_id"]]
+
+        if kind == "compilation":
+            doc = {k: v for k, v in data.items() if k in ("timestamp", "input", "output", "prompt_hash", "cache_hit", "llm")}
+            doc["shot_id"] = self.id_map["shot"].get(data.get("shot_id") or "", "")
+            doc["input"] = {**(doc.get("input") or {}), "project_id": self.project_id, "shot_id": doc["shot_id"] or None}
+            doc.setdefault("timestamp", utcnow())
+        else:
+            doc = IMPORT_MODELS[kind](**data).model_dump()
+            doc["created_at"] = utcnow()
+            if kind in ("world", "character"):
+                doc["updated_at"] = doc["created_at"]
+            if kind == "shot":
+                doc["ai_generation_log"] = []
+        doc["id"] = new_id()
+        doc["project_id"] = self.project_id
+        return doc
+
+    async def flush(self, kind):
+        batch, self.buffers[kind] = self.buffers[kind], []
+        if not batch: return
+        try:
+            result = await db[IMPORT_COLLECTIONS[kind]].insert_many([doc for _, doc in batch], ordered=False)
+            self.inserted[kind] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            failed = e.details.get("writeErrors", [])
+            self.inserted[kind] += e.details.get("nInserted", len(batch) - len(failed))
+            for err in failed:
+                self.error(batch[err["index"]][0], kind, err.get("errmsg", "Insert failed"))
+
+    async def finish(self):
+        for kind in IMPORT_COLLECTIONS:
+            await self.flush(kind)
+        await rebuild_project_stats([self.project_id])
+        return {
+            "status": "imported", "project_id": self.project_id, "rows": self.rows,
+            "inserted": {IMPORT_COLLECTIONS[k]: n for k, n in self.inserted.items()},
+            "error_count": self.error_count, "errors": self.errors,
+        }
+
+async def _ndjson_lines(request, compressed):
+    inflate = zlib.decompressobj(wbits=47) if compressed else None  # 47: auto-detect gzip/zlib
+    pending = b""
+    async for chunk in request.stream():
+        pending += inflate.decompress(chunk) if inflate else chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if inflate:
+        pending += inflate.flush()
+    for line in pending.split(b"\n"):
+        yield line
+
+@api_router.post("/projects/import")
+async def import_project(request: Request, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
+    """Import a project from the export format (JSON document or NDJSON stream, optionally gzipped)."""
+    content_type = request.headers.get("content-type", "")
+    compressed = request.headers.get("content-encoding", "") == "gzip" or "gzip" in content_type
+    importer = ProjectImporter()
+
+    if (format or ("ndjson" if "ndjson" in content_type or compressed else "json")) == "ndjson":
+        row = 0
+        async for line in _ndjson_lines(request, compressed):
+            if not line.strip(): continue
+            row += 1
+            try:
+                record = orjson.loads(line)
+                kind, data = record["type"], record["data"]
+            except (ValueError, KeyError, TypeError):
+                if row == 1: raise HTTPException(400, "The first record must be the project")
+                importer.rows += 1
+                importer.error(row, "", "Malformed NDJSON record")
+                continue
+            await importer.add(kind, data, row)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "Body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPException(400, "Expected an exported project object")
+        sections = EXPORT_SECTIONS + [COMPILATION_EXPORT_SECTION]
+        await importer.add("project", {k: v for k, v in body.items() if k not in {key for _, _, key, _ in sections}}, 0)
+        row = 0
+        for kind, _, key, _ in sections:
+            for data in body.get(key) or []:
+                row += 1
+                await importer.add(kind, data, row)
+
+    if not importer.project_id:
+        raise HTTPException(400, "No project record found")
+    return await importer.finish()
 
 # ==================== DASHBOARD STATS ====================
 
 @api_router.get("/dashboard/stats")
 async def dashboard_stats():
-    project_count = await db.projects.count_documents({})
-    total_shots = await db.shots.count_documents({})
+    project_ids = await db.projects.distinct("id")
+    project_count = len(project_ids)
     total_worlds = await db.worlds.count_documents({})
     total_characters = await db.characters.count_documents({})
-    shots = await db.shots.find({}, {"_id": 0, "production_status": 1, "duration_target_sec": 1}).to_list(10000)
-    stage_counts = {stage: sum(1 for s in shots if s.get("production_status") == stage) for stage in PRODUCTION_STAGES}
-    total_duration = sum(s.get("duration_target_sec", 0) for s in shots)
+    rollups = (await get_project_stats(project_ids)).values()
+    total_shots = sum(r["shot_count"] for r in rollups)
+    stage_counts = {stage: sum(r["stage_counts"][stage] for r in rollups) for stage in PRODUCTION_STAGES}
+    total_duration = sum(r["total_duration"] for r in rollups)
     return {"project_count": project_count, "total_shots": total_shots, "total_worlds": total_worlds, "total_characters": total_characters, "stage_counts": stage_counts, "total_duration_sec": total_duration}
 
+def _stats_fingerprint(stats):
+    return (stats["shot_count"], round(stats["total_duration"], 3), tuple(stats["stage_counts"][stage] for stage in PRODUCTION_STAGES))
+
+@api_router.post("/dashboard/stats/rebuild")
+async def rebuild_stats(project_id: Optional[str] = None):
+    """Recompute project_stats rollups from the shots collection and report which ones had drifted."""
+    if project_id and not await db.projects.find_one({"id": project_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(404, "Project not found")
+    project_ids = [project_id] if project_id else await db.projects.distinct("id")
+    current = {d["project_id"]: _normalize_stats(d) async for d in db.project_stats.find({"project_id": {"$in": project_ids}}, {"_id": 0})}
+    rebuilt = await rebuild_project_stats(project_ids)
+    drifted = [pid for pid in project_ids if pid not in current or _stats_fingerprint(current[pid]) != _stats_fingerprint(rebuilt[pid])]
+    if drifted:
+        await db.projects.update_many({"id": {"$in": drifted}}, {"$inc": {"revision": 1}})
+    removed = 0
+    if not project_id:
+        removed = (await db.project_stats.delete_many({"project_id": {"$nin": project_ids}})).deleted_count
+    return {"status": "rebuilt", "projects": len(project_ids), "drifted": drifted, "orphans_removed": removed}
+
+# ==================== ORPHAN GC ====================
+# Finds documents whose parent is gone with one $lookup per rule (against the parent's unique id
+# index) and deletes them in batches. Runs every GC_INTERVAL_SEC (0 disables) and on demand.
+
+GC_INTERVAL_SEC = float(os.environ.get("GC_INTERVAL_SEC", "3600"))
+GC_DELETE_BATCH = 1000
+
+# (collection, local field, parent collection). Empty local values (e.g. a compilation with no shot) are skipped.
+# Shots are only collected with their project: scene_id is not validated on write and delete_scene
+# already removes its shots, so a shot pointing at a missing scene may still be live work.
+GC_RULES = [
+    ("worlds", "project_id", "projects"),
+    ("characters", "project_id", "projects"),
+    ("objects", "project_id", "projects"),
+    ("scenes", "project_id", "projects"),
+    ("shots", "project_id", "projects"),
+    ("compilations", "project_id", "projects"),
+    ("compilations", "shot_id", "shots"),
+    ("notion_pages", "project_id", "projects"),
+    ("notion_pages", "shot_id", "shots"),
+    ("notion_sync_log", "project_id", "projects"),
+    ("compile_jobs", "project_id", "projects"),
+    ("llm_calls", "project_id", "projects"),
+    ("project_stats", "project_id", "projects"),
+]
+
+gc_task = None
+last_gc_report = None
+
+async def find_orphans(collection, field, parent):
+    cursor = db[collection].aggregate([
+        {"$match": {field: {"$nin": [None, ""]}}},
+        {"$project": {"_id": 1, field: 1}},
+        {"$lookup": {"from": parent, "localField": field, "foreignField": "id", "pipeline": [{"$project": {"_id": 1}}], "as": "parent"}},
+        {"$match": {"parent": {"$size": 0}}},
+        {"$project": {"_id": 1, "project_id": 1}},
+    ])
+    return await cursor.to_list(None)
+
+async def collect_orphans():
+    """Delete orphaned documents. Rules run in order, so shots of a removed project go before their compilations."""
+    started = time.monotonic()
+    freed, touched, shot_projects = {}, set(), set()
+    for collection, field, parent in GC_RULES:
+        orphans = await find_orphans(collection, field, parent)
+        touched.update(d.get("project_id") for d in orphans)
+        if collection == "shots":
+            shot_projects.update(d.get("project_id") for d in orphans)
+        for i in range(0, len(orphans), GC_DELETE_BATCH):
+            result = await db[collection].delete_many({"_id": {"$in": [d["_id"] for d in orphans[i:i + GC_DELETE_BATCH]]}})
+            freed[collection] = freed.get(collection, 0) + result.deleted_count
+    live_shot_projects = await db.projects.distinct("id", {"id": {"$in": list(shot_projects)}}) if shot_projects else []
+    if live_shot_projects:
+        await rebuild_project_stats(live_shot_projects)  # the deletes above bypassed inc_project_stats
+    if touched:
+        # Orphans under a live project (e.g. compilations of a deleted shot) were visible in its listings
+        await db.projects.update_many({"id": {"$in": list(touched)}}, {"$inc": {"revision": 1}})
+    report = {"finished_at": utcnow(), "duration_ms": round((time.monotonic() - started) * 1000), "freed": freed, "total": sum(freed.values())}
+    if report["total"]:
+        logger.info(f"Orphan GC freed {report['total']} documents: {freed}")
+    return report
+
+async def gc_loop():
+    global last_gc_report
+    while True:
+        await asyncio.sleep(GC_INTERVAL_SEC)
+        try:
+            last_gc_report = await collect_orphans()
+        except Exception as e:
+            logger.error(f"Orphan GC failed: {e}")
+
+@app.on_event("startup")
+async def start_gc():
+    global gc_task
+    if GC_INTERVAL_SEC > 0:
+        gc_task = asyncio.create_task(gc_loop())
+
+@app.on_event("shutdown")
+async def stop_gc():
+    if gc_task:
+        gc_task.cancel()
+
+@api_router.post("/maintenance/gc")
+async def run_gc():
+    global last_gc_report
+    last_gc_report = await collect_orphans()
+    return last_gc_report
+
+@api_router.get("/maintenance/gc")
+async def get_gc_report():
+    return {"interval_sec": GC_INTERVAL_SEC, "last_run": last_gc_report}
+
 # ==================== ENUMS ====================
 
 @api_router.get("/enums")
@@ -911,14 +2361,18 @@ async def seed_example_project():
                 "reference_images": [], "notes": "", "ai_generation_log": [], "created_at": utcnow()
             })
             snum += 1
-    if inserts: await db.shots.insert_many(inserts)
+    if inserts:
+        await db.shots.insert_many(inserts)
+        await rebuild_project_stats([pid])
 
     return {"status": "seeded", "project_id": pid, "worlds": len(worlds_data), "characters": len(chars_data), "scenes": len(scenes_data), "shots": len(inserts)}
 
 # ==================== APP ====================
 
 app.include_router(api_router)
-app.add_middleware(CORSMiddleware, allow_credentials=True, allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','), allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_credentials=True, allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','), allow_methods=["*"], allow_headers=["*"], expose_headers=["X-Next-Cursor", "ETag"])
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")), gzip_level=int(os.environ.get("COMPRESSION_GZIP_LEVEL", "4")))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -0,0 +1,129 @@
+"""Near-duplicate index over one project's past compile inputs.
+
+An input splits into its parameters (world, characters, zone, framing, camera, time,
+weather, reference and continuity frames, serving provider, and a hash of the brand, world
+and character context the prompt was rendered with), which must match exactly, and its
+text (scene description plus additional context), which only has to be similar.
+Text is reduced to hashed word unigrams and bigrams; a 64-bin one-permutation MinHash
+signature cut into 16 bands of 4 finds candidates sharing a band with the query (LSH), and
+candidates are then scored by the exact Jaccard similarity of their feature sets.
+
+At Jaccard 0.8 a true match shares at least one band with probability > 0.999; at 0.5
+it is still found ~64% of the time, which is why thresholds below 0.5 are not offered.
+"""
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PARAM_FIELDS = ("world_id", "character_ids", "emotional_zone", "framing", "camera_movement", "time_of_day", "weather",
+                "reference_images", "prev_shot_last_frame", "next_shot_first_frame")
+TEXT_FIELDS = ("scene_description", "additional_context")
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+@lru_cache(maxsize=65536)
+def _gram_hash(gram):
+    return int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little")
+
+
+def features(inputs):
+    """64-bit hashes of the word unigrams and bigrams in the input's text fields."""
+    words = _WORD.findall(" ".join(inputs.get(f) or "" for f in TEXT_FIELDS).lower())
+    grams = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+    return frozenset(map(_gram_hash, grams))
+
+
+def params_key(inputs, provider, context):
+    params = {f: inputs.get(f) for f in PARAM_FIELDS}
+    params["character_ids"] = sorted(params["character_ids"] or [])
+    params["provider"] = provider
+    params["context"] = context
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def signature(feature_set):
+    """One-permutation MinHash: each hash lands in bin h % NUM_PERM, which keeps its minimum.
+
+    Empty bins borrow the nearest filled bin to their right (wrapping) tagged with the distance,
+    so short texts still get a full signature without k separate hash passes.
+    """
+    bins = [None] * NUM_PERM
+    for h in feature_set:
+        b, v = h % NUM_PERM, h // NUM_PERM
+        if bins[b] is None or v < bins[b]:
+            bins[b] = v
+    sig, nearest, distance = list(bins), None, 0
+    for i in reversed(range(2 * NUM_PERM)):  # second lap fills the empty bins, wrapping past the end
+        if bins[i % NUM_PERM] is not None:
+            nearest, distance = bins[i % NUM_PERM], 0
+        else:
+            distance += 1
+            if i < NUM_PERM:
+                sig[i] = (nearest, distance)
+    return tuple(sig)
+
+
+def jaccard(a, b):
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+class SimilarityIndex:
+    def __init__(self, compilations=()):
+        self.entries = {}  # compilation id -> (params key, features, timestamp, band keys)
+        self.buckets = {}  # (params key, band, band values) -> compilation ids
+        for c in compilations:
+            self.add(c["id"], c.get("input") or {}, c.get("llm", {}).get("provider", ""), c.get("context_hash", ""), c.get("timestamp", ""))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _features(self, inputs, provider, context):
+        """(params key, feature set, band keys) for an input, or None if it has no text."""
+        feature_set = features(inputs)
+        if not feature_set:
+            return None
+        key = params_key(inputs, provider, context)
+        sig = signature(feature_set)
+        return key, feature_set, [(key, b, sig[b * ROWS:(b + 1) * ROWS]) for b in range(BANDS)]
+
+    def add(self, compilation_id, inputs, provider, context, timestamp):
+        computed = None if compilation_id in self.entries else self._features(inputs, provider, context)
+        if computed is None:
+            return
+        key, feature_set, bands = computed
+        self.entries[compilation_id] = (key, feature_set, timestamp, bands)
+        for band in bands:
+            self.buckets.setdefault(band, set()).add(compilation_id)
+
+    def remove(self, compilation_id):
+        entry = self.entries.pop(compilation_id, None)
+        if entry is None:
+            return
+        for band in entry[3]:
+            ids = self.buckets.get(band)
+            ids.discard(compilation_id)
+            if not ids:
+                del self.buckets[band]
+
+    def closest(self, inputs, provider, context, threshold):
+        """(compilation id, similarity) of the best prior input scoring >= threshold, newest first on ties, or None."""
+        computed = self._features(inputs, provider, context)
+        if computed is None:
+            return None
+        _, feature_set, bands = computed
+        candidates = set()
+        for band in bands:
+            candidates.update(self.buckets.get(band, ()))
+        best = None
+        for cid in candidates:
+            _, other, timestamp, _ = self.entries[cid]
+            score = jaccard(feature_set, other)
+            if score >= threshold and (best is None or (score, timestamp) > best[:2]):
+                best = (score, timestamp, cid)
+        return (best[2], round(best[0], 4)) if best else None
@@ -0,0 +1,1225 @@
+"""In-memory storage engine with the subset of Motor's API the server uses.
+
+STORAGE_ENGINE=memory swaps the Motor client for MemoryClient, so the whole API
+runs in-process without a MongoDB server (tests, benchmarks, demos). Data lives
+only as long as the process.
+
+Documents are copied on the way in and out, writes are atomic per operation,
+and results and errors are PyMongo's own classes (UpdateResult, BulkWriteError,
+DuplicateKeyError, ...), so handlers can't tell the engines apart. Indexes made
+with create_index are maintained too: unique ones are enforced, and every index
+answers equality/$in lookups on its first field instead of a full scan.
+
+Only the operators the server uses are implemented (the sets below), and
+every filter, update, projection and pipeline is checked against them before a
+cursor is built or a document is touched: anything else raises
+NotImplementedError at the call site instead of behaving differently from
+MongoDB, or failing halfway through a multi-document write. $text runs against
+a text index (terms, "phrases" and -negations, with a simplified English
+stemmer; textScore is term-frequency based like MongoDB's, though not
+numerically identical). $lookup takes localField/foreignField, optionally with
+a pipeline.
+"""
+import asyncio
+import itertools
+import math
+import re
+from collections import Counter
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+MISSING = object()
+
+QUERY_OPERATORS = frozenset({"$eq", "$ne", "$gt", "$gte", "$lt", "$in", "$nin", "$exists", "$size"})
+LOGICAL_OPERATORS = frozenset({"$and", "$or"})
+UPDATE_OPERATORS = frozenset({"$set", "$inc", "$push", "$pull"})
+STAGES = frozenset({"$match", "$project", "$addFields", "$group", "$sort", "$facet", "$lookup"})
+EXPRESSION_OPERATORS = frozenset({"$ifNull", "$cond", "$eq", "$size", "$arrayElemAt", "$subtract", "$multiply",
+                                  "$floor", "$toInt", "$substrBytes"})
+ACCUMULATORS = frozenset({"$sum", "$push"})
+
+
+def _copy(value):
+    t = type(value)
+    if t is dict:
+        return {k: _copy(v) if type(v) in (dict, list) else v for k, v in value.items()}
+    if t is list:
+        return [_copy(v) if type(v) in (dict, list) else v for v in value]
+    return value
+
+
+# ---- BSON ordering ----
+
+def _type_rank(value):
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 1:
+        return (1, 0)
+    if rank == 4:
+        return (4, tuple((k, _sort_key(v)) for k, v in value.items()))
+    if rank == 5:
+        return (5, tuple(_sort_key(v) for v in value))
+    if rank == 10:
+        return (10, str(value))
+    return (rank, value)
+
+
+def _equal(a, b):
+    if a is MISSING:
+        a = None
+    if b is MISSING:
+        b = None
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    if isinstance(a, dict) and isinstance(b, dict):
+        return list(a) == list(b) and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _compare(a, b):
+    """-1/0/1 in BSON order."""
+    ka, kb = _sort_key(a), _sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return ("\x00dict", tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("\x00list", tuple(_hashable(v) for v in value))
+    if value is MISSING:
+        return None
+    return value
+
+
+# ---- paths ----
+
+def _resolve(doc, parts):
+    """Every value reached by a dotted path, descending into arrays of sub-documents."""
+    if not parts:
+        return [doc]
+    if isinstance(doc, dict):
+        if parts[0] not in doc:
+            return [MISSING]
+        return _resolve(doc[parts[0]], parts[1:])
+    if isinstance(doc, list):
+        if parts[0].isdigit():
+            i = int(parts[0])
+            return _resolve(doc[i], parts[1:]) if i < len(doc) else [MISSING]
+        values = []
+        for item in doc:
+            if isinstance(item, dict):
+                values.extend(v for v in _resolve(item, parts) if v is not MISSING)
+        return values or [MISSING]
+    return [MISSING]
+
+
+def _get(doc, path):
+    return _resolve(doc, path.split("."))[0] if "." in path else doc.get(path, MISSING)
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if isinstance(doc, list):
+            doc = doc[int(part)]
+        else:
+            doc = doc.setdefault(part, {})
+    if isinstance(doc, list):
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
+
+
+def _unset_path(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part) if isinstance(doc, dict) else None
+        if doc is None:
+            return
+    if isinstance(doc, dict):
+        doc.pop(parts[-1], None)
+
+
+# ---- queries ----
+
+def _is_operator_dict(value):
+    return isinstance(value, dict) and value and all(k.startswith("$") for k in value)
+
+
+def _expand(values):
+    """Candidate values for a comparison: each value, plus the elements of array values."""
+    out = []
+    for v in values:
+        out.append(v)
+        if isinstance(v, list):
+            out.extend(v)
+    return out
+
+
+def _match_operators(values, ops):
+    for op, arg in ops.items():
+        if op == "$eq":
+            ok = any(_equal(v, arg) for v in _expand(values))
+        elif op == "$ne":
+            ok = not any(_equal(v, arg) for v in _expand(values))
+        elif op in ("$gt", "$gte", "$lt"):
+            ok = False
+            for v in _expand(values):
+                if v is MISSING or _type_rank(v) != _type_rank(arg):
+                    continue
+                c = _compare(v, arg)
+                if {"$gt": c > 0, "$gte": c >= 0, "$lt": c < 0}[op]:
+                    ok = True
+                    break
+        elif op == "$in":
+            ok = any(_equal(v, a) for v in _expand(values) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equal(v, a) for v in _expand(values) for a in arg)
+        elif op == "$exists":
+            ok = any(v is not MISSING for v in values) == bool(arg)
+        else:  # $size
+            ok = any(isinstance(v, list) and len(v) == arg for v in values)
+        if not ok:
+            return False
+    return True
+
+
+def _match_condition(values, cond):
+    if _is_operator_dict(cond):
+        return _match_operators(values, cond)
+    return any(_equal(v, cond) for v in _expand(values))
+
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(matches(doc, q) for q in cond)
+        else:
+            ok = _match_condition(_resolve(doc, key.split(".")), cond)
+        if not ok:
+            return False
+    return True
+
+
+def _equality_fields(query):
+    """Top-level field -> candidate values for equality/$in conditions, including those inside $and."""
+    fields = {}
+    for key, cond in query.items():
+        if key == "$and":
+            for q in cond:
+                for f, vals in _equality_fields(q).items():
+                    fields.setdefault(f, vals)
+        elif key.startswith("$"):
+            continue
+        elif not _is_operator_dict(cond):
+            fields.setdefault(key, [cond])
+        elif "$eq" in cond:
+            fields.setdefault(key, [cond["$eq"]])
+        elif "$in" in cond:
+            fields.setdefault(key, list(cond["$in"]))
+    return fields
+
+
+# ---- projection, sort ----
+
+def _include(doc, paths, include_id):
+    out = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+    for path in paths:
+        if "." not in path:
+            if path in doc:
+                out[path] = _copy(doc[path])
+            continue
+        value = _get(doc, path)
+        if value is not MISSING:
+            _set_path(out, path, _copy(value))
+    return out
+
+
+def project(doc, projection, score=None):
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {f: 1 for f in projection}
+    meta = [k for k, v in projection.items() if isinstance(v, dict)]
+    fields = {k: v for k, v in projection.items() if k != "_id" and k not in meta}
+    include_id = bool(projection.get("_id", 1))
+    if fields and all(fields.values()) or not fields and include_id and not meta:
+        out = _include(doc, fields, include_id)
+    elif any(fields.values()):
+        raise OperationFailure("Cannot do inclusion on a field in exclusion projection", code=31254)
+    else:
+        out = _copy(doc)
+        for path in fields:
+            _unset_path(out, path)
+        if not include_id:
+            out.pop("_id", None)
+    for k in meta:  # {"$meta": "textScore"}
+        out[k] = score
+    return out
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(k, d) for k, d in key_or_list]
+
+
+def sort_docs(docs, spec, scores=None):
+    for field, direction in reversed(spec):
+        if isinstance(direction, dict):  # {"$meta": "textScore"}: best match first
+            docs.sort(key=lambda doc: scores[_hashable(doc["_id"])], reverse=True)
+            continue
+
+        def key(doc, field=field, direction=direction):
+            value = _get(doc, field)
+            if isinstance(value, list) and value:
+                keys = [_sort_key(v) for v in value]
+                return min(keys) if direction == 1 else max(keys)
+            return _sort_key(value)
+        docs.sort(key=key, reverse=direction == -1)
+    return docs
+
+
+# ---- text search ----
+
+_STOP_WORDS = frozenset("a an and are as at be but by for from has have he her his in is it its of on or she that the their they this to was were will with".split())
+_WORD = re.compile(r"\w+")
+
+
+def _stem(word):
+    """Plural and -ed/-ing stripping (roughly Porter step 1), enough to match word variants."""
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def text_tokens(text):
+    return [_stem(w) for w in _WORD.findall(text.lower()) if w not in _STOP_WORDS]
+
+
+def parse_text_search(search):
+    """(terms, negated terms, phrases) from a $search string."""
+    phrases = [p.lower() for p in re.findall(r'"([^"]+)"', search)]
+    terms, negated = set(), set()
+    for word in re.findall(r"-?\w+", re.sub(r'"[^"]*"', " ", search).lower()):
+        target = negated if word.startswith("-") else terms
+        word = word.lstrip("-")
+        if word and word not in _STOP_WORDS:
+            target.add(_stem(word))
+    for phrase in phrases:
+        terms.update(text_tokens(phrase))
+    return terms, negated, phrases
+
+
+def _text_of(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return " ".join(v for v in value if isinstance(v, str))
+    return ""
+
+
+# ---- updates ----
+
+def apply_update(doc, update):
+    """Apply update operators (already checked by check_update) to `doc` in place."""
+    for op, spec in update.items():
+        for path, arg in spec.items():
+            if op == "$set":
+                _set_path(doc, path, _copy(arg))
+            elif op == "$inc":
+                current = _get(doc, path)
+                if current is MISSING:
+                    _set_path(doc, path, arg)
+                elif not isinstance(current, (int, float)) or isinstance(current, bool):
+                    raise WriteError(f"Cannot apply $inc to a value of non-numeric type at '{path}'", code=14)
+                else:
+                    _set_path(doc, path, current + arg)
+            elif op == "$push":
+                current = _get(doc, path)
+                if current is MISSING:
+                    current = []
+                    _set_path(doc, path, current)
+                elif not isinstance(current, list):
+                    raise WriteError(f"The field '{path}' must be an array", code=2)
+                current.append(_copy(arg))
+            else:  # $pull
+                current = _get(doc, path)
+                if not isinstance(current, list):
+                    continue
+                if _is_operator_dict(arg):
+                    keep = [e for e in current if not _match_operators([e], arg)]
+                elif isinstance(arg, dict):
+                    keep = [e for e in current if not (isinstance(e, dict) and matches(e, arg))]
+                else:
+                    keep = [e for e in current if not _equal(e, arg)]
+                current[:] = keep
+
+
+def _upsert_seed(query):
+    doc = {}
+    for key, cond in query.items():
+        if key == "$and":
+            for q in cond:
+                doc.update(_upsert_seed(q))
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_dict(cond):
+            if "$eq" in cond:
+                _set_path(doc, key, _copy(cond["$eq"]))
+        else:
+            _set_path(doc, key, _copy(cond))
+    return doc
+
+
+# ---- aggregation expressions ----
+
+def evaluate(expr, doc):
+    if isinstance(expr, str):
+        return _get(doc, expr[1:]) if expr.startswith("$") else expr
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, arg = next(iter(expr.items()))
+            if op.startswith("$"):
+                return _operator(op, arg, doc)
+        return {k: _present(evaluate(v, doc)) for k, v in expr.items()}
+    return expr
+
+
+def _present(value):
+    return None if value is MISSING else value
+
+
+def _args(arg, doc):
+    return [_present(v) for v in evaluate(arg if isinstance(arg, list) else [arg], doc)]
+
+
+def _operator(op, arg, doc):
+    if op == "$ifNull":
+        values = [evaluate(a, doc) for a in arg]
+        for v in values[:-1]:
+            if v is not None and v is not MISSING:
+                return v
+        return values[-1]
+    if op == "$cond":
+        if isinstance(arg, dict):
+            arg = [arg["if"], arg["then"], arg["else"]]
+        return evaluate(arg[1], doc) if _truthy(evaluate(arg[0], doc)) else evaluate(arg[2], doc)
+
+    values = _args(arg, doc)
+    if op == "$eq":
+        return _compare(values[0], values[1]) == 0
+    if any(v is None for v in values):
+        return None
+    if op == "$subtract":
+        return values[0] - values[1]
+    if op == "$multiply":
+        result = 1
+        for v in values:
+            result *= v
+        return result
+    if op == "$floor":
+        return math.floor(values[0]) if isinstance(values[0], int) else float(math.floor(values[0]))
+    if op == "$toInt":
+        return int(values[0])
+    if op == "$size":
+        if not isinstance(values[0], list):
+            raise OperationFailure("The argument to $size must be an array", code=17124)
+        return len(values[0])
+    if op == "$arrayElemAt":
+        array, i = values
+        return array[i] if -len(array) <= i < len(array) else MISSING
+    text, start, length = values  # $substrBytes
+    return str(text)[start:start + length] if length >= 0 else str(text)[start:]
+
+
+def _truthy(value):
+    return value not in (None, False, 0, MISSING)
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _present(evaluate(spec["_id"], doc))
+        state = groups.setdefault(_hashable(key), {"_id": key, "_docs": []})
+        state["_docs"].append(doc)
+    out = []
+    for state in groups.values():
+        row = {"_id": state["_id"]}
+        members = state.pop("_docs")
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, arg), = acc.items()
+            values = [evaluate(arg, d) for d in members]
+            if op == "$sum":
+                row[field] = sum(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool))
+            else:  # $push
+                row[field] = [_copy(v) for v in values if v is not MISSING]
+        out.append(row)
+    return out
+
+
+def _project_stage(doc, spec):
+    flags = {k: v for k, v in spec.items() if isinstance(v, (bool, int)) and v in (0, 1)}
+    computed = {k: v for k, v in spec.items() if k not in flags}
+    if not computed:
+        return project(doc, flags)
+    out = _include(doc, [k for k, v in flags.items() if v and k != "_id"], flags.get("_id", 1))
+    for k, expr in computed.items():
+        value = evaluate(expr, doc)
+        if value is not MISSING:
+            _set_path(out, k, _copy(value))
+    return out
+
+
+# ---- checks: run before any cursor is built or document touched ----
+
+def _unsupported(kind, name):
+    raise NotImplementedError(f"{kind} {name} is not supported by the memory engine")
+
+
+def check_query(query, text=True):
+    """Reject filters using anything outside QUERY_OPERATORS / LOGICAL_OPERATORS; $text only where `text` allows it."""
+    for key, cond in (query or {}).items():
+        if key in LOGICAL_OPERATORS:
+            for q in cond:
+                check_query(q, text=False)
+        elif key == "$text":
+            if not text or set(cond) != {"$search"}:
+                _unsupported("Query", f"$text {cond}")
+        elif key.startswith("$"):
+            _unsupported("Query operator", key)
+        elif isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op in cond:
+                if op not in QUERY_OPERATORS:
+                    _unsupported("Query operator", op)
+        elif isinstance(cond, re.Pattern):
+            _unsupported("Query", "regular expression")
+
+
+def check_update(update):
+    if not update or not all(k.startswith("$") for k in update):
+        raise WriteError("Update document requires atomic operators", code=9)
+    for op, spec in update.items():
+        if op not in UPDATE_OPERATORS:
+            _unsupported("Update operator", op)
+        for arg in spec.values():
+            if op == "$pull" and isinstance(arg, dict):
+                check_query(arg if not _is_operator_dict(arg) else {"value": arg}, text=False)
+            elif op == "$push" and isinstance(arg, dict) and any(k.startswith("$") for k in arg):
+                _unsupported("Update modifier", next(k for k in arg if k.startswith("$")))
+
+
+def check_expression(expr):
+    if isinstance(expr, str) and expr.startswith("$$"):
+        _unsupported("Variable", expr)
+    elif isinstance(expr, list):
+        for e in expr:
+            check_expression(e)
+    elif isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith("$"):
+            (op, arg), = expr.items()
+            if op not in EXPRESSION_OPERATORS:
+                _unsupported("Expression operator", op)
+            expr = arg if isinstance(arg, dict) else {"args": arg}  # $cond may name its branches
+        for v in expr.values():
+            check_expression(v)
+
+
+def check_projection(projection):
+    for v in (projection.values() if isinstance(projection, dict) else ()):
+        if isinstance(v, dict) and v != {"$meta": "textScore"}:
+            _unsupported("Projection", v)
+
+
+def check_pipeline(pipeline, text=True):
+    """Reject pipelines using anything outside STAGES, EXPRESSION_OPERATORS and ACCUMULATORS."""
+    for i, stage in enumerate(pipeline):
+        if len(stage) != 1 or next(iter(stage)) not in STAGES:
+            _unsupported("Aggregation stage", ", ".join(stage))
+        (name, spec), = stage.items()
+        if name == "$match":
+            check_query(spec, text=text and i == 0)  # $text only as the leading $match, like MongoDB
+        elif name in ("$project", "$addFields"):
+            for v in spec.values():
+                if name == "$addFields" or not (isinstance(v, (bool, int)) and v in (0, 1)):
+                    check_expression(v)
+        elif name == "$group":
+            check_expression(spec["_id"])
+            for field, acc in spec.items():
+                if field == "_id":
+                    continue
+                if not isinstance(acc, dict) or len(acc) != 1 or next(iter(acc)) not in ACCUMULATORS:
+                    _unsupported("Accumulator", acc)
+                check_expression(next(iter(acc.values())))
+        elif name == "$sort":
+            if any(d not in (1, -1) for _, d in _normalize_sort(spec)):
+                _unsupported("Aggregation $sort", spec)
+        elif name == "$facet":
+            for sub in spec.values():
+                check_pipeline(sub, text=False)
+        else:  # $lookup
+            if "let" in spec or not {"from", "localField", "foreignField", "as"} <= spec.keys():
+                _unsupported("$lookup", "without localField/foreignField")
+            check_pipeline(spec.get("pipeline") or [], text=False)
+
+
+class MemoryClient:
+    """Stands in for AsyncIOMotorClient."""
+
+    def __init__(self):
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    get_database = __getitem__
+
+    async def drop_database(self, name_or_database):
+        name = getattr(name_or_database, "name", name_or_database)
+        if name in self._databases:
+            for collection in self._databases[name]._collections.values():
+                collection._reset()
+
+    async def list_database_names(self):
+        return list(self._databases)
+
+    def close(self):
+        pass
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    get_collection = __getitem__
+
+    async def command(self, command, *args, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the memory engine")
+
+    async def list_collection_names(self):
+        return [name for name, c in self._collections.items() if c._docs or c._indexes]
+
+    async def drop_collection(self, name):
+        # Empty the collection in place: like Motor's, handles held elsewhere stay usable after a drop
+        collection = self._collections.get(getattr(name, "name", name))
+        if collection:
+            collection._reset()
+
+
+class _Index:
+    def __init__(self, keys, unique):
+        self.keys = keys
+        self.unique = unique
+        self.first = keys[0][0]
+        self.prefix = {}  # hashable first-field value -> set of _ids
+        self.entries = {}  # full key -> _id, unique indexes only
+
+    def _prefix_keys(self, doc):
+        value = _get(doc, self.first)
+        keys = {_hashable(value)}
+        if isinstance(value, list):
+            keys.update(_hashable(v) for v in value)
+        return keys
+
+    def full_key(self, doc):
+        return tuple(_hashable(_get(doc, field)) for field, _ in self.keys)
+
+    def add(self, _id, doc):
+        for k in self._prefix_keys(doc):
+            self.prefix.setdefault(k, set()).add(_id)
+        if self.unique:
+            self.entries[self.full_key(doc)] = _id
+
+    def remove(self, _id, doc):
+        for k in self._prefix_keys(doc):
+            ids = self.prefix.get(k)
+            if ids is not None:
+                ids.discard(_id)
+                if not ids:
+                    del self.prefix[k]
+        if self.unique and self.entries.get(self.full_key(doc)) == _id:
+            del self.entries[self.full_key(doc)]
+
+    def conflict(self, _id, doc):
+        if not self.unique:
+            return False
+        other = self.entries.get(self.full_key(doc))
+        return other is not None and other != _id
+
+
+class _TextIndex:
+    """Inverted index over the text fields of a text index; non-text keys act as an equality prefix."""
+    unique = False
+
+    def __init__(self, keys, weights):
+        self.keys = keys
+        prefix = [field for field, kind in keys if kind != "text"]
+        self.first = prefix[0] if prefix else None
+        self._prefix_index = _Index([(self.first, 1)], False) if prefix else None
+        self.prefix = self._prefix_index.prefix if prefix else {}
+        self.weights = {field: (weights or {}).get(field, 1) for field, kind in keys if kind == "text"}
+        self.postings = {}  # token -> set of _ids
+        self.docs = {}  # _id -> {field: (token counts, token total)}
+
+    def add(self, _id, doc):
+        if self._prefix_index:
+            self._prefix_index.add(_id, doc)
+        fields = {}
+        for field in self.weights:
+            tokens = text_tokens(_text_of(_get(doc, field)))
+            if tokens:
+                fields[field] = (Counter(tokens), len(tokens))
+                for token in fields[field][0]:
+                    self.postings.setdefault(token, set()).add(_id)
+        self.docs[_id] = fields
+
+    def remove(self, _id, doc):
+        if self._prefix_index:
+            self._prefix_index.remove(_id, doc)
+        for counts, _ in self.docs.pop(_id, {}).values():
+            for token in counts:
+                ids = self.postings.get(token)
+                if ids is not None:
+                    ids.discard(_id)
+                    if not ids:
+                        del self.postings[token]
+
+    def conflict(self, _id, doc):
+        return False
+
+    def search(self, search, docs):
+        """_id -> textScore for documents matching a $search string."""
+        terms, negated, phrases = parse_text_search(search)
+        ids = set().union(*(self.postings.get(t, ()) for t in terms)) if terms else set()
+        for token in negated:
+            ids -= self.postings.get(token, set())
+        scores = {}
+        for _id in ids:
+            if phrases:
+                text = " ".join(_text_of(_get(docs[_id], f)) for f in self.weights).lower()
+                if not all(p in text for p in phrases):
+                    continue
+            score = 0.0
+            for field, (counts, total) in self.docs[_id].items():
+                for term in terms:
+                    if term in counts:
+                        score += self.weights[field] * (0.5 + 0.5 * counts[term] / total)
+            scores[_id] = score
+        return scores
+
+
+def _duplicate_message(collection, name, index, doc):
+    key = ", ".join(f"{field}: {_present(_get(doc, field))!r}" for field, _ in index.keys)
+    return f"E11000 duplicate key error collection: {collection.full_name} index: {name} dup key: {{ {key} }}"
+
+
+class MemoryCursor:
+    """find() / aggregate() result: chain sort/skip/limit, then to_list() or `async for`."""
+
+    def __init__(self, produce):
+        self._produce = produce
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._docs = None
+        self._pos = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _results(self):
+        if self._docs is None:
+            self._docs = self._produce(self._sort, self._skip, self._limit)
+        return self._docs
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        docs, start = self._results(), self._pos
+        self._pos = start + length if length else len(docs)
+        return docs[start:self._pos]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        docs = self._results()
+        if self._pos >= len(docs):
+            raise StopAsyncIteration
+        self._pos += 1
+        return docs[self._pos - 1]
+
+    async def close(self):
+        self._docs, self._pos = [], 0
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}  # _id -> document
+        self._order = {}  # _id -> insertion sequence (natural order)
+        self._sequence = itertools.count()
+        self._indexes = {}
+
+    # ---- indexes ----
+
+    async def create_index(self, keys, unique=False, name=None, **kwargs):
+        keys = _normalize_sort(keys, 1)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if name in self._indexes:
+            return name
+        if any(kind == "text" for _, kind in keys):
+            if any(isinstance(i, _TextIndex) for i in self._indexes.values()):
+                raise OperationFailure("only one text index per collection allowed", code=85)
+            index = _TextIndex(keys, kwargs.get("weights"))
+        else:
+            index = _Index(keys, unique)
+        for _id, doc in self._docs.items():
+            if index.conflict(_id, doc):
+                raise DuplicateKeyError(_duplicate_message(self, name, index, doc), 11000)
+            index.add(_id, doc)
+        self._indexes[name] = index
+        return name
+
+    async def index_information(self):
+        info = {"_id_": {"key": [("_id", 1)]}}
+        for name, index in self._indexes.items():
+            info[name] = {"key": list(index.keys), **({"unique": True} if index.unique else {})}
+        return info
+
+    async def drop_indexes(self):
+        self._indexes.clear()
+
+    async def drop(self):
+        await self.database.drop_collection(self.name)
+
+    def _candidates(self, query):
+        """Ids that may match: narrowed with an index when the query pins an indexed field, else all."""
+        fields = _equality_fields(query)
+        if "_id" in fields:
+            return [_hashable(v) for v in fields["_id"] if _hashable(v) in self._docs]
+        best, best_size = None, len(self._docs) + 1
+        for index in self._indexes.values():
+            values = fields.get(index.first)
+            if values is None:
+                continue
+            buckets = [index.prefix.get(_hashable(v), ()) for v in values]
+            size = sum(len(b) for b in buckets)
+            if size < best_size:
+                best, best_size = buckets, size
+        if best is None:
+            return list(self._docs)
+        ids = best[0] if len(best) == 1 else set().union(*best)
+        return sorted(ids, key=self._order.__getitem__)
+
+    def _find(self, query, scores=None):
+        query = query or {}
+        docs = self._docs
+        if "$text" in query:
+            query = dict(query)
+            search = query.pop("$text")["$search"]
+            index = next((i for i in self._indexes.values() if isinstance(i, _TextIndex)), None)
+            if index is None:
+                raise OperationFailure("text index required for $text query", code=27)
+            found = index.search(search, docs)
+            if scores is not None:
+                scores.update(found)
+            return [docs[i] for i in sorted(found, key=self._order.__getitem__) if matches(docs[i], query)]
+        return [docs[i] for i in self._candidates(query) if i in docs and matches(docs[i], query)]
+
+    def _check_unique(self, _id, doc):
+        for name, index in self._indexes.items():
+            if index.conflict(_id, doc):
+                raise DuplicateKeyError(_duplicate_message(self, name, index, doc), 11000,
+                                        {"index": 0, "code": 11000, "errmsg": _duplicate_message(self, name, index, doc)})
+
+    def _store(self, _id, doc, old=None):
+        if old is not None:
+            for index in self._indexes.values():
+                index.remove(_id, old)
+        try:
+            self._check_unique(_id, doc)
+        except DuplicateKeyError:
+            if old is not None:
+                for index in self._indexes.values():
+                    index.add(_id, old)
+            raise
+        self._docs[_id] = doc
+        if old is None:
+            self._order[_id] = next(self._sequence)
+        for index in self._indexes.values():
+            index.add(_id, doc)
+
+    def _delete(self, _id):
+        doc = self._docs.pop(_id)
+        del self._order[_id]
+        for index in self._indexes.values():
+            index.remove(_id, doc)
+        return doc
+
+    # ---- reads ----
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, batch_size=None, **kwargs):
+        check_query(filter)
+        check_projection(projection)
+
+        def produce(sort_spec, skip_n, limit_n):
+            scores = {}
+            docs = self._find(filter, scores)
+            if sort_spec:
+                sort_docs(docs, sort_spec, scores)
+            if skip_n:
+                docs = docs[skip_n:]
+            if limit_n:
+                docs = docs[:abs(limit_n)]
+            return [project(d, projection, scores.get(_hashable(d["_id"]))) for d in docs]
+
+        cursor = MemoryCursor(produce)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        await asyncio.sleep(0)
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        check_query(filter)
+        check_projection(projection)
+        doc = self._first(filter, sort)
+        return project(doc, projection) if doc is not None else None
+
+    def _first(self, filter, sort=None):
+        docs = self._find(filter)
+        if sort:
+            sort_docs(docs, _normalize_sort(sort))
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        n = len(self._find(filter)) if filter else len(self._docs)
+        n = max(0, n - skip)
+        return min(n, limit) if limit else n
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    async def distinct(self, key, filter=None, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        seen = {}
+        for doc in self._find(filter):
+            for value in _resolve(doc, key.split(".")):
+                for v in value if isinstance(value, list) else [value]:
+                    if v is not MISSING:
+                        seen.setdefault(_hashable(v), v)
+        return [_copy(v) for v in seen.values()]
+
+    def aggregate(self, pipeline, **kwargs):
+        check_pipeline(pipeline)
+        return MemoryCursor(lambda *_: self._run_pipeline(pipeline, [_copy(d) for d in self._find(self._leading_match(pipeline))]))
+
+    @staticmethod
+    def _leading_match(pipeline):
+        return pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else {}
+
+    def _run_pipeline(self, pipeline, docs):
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [d for d in docs if matches(d, spec)]
+            elif name == "$project":
+                docs = [_project_stage(d, spec) for d in docs]
+            elif name == "$addFields":
+                for d in docs:
+                    for k, expr in spec.items():
+                        value = evaluate(expr, d)
+                        if value is not MISSING:
+                            _set_path(d, k, _copy(value))
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = sort_docs(docs, _normalize_sort(spec))
+            elif name == "$facet":
+                docs = [{k: self._run_pipeline(sub, [_copy(d) for d in docs]) for k, sub in spec.items()}]
+            else:  # $lookup
+                docs = self._lookup(docs, spec)
+        return docs
+
+    def _lookup(self, docs, spec):
+        foreign = self.database[spec["from"]]
+        for d in docs:
+            local = _get(d, spec["localField"])
+            values = local if isinstance(local, list) else [_present(local)]
+            joined = foreign._find({spec["foreignField"]: {"$in": values}})
+            joined = [_copy(j) for j in joined]
+            if spec.get("pipeline"):
+                joined = foreign._run_pipeline(spec["pipeline"], joined)
+            d[spec["as"]] = joined
+        return docs
+
+    # ---- writes ----
+
+    def _insert(self, document):
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        doc = _copy(document)
+        _id = _hashable(doc["_id"])
+        if _id in self._docs:
+            message = f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{ _id: {doc['_id']!r} }}"
+            raise DuplicateKeyError(message, 11000, {"index": 0, "code": 11000, "errmsg": message})
+        self._store(_id, doc)
+        return document["_id"]
+
+    async def insert_one(self, document, **kwargs):
+        await asyncio.sleep(0)
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents, ordered=True, **kwargs):
+        await asyncio.sleep(0)
+        documents = list(documents)
+        inserted, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(self._bulk_result(nInserted=len(inserted), writeErrors=errors))
+        return InsertManyResult(inserted, True)
+
+    def _update(self, filter, update, multi=False, upsert=False, replacement=False):
+        """(matched, modified, upserted_id)"""
+        targets = self._find(filter)
+        if not multi:
+            targets = targets[:1]
+        modified = 0
+        for doc in targets:
+            _id = _hashable(doc["_id"])
+            if replacement:
+                new = {"_id": doc["_id"], **_copy({k: v for k, v in update.items() if k != "_id"})}
+                changed = not _equal(new, doc)
+            else:
+                # Only the top-level fields named in the update can change; copy just those
+                touched = {path.split(".", 1)[0] for spec in update.values() for path in spec}
+                new = dict(doc)
+                for k in touched & new.keys():
+                    new[k] = _copy(new[k])
+                apply_update(new, update)
+                changed = any(not _equal(new.get(k, MISSING), doc.get(k, MISSING)) or (k in new) != (k in doc) for k in touched)
+            if changed:
+                self._store(_id, new, old=doc)
+                modified += 1
+        if targets or not upsert:
+            return len(targets), modified, None
+        new = _upsert_seed(filter)
+        if replacement:
+            new.update(_copy(update))
+        else:
+            apply_update(new, update)
+        return 0, 0, self._insert(new)
+
+    @staticmethod
+    def _update_result(matched, modified, upserted_id):
+        raw = {"n": matched + (1 if upserted_id is not None else 0), "nModified": modified, "ok": 1.0}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter, update, upsert=False, **kwargs):
+        check_query(filter)
+        check_update(update)
+        await asyncio.sleep(0)
+        return self._update_result(*self._update(filter, update, upsert=upsert))
+
+    async def update_many(self, filter, update, upsert=False, **kwargs):
+        check_query(filter)
+        check_update(update)
+        await asyncio.sleep(0)
+        return self._update_result(*self._update(filter, update, multi=True, upsert=upsert))
+
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        return self._update_result(*self._update(filter, replacement, upsert=upsert, replacement=True))
+
+    async def delete_one(self, filter, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        doc = self._first(filter)
+        if doc is not None:
+            self._delete(_hashable(doc["_id"]))
+        return DeleteResult({"n": 0 if doc is None else 1, "ok": 1.0}, True)
+
+    async def delete_many(self, filter, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        docs = self._find(filter)
+        for doc in docs:
+            self._delete(_hashable(doc["_id"]))
+        return DeleteResult({"n": len(docs), "ok": 1.0}, True)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False, return_document=ReturnDocument.BEFORE, **kwargs):
+        check_query(filter)
+        check_update(update)
+        check_projection(projection)
+        await asyncio.sleep(0)
+        doc = self._first(filter, sort)
+        if doc is None:
+            if not upsert:
+                return None
+            _, _, upserted_id = self._update(filter, update, upsert=True)
+            return project(self._docs[_hashable(upserted_id)], projection) if return_document == ReturnDocument.AFTER else None
+        before = project(doc, projection)
+        self._update({"_id": doc["_id"]}, update)
+        return project(self._docs[_hashable(doc["_id"])], projection) if return_document == ReturnDocument.AFTER else before
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        check_query(filter)
+        await asyncio.sleep(0)
+        doc = self._first(filter, sort)
+        if doc is None:
+            return None
+        self._delete(_hashable(doc["_id"]))
+        return project(doc, projection)
+
+    @staticmethod
+    def _bulk_result(**counts):
+        return {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0, "nMatched": 0,
+                "nModified": 0, "nRemoved": 0, "upserted": [], **counts}
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        await asyncio.sleep(0)
+        recorder = _BulkRecorder()
+        for request in requests:
+            request._add_to_bulk(recorder)
+        for kind, args in recorder.ops:
+            check_query(args.get("selector"))
+            if kind == "update":
+                check_update(args["update"])
+        result = self._bulk_result()
+        for i, (kind, args) in enumerate(recorder.ops):
+            try:
+                if kind == "insert":
+                    self._insert(args["document"])
+                    result["nInserted"] += 1
+                elif kind == "delete":
+                    docs = self._find(args["selector"])[:args["limit"] or None]
+                    for doc in docs:
+                        self._delete(_hashable(doc["_id"]))
+                    result["nRemoved"] += len(docs)
+                else:
+                    matched, modified, upserted_id = self._update(
+                        args["selector"], args["update"], multi=args.get("multi", False),
+                        upsert=args.get("upsert", False), replacement=kind == "replace")
+                    result["nMatched"] += matched
+                    result["nModified"] += modified
+                    if upserted_id is not None:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": upserted_id})
+            except (DuplicateKeyError, WriteError) as e:
+                result["writeErrors"].append({"index": i, "code": e.code, "errmsg": str(e)})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+
+class _BulkRecorder:
+    """Receives PyMongo's write models (UpdateOne, InsertOne, ...) through their _add_to_bulk hook."""
+
+    def __init__(self):
+        self.ops = []
+
+    def add_insert(self, document):
+        self.ops.append(("insert", {"document": document}))
+
+    def add_update(self, selector, update, multi=False, upsert=False, **kwargs):
+        self.ops.append(("update", {"selector": selector, "update": update, "multi": multi, "upsert": upsert}))
+
+    def add_replace(self, selector, replacement, upsert=False, **kwargs):
+        self.ops.append(("replace", {"selector": selector, "update": replacement, "upsert": upsert}))
+
+    def add_delete(self, selector, limit, **kwargs):
+        self.ops.append(("delete", {"selector": selector, "limit": limit}))
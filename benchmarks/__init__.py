@@ -0,0 +1 @@
+"""Performance benchmarks for the StoryForge API. Run modules with `python -m benchmarks.<name>`."""
@@ -0,0 +1,201 @@
+"""Offline load benchmark for the hot API endpoints.
+
+Generates a synthetic studio in a dedicated local Mongo database, serves LLM calls from
+the `local` provider in backend/llm_providers.py, drives the app in-process over ASGI at a
+fixed concurrency and prints latency percentiles and throughput per scenario as JSON:
+
+    python -m benchmarks.run --projects 50 --shots 20000 --compilations 100000 \
+        --concurrency 8 --requests 200 --out bench.json
+
+The database name must contain "bench"; it is dropped before generating unless
+--reuse is given and it already holds data. `--storage memory` runs against the
+in-process engine (backend/storage.py) instead of MongoDB.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import synthetic
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SCENARIOS = ("list_projects", "dashboard_stats", "list_shots", "export", "batch_compile", "reorder")
+
+
+def load_server(args):
+    """Import backend/server.py against the benchmark database with the local LLM provider."""
+    os.environ.update({
+        "MONGO_URL": args.mongo_url, "DB_NAME": args.db, "STORAGE_ENGINE": args.storage, "LLM_PROVIDER": "local",
+        "LOCAL_LLM_LATENCY": args.llm_latency, "LOCAL_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "LOCAL_LLM_ERROR_RATE": str(args.llm_error_rate), "LOCAL_LLM_MALFORMED_RATE": str(args.llm_malformed_rate),
+        "LOCAL_LLM_SEED": str(args.seed),
+    })
+    os.environ.setdefault("GC_INTERVAL_SEC", "0")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    return server
+
+
+async def prepare(server, args):
+    db = server.db
+    if args.reuse and await db.projects.estimated_document_count():
+        return {"reused": True}
+    await server.client.drop_database(db.name)
+
+    started = time.perf_counter()
+    seed = await server.seed_example_project()
+    templates = await synthetic.load_templates(db, seed["project_id"])
+    await server.cascade_delete_project(seed["project_id"])
+    project_ids, counts = await synthetic.generate(db, templates, args.projects, args.shots, args.compilations, args.seed)
+    await server.create_indexes()
+    await server.rebuild_project_stats(project_ids)
+    return {"generate_s": round(time.perf_counter() - started, 2), **counts}
+
+
+async def load_shot_ids(db):
+    shot_ids = {}
+    async for s in db.shots.find({}, {"_id": 0, "id": 1, "project_id": 1}).sort("shot_number", 1):
+        shot_ids.setdefault(s["project_id"], []).append(s["id"])
+    return shot_ids
+
+
+def make_requests(shot_ids, rng, batch_size):
+    project_ids = list(shot_ids)
+
+    def list_projects():
+        return "GET", "/projects", None
+
+    def dashboard_stats():
+        return "GET", "/dashboard/stats", None
+
+    def list_shots():
+        return "GET", f"/projects/{rng.choice(project_ids)}/shots", None
+
+    def export():
+        return "GET", f"/projects/{rng.choice(project_ids)}/export", None
+
+    def batch_compile():
+        pid = rng.choice(project_ids)
+        ids = rng.sample(shot_ids[pid], min(batch_size, len(shot_ids[pid])))
+        return "POST", f"/projects/{pid}/batch-compile", {"shot_ids": ids, "force": True}
+
+    def reorder():
+        pid = rng.choice(project_ids)
+        ids = list(shot_ids[pid])
+        rng.shuffle(ids)
+        return "POST", f"/projects/{pid}/shots/reorder", {"shot_ids": ids}
+
+    return {
+        "list_projects": list_projects, "dashboard_stats": dashboard_stats, "list_shots": list_shots,
+        "export": export, "batch_compile": batch_compile, "reorder": reorder,
+    }
+
+
+def percentile(sorted_ms, p):
+    if not sorted_ms:
+        return None
+    return round(sorted_ms[min(len(sorted_ms) - 1, int(p / 100 * len(sorted_ms)))], 2)
+
+
+async def drive(client, make_request, total, concurrency, warmup):
+    for _ in range(warmup):
+        method, path, body = make_request()
+        await client.request(method, path, json=body)
+
+    latencies, errors = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        method, path, body = make_request()
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+                outcome = response.status_code if response.status_code >= 400 else None
+                if outcome is None and path.endswith("/batch-compile") and any("error" in r for r in response.json()["results"]):
+                    outcome = "shot_error"
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+        if outcome is not None:
+            errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total, "concurrency": concurrency, "errors": sum(errors.values()), "error_kinds": errors,
+        "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95), "p99_ms": percentile(latencies, 99),
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None, "elapsed_s": round(elapsed, 3),
+    }
+
+
+async def run(args):
+    server = load_server(args)
+    await server.app.router.startup()
+    try:
+        dataset = await prepare(server, args)
+        shot_ids = await load_shot_ids(server.db)
+        requests = make_requests(shot_ids, random.Random(args.seed), args.batch_size)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench/api", timeout=None) as client:
+            results = {}
+            for name in args.scenarios:
+                results[name] = await drive(client, requests[name], args.requests, args.concurrency, args.warmup)
+    finally:
+        await server.app.router.shutdown()
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "mongo_url")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "dataset": dataset,
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="storyforge_bench")
+    parser.add_argument("--storage", default="mongo", choices=("mongo", "memory"))
+    parser.add_argument("--reuse", action="store_true", help="keep existing benchmark data instead of regenerating it")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--shots", type=int, default=20000)
+    parser.add_argument("--compilations", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8, help="shots per batch_compile request")
+    parser.add_argument("--llm-latency", default="lognormal", choices=("fixed", "uniform", "exponential", "lognormal"))
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="local LLM latency (median for lognormal, else mean)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0)
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="also write the report to this file")
+    args = parser.parse_args()
+    if "bench" not in args.db:
+        parser.error("--db must contain 'bench' (the database is dropped before generating)")
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.out:
+        Path(args.out).write_text(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
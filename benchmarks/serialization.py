@@ -0,0 +1,92 @@
+"""Response serialization and compression: before/after for list_shots and export.
+
+Drives GET /projects/{id}/shots and GET /projects/{id}/export in-process over ASGI against a
+synthetic project (the same data and server setup as benchmarks/run.py), once per serializer
+and Accept-Encoding:
+
+Before: FastAPI's default path (jsonable_encoder + stdlib json via JSONResponse), uncompressed.
+After:  orjson straight from the Mongo documents (fast_json) plus gzip/brotli.
+
+    python -m benchmarks.serialization --storage memory --shots 2000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.run import load_server, prepare
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def default_json(content, response=None):
+    """The pre-fast_json response path, swapped in for server.fast_json to measure "before"."""
+    result = JSONResponse(jsonable_encoder(content))
+    if response is not None:
+        for key, value in response.headers.items():
+            if key != "content-length":
+                result.headers[key] = value
+    return result
+
+
+async def measure(client, path, encoding, repeat):
+    samples, wire_bytes = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(path, headers={"Accept-Encoding": encoding})
+        await response.aread()
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        wire_bytes = response.num_bytes_downloaded
+    return {"median_ms": round(statistics.median(samples), 2), "bytes": wire_bytes, "encoding": response.headers.get("content-encoding", "identity")}
+
+
+async def run(args):
+    server = load_server(args)
+    await server.app.router.startup()
+    fast_json = server.fast_json
+    try:
+        dataset = await prepare(server, args)
+        project_id = (await server.db.shots.find_one({}, {"_id": 0, "project_id": 1}))["project_id"]  # the generated project
+        paths = {"list_shots": f"/projects/{project_id}/shots", "export": f"/projects/{project_id}/export"}
+        report = {"dataset": dataset, "project_shots": await server.db.shots.count_documents({"project_id": project_id})}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench/api", timeout=None) as client:
+            for name, path in paths.items():
+                report[name] = {}
+                for mode, serializer, encodings in (("before", default_json, ("identity",)), ("after", fast_json, ENCODINGS)):
+                    server.fast_json = serializer
+                    for encoding in encodings:
+                        await client.get(path, headers={"Accept-Encoding": encoding})  # warm up
+                        report[name][f"{mode}_{encoding}"] = await measure(client, path, encoding, args.repeat)
+    finally:
+        server.fast_json = fast_json
+        await server.app.router.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="storyforge_bench")
+    parser.add_argument("--storage", default="memory", choices=("mongo", "memory"))
+    parser.add_argument("--shots", type=int, default=2000, help="shots in the measured project")
+    parser.add_argument("--compilations", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if "bench" not in args.db:
+        parser.error("--db must contain 'bench' (the database is dropped before generating)")
+    # prepare() and load_server() take benchmarks.run's options; only one project is generated
+    args.projects, args.reuse = 1, False
+    args.llm_latency, args.llm_latency_ms, args.llm_error_rate, args.llm_malformed_rate = "fixed", 0, 0, 0
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
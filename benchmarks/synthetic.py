@@ -0,0 +1,124 @@
+"""Synthetic large-project generator.
+
+Clones the documents created by POST /api/seed/example (projects, worlds, characters, scenes,
+shots) at a configurable scale, so the generated data keeps the seed's shapes as it evolves,
+and adds compilation history with the same fields compile_scene writes.
+"""
+import hashlib
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+INSERT_BATCH = 5000
+STAGES = ["concept", "world_built", "blocked", "generated", "audio_layered", "mixed", "final"]
+
+
+def _id():
+    return str(uuid.uuid4())
+
+
+def _ts(rng, days=30):
+    return (datetime.now(timezone.utc) - timedelta(seconds=rng.randint(0, days * 86400))).isoformat()
+
+
+async def load_templates(db, project_id):
+    query = {"project_id": project_id}
+    return {
+        "project": await db.projects.find_one({"id": project_id}, {"_id": 0}),
+        "worlds": await db.worlds.find(query, {"_id": 0}).to_list(None),
+        "characters": await db.characters.find(query, {"_id": 0}).to_list(None),
+        "scenes": await db.scenes.find(query, {"_id": 0}).sort("scene_number", 1).to_list(None),
+        "shots": await db.shots.find(query, {"_id": 0}).sort("shot_number", 1).to_list(None),
+    }
+
+
+class _Writer:
+    """Buffers documents per collection and writes them with insert_many in INSERT_BATCH chunks."""
+
+    def __init__(self, db):
+        self.db = db
+        self.buffers = {}
+        self.counts = {}
+
+    async def add(self, collection, doc):
+        buf = self.buffers.setdefault(collection, [])
+        buf.append(doc)
+        if len(buf) >= INSERT_BATCH:
+            await self.flush(collection)
+
+    async def flush(self, collection=None):
+        for name in [collection] if collection else list(self.buffers):
+            docs, self.buffers[name] = self.buffers.get(name, []), []
+            if docs:
+                await self.db[name].insert_many(docs, ordered=False)
+                self.counts[name] = self.counts.get(name, 0) + len(docs)
+
+
+def _compilation(rng, project_id, shot, scene):
+    description = shot["description"]
+    output = {
+        "image_prompt": f"Cinematic {shot['framing']} frame. {description} " * 3,
+        "video_prompt": f"{shot['camera_movement']} camera move over {shot['duration_target_sec']}s. {description}",
+        "audio_stack": {"sound_design": "ambient city hum, footsteps", "volume_layers": "BACKGROUND: traffic at -18dB | FOREGROUND: dialogue at -6dB",
+                        "spatial": "wide stereo", "narrative": scene.get("narrative_purpose", ""), "exclude": "music"},
+        "director_notes": "Hold on the subject for a beat before the move.",
+        "coherence_flags": [],
+        "continuity_notes": "Match lighting from the previous shot.",
+    }
+    wall_ms = int(rng.lognormvariate(8.3, 0.4))  # ~4s median, like the hosted model
+    return {
+        "id": _id(), "project_id": project_id, "shot_id": shot["id"], "timestamp": _ts(rng),
+        "input": {"project_id": project_id, "scene_description": description, "world_id": scene.get("world_id"),
+                  "character_ids": scene.get("character_ids", []), "emotional_zone": scene.get("emotional_zone", "contemplative"),
+                  "framing": shot["framing"], "camera_movement": shot["camera_movement"], "shot_id": shot["id"]},
+        "output": output,
+        "prompt_hash": hashlib.sha256(f"{shot['id']}{rng.random()}".encode()).hexdigest(),
+        "llm": {"operation": "compile", "provider": "openai", "model": "gpt-5.2", "prompt_chars": 2400 + len(description),
+                "response_chars": 1800, "wall_ms": wall_ms, "retries": 0, "outcome": "ok", "parse_ok": True},
+    }
+
+
+async def generate(db, templates, projects=50, shots=20000, compilations=100000, seed=7):
+    """Write `projects` projects sharing `shots` shots and `compilations` compilations. Returns the new project ids."""
+    rng = random.Random(seed)
+    writer = _Writer(db)
+    shots_per_scene = max(1, len(templates["shots"]) // max(1, len(templates["scenes"])))
+    project_ids = []
+
+    for p in range(projects):
+        pid = _id()
+        project_ids.append(pid)
+        now = _ts(rng, days=90)
+        await writer.add("projects", {**templates["project"], "id": pid, "name": f"Benchmark Project {p + 1}", "created_at": now, "updated_at": now})
+
+        world_ids = {}
+        for w in templates["worlds"]:
+            world_ids[w["id"]] = _id()
+            await writer.add("worlds", {**w, "id": world_ids[w["id"]], "project_id": pid})
+        char_ids = {}
+        for c in templates["characters"]:
+            char_ids[c["id"]] = _id()
+            await writer.add("characters", {**c, "id": char_ids[c["id"]], "project_id": pid})
+
+        n_shots = shots // projects + (1 if p < shots % projects else 0)
+        n_comps = compilations // projects + (1 if p < compilations % projects else 0)
+        project_shots = []
+        scene = None
+        for n in range(n_shots):
+            if n % shots_per_scene == 0:
+                t = templates["scenes"][(n // shots_per_scene) % len(templates["scenes"])]
+                scene = {**t, "id": _id(), "project_id": pid, "scene_number": n // shots_per_scene + 1,
+                         "world_id": world_ids.get(t.get("world_id")), "character_ids": [char_ids[c] for c in t.get("character_ids", []) if c in char_ids]}
+                await writer.add("scenes", scene)
+            t = templates["shots"][n % len(templates["shots"])]
+            shot = {**t, "id": _id(), "project_id": pid, "scene_id": scene["id"], "shot_number": n + 1,
+                    "description": f"{t['description']} (take {n + 1})", "production_status": rng.choice(STAGES), "created_at": now}
+            project_shots.append((shot, scene))
+            await writer.add("shots", shot)
+
+        for _ in range(n_comps if project_shots else 0):
+            shot, scene = rng.choice(project_shots)
+            await writer.add("compilations", _compilation(rng, pid, shot, scene))
+
+    await writer.flush()
+    return project_ids, writer.counts
@@ -11,6 +11,7 @@ export const projects = {
   update: (id, data) => api.put(`/projects/${id}`, data).then(r => r.data),
   delete: (id) => api.delete(`/projects/${id}`).then(r => r.data),
   export: (id) => api.get(`/projects/${id}/export`).then(r => r.data),
+  import: (data) => api.post('/projects/import', data).then(r => r.data),
 };
 
 export const worlds = {
@@ -46,24 +47,30 @@ export const scenes = {
 };
 
 export const shots = {
-  list: (pid, sceneId) => api.get(`/projects/${pid}/shots`, { params: sceneId ? { scene_id: sceneId } : {} }).then(r => r.data),
+  list: (pid, sceneId, params = {}) => api.get(`/projects/${pid}/shots`, { params: sceneId ? { ...params, scene_id: sceneId } : params }).then(r => r.data),
   get: (pid, id) => api.get(`/projects/${pid}/shots/${id}`).then(r => r.data),
   create: (pid, data) => api.post(`/projects/${pid}/shots`, data).then(r => r.data),
   update: (pid, id, data) => api.put(`/projects/${pid}/shots/${id}`, data).then(r => r.data),
   updateStatus: (pid, id, status) => api.patch(`/projects/${pid}/shots/${id}/status?status=${status}`).then(r => r.data),
   batchStatus: (pid, data) => api.post(`/projects/${pid}/shots/batch-status`, data).then(r => r.data),
   reorder: (pid, shotIds) => api.post(`/projects/${pid}/shots/reorder`, { shot_ids: shotIds }).then(r => r.data),
+  bulkUpdate: (pid, updates) => api.patch(`/projects/${pid}/shots/bulk`, { updates }).then(r => r.data),
   delete: (pid, id) => api.delete(`/projects/${pid}/shots/${id}`).then(r => r.data),
 };
 
 export const compiler = {
   compile: (pid, data) => api.post(`/projects/${pid}/compile`, data).then(r => r.data),
   batchCompile: (pid, shotIds) => api.post(`/projects/${pid}/batch-compile`, { shot_ids: shotIds }).then(r => r.data),
-  history: (pid, shotId) => api.get(`/projects/${pid}/compilations`, { params: shotId ? { shot_id: shotId } : {} }).then(r => r.data),
+  queueBatchCompile: (pid, shotIds) => api.post(`/projects/${pid}/batch-compile`, { shot_ids: shotIds, background: true }).then(r => r.data),
+  job: (jobId) => api.get(`/jobs/${jobId}`).then(r => r.data),
+  jobs: (pid) => api.get(`/projects/${pid}/jobs`).then(r => r.data),
+  usage: (pid, days = 30) => api.get(`/projects/${pid}/llm-usage`, { params: { days } }).then(r => r.data),
+  history: (pid, shotId) => api.get(`/projects/${pid}/compilations`, { params: shotId ? { shot_id: shotId, limit: 100 } : { limit: 100 } }).then(r => r.data),
 };
 
 export const notion = {
   push: (pid) => api.post(`/projects/${pid}/notion/push`).then(r => r.data),
+  pull: (pid) => api.post(`/projects/${pid}/notion/pull`).then(r => r.data),
 };
 
 export const imageDescribe = {
@@ -72,6 +79,11 @@ export const imageDescribe = {
 
 export const continuity = {
   chain: (pid) => api.get(`/projects/${pid}/continuity`).then(r => r.data),
+  gaps: (pid) => api.get(`/projects/${pid}/continuity/gaps`).then(r => r.data),
+};
+
+export const search = {
+  query: (pid, q, params = {}) => api.get(`/projects/${pid}/search`, { params: { q, ...params } }).then(r => r.data),
 };
 
 export const secrets = {
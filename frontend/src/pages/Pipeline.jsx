@@ -14,12 +14,14 @@ const STAGES = [
   { key: 'final', label: 'Final', color: 'border-emerald-500/30', dot: 'bg-emerald-500' },
 ];
 
+const SHOT_FIELDS = 'id,shot_number,scene_id,production_status,description,framing,camera_movement';
+
 export default function Pipeline({ projectId }) {
   const [allShots, setAllShots] = useState([]);
   const [sceneMap, setSceneMap] = useState({});
 
   const load = useCallback(async () => {
-    const [sh, sc] = await Promise.all([shotsApi.list(projectId), scenesApi.list(projectId)]);
+    const [sh, sc] = await Promise.all([shotsApi.list(projectId, undefined, { fields: SHOT_FIELDS }), scenesApi.list(projectId)]);
     setAllShots(sh);
     const sm = {};
     sc.forEach(s => { sm[s.id] = s; });
@@ -136,6 +136,7 @@ export default function ProjectSettings({ projectId, project, onUpdate }) {
               <option value="EMERGENT_LLM_KEY">EMERGENT_LLM_KEY</option>
               <option value="NOTION_API_KEY">NOTION_API_KEY</option>
               <option value="NOTION_DB_ID">NOTION_DB_ID</option>
+              <option value="LLM_PROVIDER">LLM_PROVIDER</option>
               <option value="CUSTOM_KEY">Custom Key</option>
             </select>
             <div className="flex-1 relative">
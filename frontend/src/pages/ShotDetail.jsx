@@ -10,8 +10,8 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { ScrollArea } from '@/components/ui/scroll-area';
 import { Save, Sparkles, Camera, Move, Clock, ArrowLeftRight, Trash2 } from 'lucide-react';
 
-const STAGES = ["concept", "world_built", "blocked", "generated", "audio_layered", "mixed", "final"];
-const FRAMINGS = ["extreme_wide", "wide", "medium_wide", "medium", "medium_close", "close", "extreme_close"];
+export const STAGES = ["concept", "world_built", "blocked", "generated", "audio_layered", "mixed", "final"];
+export const FRAMINGS = ["extreme_wide", "wide", "medium_wide", "medium", "medium_close", "close", "extreme_close"];
 const MOVEMENTS = ["static", "pan_left", "pan_right", "tilt_up", "tilt_down", "dolly_in", "dolly_out", "crane_up", "crane_down", "orbit", "handheld", "tracking"];
 const TRANSITIONS = ["cut", "dissolve", "match_cut", "smash_cut", "fade_to_black", "fade_from_black", "wipe", "continuous"];
 const STAGE_COLORS = {
@@ -12,7 +12,7 @@ import { DndContext, closestCenter, PointerSensor, useSensor, useSensors } from
 import { SortableContext, verticalListSortingStrategy, useSortable, arrayMove } from '@dnd-kit/sortable';
 import { CSS } from '@dnd-kit/utilities';
 import { Clapperboard, Clock, Camera, Move, ChevronDown, ChevronRight, Plus, Trash2, Sparkles, ArrowLeftRight, GripVertical, Loader2, Send, CheckSquare } from 'lucide-react';
-import ShotDetail from '@/pages/ShotDetail';
+import ShotDetail, { STAGES, FRAMINGS } from '@/pages/ShotDetail';
 
 const ZONE_COLORS = {
   intimate: 'bg-amber-500/10 text-amber-400', contemplative: 'bg-indigo-500/10 text-indigo-400',
@@ -165,6 +165,7 @@ export default function Storyboard({ projectId, onUpdate, onCompileShot }) {
   const [selectMode, setSelectMode] = useState(false);
   const [selectedIds, setSelectedIds] = useState([]);
   const [batchCompiling, setBatchCompiling] = useState(false);
+  const [bulkSaving, setBulkSaving] = useState(false);
   const [pushingNotion, setPushingNotion] = useState(false);
 
   const sensors = useSensors(useSensor(PointerSensor, { activationConstraint: { distance: 5 } }));
@@ -223,6 +224,18 @@ export default function Storyboard({ projectId, onUpdate, onCompileShot }) {
     setBatchCompiling(false);
   };
 
+  // One PATCH /shots/bulk for the whole selection instead of a request per shot
+  var handleBulkSet = async function(field, value) {
+    setBulkSaving(true);
+    try {
+      var result = await shotsApi.bulkUpdate(projectId, selectedIds.map(function(id) { var u = { id: id }; u[field] = value; return u; }));
+      var failed = result.results.filter(function(r) { return r.error; }).length;
+      toast.success((result.results.length - failed) + ' shots set to ' + value + (failed ? ' (' + failed + ' failed)' : ''));
+      load(); onUpdate();
+    } catch (e) { toast.error('Bulk update failed'); }
+    setBulkSaving(false);
+  };
+
   var handleNotionPush = async function() {
     setPushingNotion(true);
     try {
@@ -264,6 +277,18 @@ export default function Storyboard({ projectId, onUpdate, onCompileShot }) {
               Batch Compile ({selectedIds.length})
             </Button>
           )}
+          {selectMode && selectedIds.length > 0 && (
+            <Select value="" onValueChange={function(v) { handleBulkSet('production_status', v); }} disabled={bulkSaving}>
+              <SelectTrigger className="w-32 bg-black/50 border-zinc-700 font-mono text-[10px] h-7 rounded-sm" data-testid="bulk-status-select"><SelectValue placeholder="Set status" /></SelectTrigger>
+              <SelectContent className="bg-zinc-900 border-zinc-800">{STAGES.map(function(s) { return <SelectItem key={s} value={s} className="font-mono text-xs">{s}</SelectItem>; })}</SelectContent>
+            </Select>
+          )}
+          {selectMode && selectedIds.length > 0 && (
+            <Select value="" onValueChange={function(v) { handleBulkSet('framing', v); }} disabled={bulkSaving}>
+              <SelectTrigger className="w-32 bg-black/50 border-zinc-700 font-mono text-[10px] h-7 rounded-sm" data-testid="bulk-framing-select"><SelectValue placeholder="Set framing" /></SelectTrigger>
+              <SelectContent className="bg-zinc-900 border-zinc-800">{FRAMINGS.map(function(f) { return <SelectItem key={f} value={f} className="font-mono text-xs">{f}</SelectItem>; })}</SelectContent>
+            </Select>
+          )}
           <Button variant="outline" size="sm" onClick={handleNotionPush} disabled={pushingNotion}
             className="rounded-sm font-mono text-[10px] h-7 border-zinc-700 text-zinc-500 hover:text-cyan-400 hover:border-cyan-500/30" data-testid="notion-push-btn">
             {pushingNotion ? <Loader2 className="w-3 h-3 mr-1 animate-spin" /> : <Send className="w-3 h-3 mr-1" />}
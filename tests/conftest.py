@@ -0,0 +1,45 @@
+"""Runs the API in-process on the memory storage engine (backend/storage.py) with the local LLM provider.
+
+Each test gets an empty database and empty in-process caches.
+"""
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+os.environ.update({
+    "STORAGE_ENGINE": "memory", "LLM_PROVIDER": "local", "LOCAL_LLM_LATENCY": "fixed", "LOCAL_LLM_LATENCY_MS": "0",
+    "GC_INTERVAL_SEC": "0", "LLM_RETRY_BACKOFF_SEC": "0",
+})
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "storyforge_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def api(anyio_backend):
+    await server.client.drop_database(server.db.name)
+    for cache in (server.context_fragments, server.continuity_indexes, server.compile_cache, server.similarity_indexes):
+        cache.clear()
+    server.secrets_cache.invalidate()
+    await server.app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test/api") as client:
+            yield client
+    finally:
+        await server.app.router.shutdown()
+
+
+@pytest.fixture
+async def project_id(api):
+    """The project POST /seed/example creates."""
+    return (await api.post("/seed/example")).json()["project_id"]
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def shot_ids(api, project_id):
+    return [s["id"] for s in (await api.get(f"/projects/{project_id}/shots")).json()]
+
+
+async def test_background_job_records_each_shot_once(api, project_id):
+    ids = await shot_ids(api, project_id)
+    job = (await api.post(f"/projects/{project_id}/batch-compile", json={"shot_ids": ids, "background": True})).json()
+    for _ in range(200):
+        view = (await api.get(f"/jobs/{job['job_id']}")).json()
+        if view["status"] in ("completed", "failed"):
+            break
+        await asyncio.sleep(0.01)
+    assert view["status"] == "completed"
+    assert view["completed"] == view["total"] == len(ids)
+    assert sorted(r["shot_id"] for r in view["results"]) == sorted(ids)
+
+
+async def test_worker_that_lost_its_lease_records_nothing(api, project_id, monkeypatch):
+    bumped = []
+
+    async def record(pid):
+        bumped.append(pid)
+    monkeypatch.setattr(server, "bump_revision", record)
+    ids = await shot_ids(api, project_id)
+    job = {
+        "id": "job-1", "project_id": project_id, "status": "running", "shot_ids": ids, "total": len(ids),
+        "completed": 0, "failed": 0, "results": [], "lease_owner": "new-owner", "lease_expires_at": server._lease_deadline(),
+        "started_at": server.utcnow(), "concurrency": 2, "timeout_sec": 30, "force": True,
+    }
+    await server.db.compile_jobs.insert_one(dict(job))
+
+    await server.run_compile_job({**job, "lease_owner": "previous-owner"})
+
+    stored = await server.db.compile_jobs.find_one({"id": "job-1"}, {"_id": 0})
+    assert stored["results"] == [] and stored["completed"] == 0 and stored["status"] == "running"
+    assert bumped == []
+
+
+async def test_failing_lease_renewal_stops_the_worker(api, project_id, monkeypatch):
+    ids = await shot_ids(api, project_id)
+    jobs = server.db.compile_jobs
+    update_one = jobs.update_one
+
+    async def failing_renewal(query, update, **kwargs):
+        if list(update.get("$set", {})) == ["lease_expires_at"]:
+            raise ConnectionError("renewal failed")
+        return await update_one(query, update, **kwargs)
+
+    async def slow_compile(pid, sid, ctx, timeout_sec, force):
+        await asyncio.sleep(0.05)
+        return {"shot_id": sid, "status": "compiled"}
+    monkeypatch.setattr(jobs, "update_one", failing_renewal)
+    monkeypatch.setattr(server, "compile_batch_shot", slow_compile)
+    monkeypatch.setattr(server, "COMPILE_JOB_LEASE_SEC", 0.06)
+
+    job = (await api.post(f"/projects/{project_id}/batch-compile", json={"shot_ids": ids, "background": True, "concurrency": 1})).json()
+    await asyncio.sleep(0.6)
+
+    stored = await jobs.find_one({"id": job["job_id"]}, {"_id": 0})
+    assert stored["status"] == "running"
+    assert 0 < stored["completed"] < len(ids)
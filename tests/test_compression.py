@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import compression
+
+pytestmark = pytest.mark.anyio
+
+BODY = "storyboard " * 500
+
+
+def make_app():
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse(BODY))])
+    app.add_middleware(compression.CompressionMiddleware, minimum_size=1024)
+    return app
+
+
+async def get(app, accept):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get("/", headers={"Accept-Encoding": accept})
+
+
+async def test_gzip_fallback_without_brotli_warns_once(monkeypatch, caplog):
+    monkeypatch.setattr(compression, "brotli", None)
+    app = make_app()
+    for _ in range(2):
+        response = await get(app, "br, gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == BODY
+    warnings = [r for r in caplog.records if r.name == "compression" and "Brotli" in r.getMessage()]
+    assert len(warnings) == 1
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="Brotli not installed")
+async def test_brotli_preferred_when_installed():
+    response = await get(make_app(), "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == BODY  # httpx decodes brotli when the package is installed
+
+
+async def test_small_bodies_pass_through():
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(compression.CompressionMiddleware, minimum_size=1024)
+    response = await get(app, "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
@@ -0,0 +1,41 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_writes_from_another_worker_are_seen(api, project_id):
+    world = (await api.get(f"/projects/{project_id}/worlds")).json()[0]
+    character = (await api.get(f"/projects/{project_id}/characters")).json()[0]
+    version = await server.get_context_version(project_id)
+    assert world["name"] in await server.get_world_fragment(project_id, world["id"], version)
+    assert character["name"] in await server.get_character_fragments(project_id, [character["id"]], version)
+
+    # Another worker's handlers write straight to the database; this process's cache isn't invalidated
+    await server.db.worlds.update_one({"id": world["id"]}, {"$set": {"name": "Renamed World"}})
+    await server.db.characters.delete_one({"id": character["id"]})
+    await server.bump_context_version(project_id)
+
+    assert world["name"] in await server.get_world_fragment(project_id, world["id"], version)  # still cached
+    version = await server.get_context_version(project_id)
+    assert "Renamed World" in await server.get_world_fragment(project_id, world["id"], version)
+    assert await server.get_character_fragments(project_id, [character["id"]], version) == ""
+
+
+async def test_context_writes_bump_the_version(api, project_id):
+    world = (await api.get(f"/projects/{project_id}/worlds")).json()[0]
+    project = (await api.get(f"/projects/{project_id}")).json()
+    before = await server.get_context_version(project_id)
+
+    await api.put(f"/projects/{project_id}/worlds/{world['id']}", json={**world, "name": "Renamed World"})
+    await api.put(f"/projects/{project_id}", json={k: project[k] for k in ("name", "description")})
+    await api.put(f"/projects/{project_id}/shots/missing", json={"notes": "x"})  # not context
+    assert await server.get_context_version(project_id) == before + 2
+
+
+async def test_world_from_another_project_is_ignored(api, project_id):
+    world = (await api.get(f"/projects/{project_id}/worlds")).json()[0]
+    other = (await api.post("/projects", json={"name": "Other"})).json()["id"]
+    version = await server.get_context_version(other)
+    assert await server.get_world_fragment(other, world["id"], version) == ""
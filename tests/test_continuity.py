@@ -0,0 +1,48 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def chain(api, project_id):
+    return {e["shot_id"]: e for e in (await api.get(f"/projects/{project_id}/continuity")).json()}
+
+
+async def test_local_shot_edit_patches_cached_index(api, project_id):
+    first = next(iter(await chain(api, project_id)))
+    index = server.continuity_indexes.get(project_id)
+
+    await api.put(f"/projects/{project_id}/shots/{first}", json={"last_frame_url": "http://frames/end.png"})
+
+    assert (await chain(api, project_id))[first]["last_frame_url"] == "http://frames/end.png"
+    assert server.continuity_indexes.get(project_id) is index
+
+
+async def test_write_from_another_worker_is_seen_on_next_read(api, project_id):
+    first = next(iter(await chain(api, project_id)))
+
+    # Another worker: writes the shot, then its middleware bumps the revision
+    await server.db.shots.update_one({"id": first}, {"$set": {"first_frame_url": "http://frames/start.png"}})
+    await server.db.projects.update_one({"id": project_id}, {"$inc": {"revision": 1}})
+
+    assert (await chain(api, project_id))[first]["first_frame_url"] == "http://frames/start.png"
+
+
+async def test_load_overlapping_a_change_is_retried(api, project_id, monkeypatch):
+    shots = server.db.shots
+    find, loads = shots.find, []
+
+    def racing_find(*args, **kwargs):
+        loads.append(args)
+        if len(loads) == 1:
+            server.continuity_changed(project_id, removed=["some-shot"])  # a write landing mid-load
+        return find(*args, **kwargs)
+    monkeypatch.setattr(shots, "find", racing_find)
+
+    await chain(api, project_id)
+    assert len(loads) == 2
+    assert server.continuity_loads == {}
+
+    await api.delete(f"/projects/{project_id}")
+    assert server.continuity_loads == {}
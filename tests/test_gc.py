@@ -0,0 +1,27 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_gc_keeps_shots_with_unknown_scene(api, project_id):
+    shot = (await api.post(f"/projects/{project_id}/shots", json={"scene_id": "not-a-scene", "shot_number": 50})).json()
+    before = (await api.get(f"/projects/{project_id}")).json()["shot_count"]
+
+    report = (await api.post("/maintenance/gc")).json()
+
+    assert report["total"] == 0
+    assert (await api.get(f"/projects/{project_id}/shots/{shot['id']}")).status_code == 200
+    assert (await api.get(f"/projects/{project_id}")).json()["shot_count"] == before
+    assert (await api.post("/dashboard/stats/rebuild")).json()["drifted"] == []
+
+
+async def test_gc_collects_an_interrupted_project_delete(api, project_id):
+    await server.db.projects.delete_one({"id": project_id})  # cascade never ran
+
+    report = (await api.post("/maintenance/gc")).json()
+
+    assert report["freed"]["shots"] > 0
+    for collection in ("shots", "scenes", "worlds", "project_stats"):
+        assert await server.db[collection].count_documents({"project_id": project_id}) == 0
@@ -0,0 +1,26 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_fields_projection_keeps_id_and_sort_field(api, project_id):
+    shots = (await api.get(f"/projects/{project_id}/shots", params={"fields": "description"})).json()
+    assert shots and all(set(s) == {"id", "shot_number", "description"} for s in shots)
+
+
+@pytest.mark.parametrize("fields", ["_id,id", "$where", "camera.framing", "id,,_id "])
+async def test_fields_rejects_internal_and_nested_names(api, project_id, fields):
+    response = await api.get(f"/projects/{project_id}/shots", params={"fields": fields})
+    assert response.status_code == 400
+
+
+async def test_keyset_pagination_walks_every_shot(api, project_id):
+    everything = [s["id"] for s in (await api.get(f"/projects/{project_id}/shots")).json()]
+    seen, after = [], None
+    while True:
+        response = await api.get(f"/projects/{project_id}/shots", params={"limit": 4, **({"after": after} if after else {})})
+        seen += [s["id"] for s in response.json()]
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            break
+    assert seen == everything
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+import llm_providers
+
+pytestmark = pytest.mark.anyio
+
+PROMPT = 'Output JSON: {"image_prompt": "", "audio_stack": {"sound_design": ""}}'
+
+
+def test_provider_without_complete_cannot_be_instantiated():
+    class Incomplete(llm_providers.LLMProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+async def test_local_provider_is_deterministic_and_follows_the_template(anyio_backend):
+    provider = llm_providers.LocalProvider(latency="fixed", latency_ms=0)
+    kwargs = dict(operation="compile", provider="openai", model="m", system_message=PROMPT, text="a quiet street", api_key="", attempt=0)
+    first = await provider.complete(**kwargs)
+    assert first == await provider.complete(**kwargs)
+    assert set(json.loads(first)) == {"image_prompt", "audio_stack"}
+
+
+async def test_local_provider_error_rate(anyio_backend):
+    provider = llm_providers.LocalProvider(latency="fixed", latency_ms=0, error_rate=1.0)
+    with pytest.raises(llm_providers.LocalProviderError):
+        await provider.complete(operation="compile", provider="p", model="m", system_message=PROMPT, text="x", api_key="", attempt=0)
+
+
+def test_unknown_provider_name():
+    with pytest.raises(KeyError):
+        llm_providers.get_provider("nope")
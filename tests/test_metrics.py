@@ -0,0 +1,13 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_304_is_recorded_under_its_route(api, project_id):
+    tag = (await api.get(f"/projects/{project_id}")).headers["ETag"]
+    assert (await api.get(f"/projects/{project_id}", headers={"If-None-Match": tag})).status_code == 304
+    assert (await api.get("/no-such-route")).status_code == 404
+
+    metrics = (await api.get("/metrics")).text
+    assert 'storyforge_http_request_duration_seconds_count{method="GET",route="/api/projects/{project_id}",status="304"}' in metrics
+    assert 'route="unmatched",status="404"' in metrics
@@ -0,0 +1,175 @@
+"""Notion push/pull against an in-memory stand-in for the Notion database API (httpx.MockTransport)."""
+import functools
+import json
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import server
+from notion_sync import NotionClient, rich_text_value
+
+pytestmark = pytest.mark.anyio
+
+RATE = 10  # NOTION requests/second given to the client under test
+
+
+def text(value):
+    return {"rich_text": [{"text": {"content": value}}]}
+
+
+class FakeNotion:
+    """The database query and page endpoints NotionClient uses, backed by a dict.
+
+    `faults` holds (method, path suffix, response or exception) entries; the first request
+    matching an entry consumes it and gets that response instead.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.faults = []
+        self.clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def tick(self):
+        self.clock += timedelta(minutes=1)
+        return self.clock.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def add(self, properties):
+        page = {"id": str(uuid.uuid4()), "properties": properties, "last_edited_time": self.tick()}
+        self.pages[page["id"]] = page
+        return page
+
+    def sent(self, method, suffix):
+        return sum(1 for _, m, path in self.requests if m == method and path.endswith(suffix))
+
+    def shot_ids(self):
+        return [rich_text_value(p, "StoryForge ID") for p in self.pages.values() if rich_text_value(p, "StoryForge ID")]
+
+    async def __call__(self, request):
+        path = request.url.path
+        self.requests.append((time.monotonic(), request.method, path))
+        for i, (method, suffix, fault) in enumerate(self.faults):
+            if request.method == method and path.endswith(suffix):
+                del self.faults[i]
+                if isinstance(fault, Exception):
+                    raise fault
+                return fault
+        body = json.loads(request.content or b"{}")
+        if path.endswith("/query"):
+            cutoff = body.get("filter", {}).get("last_edited_time", {}).get("on_or_after", "")
+            matches = [p for p in self.pages.values() if p["last_edited_time"] >= cutoff]
+            start, size = int(body.get("start_cursor", 0)), body["page_size"]
+            has_more = start + size < len(matches)
+            return httpx.Response(200, json={"results": matches[start:start + size], "has_more": has_more, "next_cursor": str(start + size) if has_more else None})
+        if request.method == "POST" and path.endswith("/pages"):
+            return httpx.Response(200, json=self.add(body["properties"]))
+        page = self.pages.get(path.rsplit("/", 1)[-1])
+        if request.method == "PATCH" and page:
+            page["properties"].update(body["properties"])
+            page["last_edited_time"] = self.tick()
+            return httpx.Response(200, json=page)
+        return httpx.Response(404, json={"message": "Could not find page"})
+
+
+def assert_paced(requests, rate):
+    """No window of requests exceeds the token bucket's burst plus its refill over that window."""
+    times = sorted(t for t, _, _ in requests)
+    for i in range(len(times)):
+        for j in range(i + 1, len(times)):
+            assert j - i + 1 <= rate + (times[j] - times[i]) * rate + 1
+
+
+@pytest.fixture
+async def notion(api, monkeypatch):
+    fake = FakeNotion()
+    monkeypatch.setattr(server, "NotionClient", functools.partial(NotionClient, rate=RATE, backoff=0, transport=httpx.MockTransport(fake)))
+    for key, value in (("NOTION_API_KEY", "secret_test"), ("NOTION_DB_ID", "db")):
+        await api.put("/secrets", json={"key": key, "value": value})
+    return fake
+
+
+async def seed_shots(project_id):
+    return await server.db.shots.find({"project_id": project_id}, {"_id": 0}).sort("shot_number", 1).to_list(None)
+
+
+async def test_push_pages_through_the_database_without_duplicates(api, project_id, notion):
+    shots = await seed_shots(project_id)
+    for i in range(120):
+        notion.add({"Name": {"title": [{"text": {"content": f"Other project shot {i}"}}]}})
+    for shot in shots[:3]:
+        notion.add({"StoryForge ID": text(shot["id"])})
+    notion.faults.append(("POST", "/pages", httpx.Response(429, headers={"Retry-After": "0.05"}, json={"code": "rate_limited"})))
+
+    response = await api.post(f"/projects/{project_id}/notion/push")
+    assert response.status_code == 200
+    assert response.json() == {"status": "pushed", "created": len(shots) - 3, "updated": 3, "skipped": 0, "errors": 0, "total": len(shots)}
+
+    # The 3 matched pages sit past the first page of results, so a duplicate would mean pagination stopped early
+    assert notion.sent("POST", "/query") == 2
+    assert Counter(notion.shot_ids()) == Counter(s["id"] for s in shots)
+    assert notion.sent("POST", "/pages") == len(shots) - 3 + 1  # one retry after the 429
+    assert_paced(notion.requests, RATE)
+
+
+async def test_create_is_not_retried_on_server_error(api, project_id, notion):
+    shots = await seed_shots(project_id)
+    notion.faults.append(("POST", "/pages", httpx.Response(500, json={"code": "internal_server_error"})))
+
+    body = (await api.post(f"/projects/{project_id}/notion/push")).json()
+    assert (body["created"], body["errors"]) == (len(shots) - 1, 1)
+    assert notion.sent("POST", "/pages") == len(shots)
+    assert len(set(notion.shot_ids())) == len(notion.shot_ids()) == len(shots) - 1
+
+
+async def test_transport_errors_are_retried_then_reported(api, project_id, notion):
+    notion.faults.append(("POST", "/query", httpx.ConnectTimeout("timed out")))
+    assert (await api.post(f"/projects/{project_id}/notion/push")).status_code == 200
+
+    notion.faults.extend([("POST", "/query", httpx.ConnectError("refused"))] * 6)
+    response = await api.post(f"/projects/{project_id}/notion/push")
+    assert response.status_code == 502
+    assert "Notion query failed" in response.json()["detail"]
+
+
+async def test_unchanged_shots_are_not_pushed_again(api, project_id, notion):
+    shots = await seed_shots(project_id)
+    await api.post(f"/projects/{project_id}/notion/push")
+    writes = notion.sent("POST", "/pages") + notion.sent("PATCH", "")
+
+    body = (await api.post(f"/projects/{project_id}/notion/push")).json()
+    assert (body["skipped"], body["created"], body["updated"]) == (len(shots), 0, 0)
+    assert notion.sent("POST", "/pages") + notion.sent("PATCH", "") == writes
+
+    await api.put(f"/projects/{project_id}/shots/{shots[0]['id']}", json={"notes": "x", "framing": "close"})
+    body = (await api.post(f"/projects/{project_id}/notion/push")).json()
+    assert (body["updated"], body["skipped"]) == (1, len(shots) - 1)
+
+    body = (await api.post(f"/projects/{project_id}/notion/push", params={"force": "true"})).json()
+    assert body["updated"] == len(shots)
+    assert len(notion.shot_ids()) == len(shots)
+
+
+async def test_pull_applies_only_pages_edited_since_the_watermark(api, project_id, notion):
+    shots = await seed_shots(project_id)
+    await api.post(f"/projects/{project_id}/notion/push")
+    body = (await api.post(f"/projects/{project_id}/notion/pull")).json()
+    assert (body["fetched"], body["applied"]) == (len(shots), 0)
+
+    page = next(p for p in notion.pages.values() if rich_text_value(p, "StoryForge ID") == shots[0]["id"])
+    page["properties"]["Status"] = {"status": {"name": "Complete"}}
+    page["properties"]["Duration"] = {"number": 42}
+    page["last_edited_time"] = notion.tick()
+
+    body = (await api.post(f"/projects/{project_id}/notion/pull")).json()
+    # The edited page plus the one at the old watermark, which is re-read and changes nothing
+    assert (body["fetched"], body["matched"], body["applied"]) == (2, 2, 1)
+    assert body["watermark"] == page["last_edited_time"]
+    shot = (await api.get(f"/projects/{project_id}/shots/{shots[0]['id']}")).json()
+    assert (shot["production_status"], shot["duration_target_sec"]) == ("final", 42)
+
+    notion.faults.extend([("POST", "/query", httpx.ReadTimeout("timed out"))] * 6)
+    assert (await api.post(f"/projects/{project_id}/notion/pull")).status_code == 502
@@ -0,0 +1,59 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def etag(api, project_id):
+    return (await api.get(f"/projects/{project_id}")).headers["ETag"]
+
+
+async def test_unchanged_project_answers_304(api, project_id):
+    tag = await etag(api, project_id)
+    response = await api.get(f"/projects/{project_id}", headers={"If-None-Match": tag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag
+
+
+async def test_successful_write_bumps_revision(api, project_id):
+    tag = await etag(api, project_id)
+    assert (await api.put(f"/projects/{project_id}", json={"name": "Renamed"})).status_code == 200
+    assert await etag(api, project_id) != tag
+
+
+async def test_failed_and_non_write_requests_keep_revision(api, project_id):
+    tag = await etag(api, project_id)
+    assert (await api.put(f"/projects/{project_id}/shots/missing", json={"notes": "x"})).status_code == 404
+    assert (await api.post(f"/projects/{project_id}/shots/batch-status", json={"shot_ids": [], "status": "bogus"})).status_code == 400
+    await api.head(f"/projects/{project_id}")
+    await api.options(f"/projects/{project_id}")
+    assert await etag(api, project_id) == tag
+
+
+async def test_import_does_not_bump(api, project_id, monkeypatch):
+    exported = (await api.get(f"/projects/{project_id}/export")).json()
+    bumped = []
+
+    async def record(pid):
+        bumped.append(pid)
+    monkeypatch.setattr(server, "bump_revision", record)
+    assert (await api.post("/projects/import", json=exported)).status_code == 200
+    assert bumped == []
+
+
+async def test_failure_after_a_write_bumps_revision(api, project_id, monkeypatch):
+    async def fail(pid):
+        raise RuntimeError("failed after the update")
+    monkeypatch.setattr(server, "get_project", fail)
+    tag = await etag(api, project_id)
+    with pytest.raises(RuntimeError):
+        await api.put(f"/projects/{project_id}", json={"name": "Renamed"})
+    assert await etag(api, project_id) != tag
+
+    async def unavailable(pid):
+        raise server.HTTPException(503, "Unavailable")
+    monkeypatch.setattr(server, "get_project", unavailable)
+    tag = await etag(api, project_id)
+    assert (await api.put(f"/projects/{project_id}", json={"name": "Renamed again"})).status_code == 503
+    assert await etag(api, project_id) != tag
@@ -0,0 +1,29 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rollup_tracks_shot_writes(api, project_id):
+    scene_id = (await api.get(f"/projects/{project_id}/scenes")).json()[0]["id"]
+    before = (await api.get(f"/projects/{project_id}")).json()["shot_count"]
+    shot = (await api.post(f"/projects/{project_id}/shots", json={"scene_id": scene_id, "shot_number": 99})).json()
+    assert (await api.get(f"/projects/{project_id}")).json()["shot_count"] == before + 1
+    await api.delete(f"/projects/{project_id}/shots/{shot['id']}")
+    assert (await api.get(f"/projects/{project_id}")).json()["shot_count"] == before
+
+
+async def test_first_write_to_legacy_project_rebuilds_rollup(api, project_id):
+    # A project created before rollups existed has shots but no project_stats doc
+    shots = await server.db.shots.count_documents({"project_id": project_id})
+    await server.db.project_stats.delete_many({"project_id": project_id})
+    scene_id = (await api.get(f"/projects/{project_id}/scenes")).json()[0]["id"]
+
+    await api.post(f"/projects/{project_id}/shots", json={"scene_id": scene_id, "shot_number": 99, "production_status": "final"})
+
+    assert (await api.get(f"/projects/{project_id}")).json()["shot_count"] == shots + 1
+    dashboard = (await api.get("/dashboard/stats")).json()
+    assert dashboard["total_shots"] == shots + 1
+    rebuilt = (await api.post("/dashboard/stats/rebuild")).json()
+    assert rebuilt["drifted"] == []
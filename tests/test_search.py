@@ -0,0 +1,67 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+SHOT_TEXT = "The keeper climbs to the lighthouse, and there the lamps burn until dawn."
+
+
+@pytest.fixture
+async def docs(project_id):
+    await server.db.worlds.insert_one({"id": "w-light", "project_id": project_id, "name": "Lighthouse", "description": "A lighthouse on the cliff"})
+    await server.db.shots.insert_many([
+        {"id": "s-light", "project_id": project_id, "shot_number": 90, "description": SHOT_TEXT},
+        {"id": "s-long", "project_id": project_id, "shot_number": 91, "description": "Fog rolls in. " * 30 + "Far off, a lighthouse blinks."},
+    ])
+    return project_id
+
+
+async def search(api, project_id, **params):
+    response = await api.get(f"/projects/{project_id}/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_unknown_type_is_rejected(api, project_id):
+    response = await api.get(f"/projects/{project_id}/search", params={"q": "x", "types": "shot,scene"})
+    assert response.status_code == 400
+    assert "scene" in response.json()["detail"]
+
+
+async def test_types_filter(api, docs):
+    assert {r["type"] for r in (await search(api, docs, q="lighthouse"))["results"]} == {"world", "shot"}
+    body = await search(api, docs, q="lighthouse", types="shot")
+    assert body["types"] == ["shot"]
+    assert {r["id"] for r in body["results"]} == {"s-light", "s-long"}
+
+
+async def test_results_are_ranked_across_types(api, docs):
+    results = (await search(api, docs, q="lighthouse"))["results"]
+    assert results[0]["id"] == "w-light"  # a name match outweighs descriptions
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+    assert [r["id"] for r in (await search(api, docs, q="lighthouse", limit=1))["results"]] == ["w-light"]
+
+
+def highlighted(result):
+    return [result["snippet"][a:b] for a, b in result["highlights"]]
+
+
+async def test_highlights_skip_stop_words(api, docs):
+    shot = next(r for r in (await search(api, docs, q="the lighthouses", types="shot"))["results"] if r["id"] == "s-light")
+    assert (shot["field"], shot["snippet"]) == ("description", SHOT_TEXT)
+    assert highlighted(shot) == ["lighthouse"]  # neither "The" nor "there"
+
+    shot = (await search(api, docs, q='"keeper climbs" lamp', types="shot"))["results"][0]
+    assert highlighted(shot) == ["keeper climbs", "lamps"]
+
+
+async def test_highlight_offsets_in_a_trimmed_snippet(api, docs):
+    shot = next(r for r in (await search(api, docs, q="lighthouse", types="shot"))["results"] if r["id"] == "s-long")
+    assert shot["snippet"].startswith("…") and shot["snippet"].endswith("blinks.")
+    assert highlighted(shot) == ["lighthouse"]
+
+
+def test_negated_words_are_not_highlighted():
+    find = server.highlighter("keeper -lamps")
+    assert find("the keeper trims the lamps") == [(4, 10)]
@@ -0,0 +1,64 @@
+import pytest
+
+import server
+from similarity import SimilarityIndex
+
+pytestmark = pytest.mark.anyio
+
+SCENE = "Mito walks slowly across the rainy bridge at dusk, lantern in hand"
+REWORDED = "Mito walks slowly across the rainy bridge at dusk, a lantern in hand"
+
+
+async def compile_scene(api, project_id, world_id, description, **extra):
+    body = {"project_id": project_id, "world_id": world_id, "framing": "wide", "scene_description": description, **extra}
+    response = await api.post(f"/projects/{project_id}/compile", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+async def world(api, project_id):
+    return (await api.get(f"/projects/{project_id}/worlds")).json()[0]
+
+
+async def test_reworded_scene_reuses_earlier_compile(api, project_id, world):
+    first = await compile_scene(api, project_id, world["id"], SCENE)
+    reused = await compile_scene(api, project_id, world["id"], REWORDED, reuse_similar=True)
+    assert reused["cache_hit"] and reused["similar_to"] == first["compilation_id"]
+    assert reused["result"] == first["result"]
+
+
+async def test_no_reuse_without_opt_in_or_for_other_parameters(api, project_id, world):
+    await compile_scene(api, project_id, world["id"], SCENE)
+    assert not (await compile_scene(api, project_id, world["id"], REWORDED))["cache_hit"]
+    assert not (await compile_scene(api, project_id, world["id"], SCENE + " again", reuse_similar=True, framing="close"))["cache_hit"]
+
+
+async def test_context_edit_rules_out_reuse(api, project_id, world):
+    await compile_scene(api, project_id, world["id"], SCENE)
+    edited = {k: v for k, v in world.items() if k not in ("id", "project_id", "created_at", "updated_at")}
+    edited["description"] = "A neon-lit orbital station, all chrome and silence"
+    assert (await api.put(f"/projects/{project_id}/worlds/{world['id']}", json=edited)).status_code == 200
+
+    after = await compile_scene(api, project_id, world["id"], REWORDED, reuse_similar=True)
+    assert not after["cache_hit"]
+
+
+def test_index_scores_by_jaccard_within_matching_parameters():
+    index = SimilarityIndex()
+    index.add("a", {"scene_description": SCENE, "framing": "wide"}, "openai", "ctx", "2026-01-01")
+    assert index.closest({"scene_description": REWORDED, "framing": "wide"}, "openai", "ctx", 0.8)[0] == "a"
+    assert index.closest({"scene_description": REWORDED, "framing": "wide"}, "openai", "ctx", 0.95) is None
+    assert index.closest({"scene_description": SCENE, "framing": "wide"}, "openai", "other ctx", 0.5) is None
+    index.remove("a")
+    assert index.closest({"scene_description": SCENE, "framing": "wide"}, "openai", "ctx", 0.5) is None
+
+
+async def test_stale_candidates_are_skipped_until_a_fresh_one(api, project_id, world):
+    first = await compile_scene(api, project_id, world["id"], SCENE)
+    stale = [(await compile_scene(api, project_id, world["id"], f"{REWORDED}{suffix}"))["compilation_id"] for suffix in (".", "!", "?", " ...")]
+    await server.db.compilations.delete_many({"id": {"$in": stale}})
+
+    reused = await compile_scene(api, project_id, world["id"], REWORDED, reuse_similar=True)
+    assert reused["similar_to"] == first["compilation_id"]
+    assert set(server.similarity_indexes.get(project_id).entries) & set(stale) == set()
@@ -0,0 +1,237 @@
+"""The server's own queries, updates and pipelines against the memory engine (backend/storage.py).
+
+With STORAGE_TEST_MONGO_URL set, the `engine` tests also run against that MongoDB (in a
+throwaway database), so their expected values double as a parity check between the engines.
+"""
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import WriteError
+
+import server
+import storage
+
+pytestmark = pytest.mark.anyio
+
+ENGINES = ["memory"] + (["mongo"] if os.environ.get("STORAGE_TEST_MONGO_URL") else [])
+
+
+@pytest.fixture(params=ENGINES)
+async def engine(request, anyio_backend, monkeypatch):
+    """An empty database on the engine under test, with the server's indexes, swapped in as server.db."""
+    if request.param == "memory":
+        client = storage.MemoryClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ["STORAGE_TEST_MONGO_URL"])
+    db = client["storyforge_storage_test"]
+    await client.drop_database(db.name)
+    monkeypatch.setattr(server, "db", db)
+    await server.create_indexes()
+    try:
+        yield db
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+async def ids(cursor):
+    return sorted(d["id"] for d in await cursor.to_list(None))
+
+
+# Every operator, stage and accumulator server.py passes to the database; extend it with new call sites
+SERVER_OPERATORS = {
+    "$and", "$or", "$eq", "$ne", "$gt", "$gte", "$lt", "$in", "$nin", "$exists", "$size", "$text", "$search", "$meta",
+    "$set", "$inc", "$push", "$pull",
+    "$match", "$group", "$project", "$addFields", "$lookup", "$facet", "$sort",
+    "$sum", "$cond", "$ifNull", "$arrayElemAt", "$floor", "$multiply", "$subtract", "$substrBytes", "$toInt",
+}
+
+
+def test_server_uses_only_supported_operators():
+    supported = (storage.QUERY_OPERATORS | storage.LOGICAL_OPERATORS | storage.UPDATE_OPERATORS | storage.STAGES
+                 | storage.EXPRESSION_OPERATORS | storage.ACCUMULATORS | {"$text", "$search", "$meta"})
+    assert SERVER_OPERATORS - supported == set()
+
+
+async def test_collection_handles_survive_drops(engine):
+    shots = engine.shots
+    await shots.insert_one({"id": "a"})
+    await engine.client.drop_database(engine.name)
+    assert await shots.count_documents({}) == 0
+    await shots.insert_one({"id": "b"})
+    assert await ids(engine.shots.find({})) == ["b"]
+    await engine.drop_collection("shots")
+    assert "shots" not in await engine.list_collection_names()
+
+
+async def test_query_operators(engine):
+    await engine.shots.insert_many([
+        {"id": "a", "project_id": "p", "shot_number": 1, "tags": ["x", "y"], "cache_hit": True},
+        {"id": "b", "project_id": "p", "shot_number": 2, "tags": []},
+        {"id": "c", "project_id": "p", "shot_number": 2, "tags": ["y"], "scene_id": ""},
+        {"id": "d", "project_id": "q", "shot_number": 3, "scene_id": "s1"},
+    ])
+    keyset = {"$and": [{"project_id": "p"}, {"$or": [{"shot_number": {"$gt": 1}}, {"shot_number": 1, "id": {"$gt": "a"}}]}]}
+    cases = [
+        ({"cache_hit": {"$ne": True}}, ["b", "c", "d"]),
+        ({"tags": "y"}, ["a", "c"]),
+        ({"tags": {"$in": ["x", "z"]}}, ["a"]),
+        ({"tags": {"$size": 0}}, ["b"]),
+        ({"scene_id": {"$nin": [None, ""]}}, ["d"]),
+        ({"scene_id": {"$exists": True}}, ["c", "d"]),
+        ({"shot_number": {"$gte": 2, "$lt": 3}}, ["b", "c"]),
+        ({"shot_number": {"$gt": "1"}}, []),  # no comparisons across BSON types
+        ({"id": {"$in": ["a", "d"]}, "project_id": "p"}, ["a"]),
+        (keyset, ["b", "c"]),
+    ]
+    for query, expected in cases:
+        assert await ids(engine.shots.find(query)) == expected, query
+        assert await engine.shots.count_documents(query) == len(expected), query
+    assert sorted(await engine.shots.distinct("project_id", {"shot_number": {"$lt": 3}})) == ["p"]
+
+
+async def test_update_operators(engine):
+    await engine.shots.insert_many([{"id": "a", "project_id": "p"}, {"id": "b", "project_id": "p", "character_ids": ["c1", "c2"]}])
+
+    await engine.shots.update_one({"id": "a"}, {"$set": {"meta.status": "ok"}, "$inc": {"views": 2}})
+    assert await engine.shots.find_one({"id": "a"}, {"_id": 0, "meta": 1, "views": 1}) == {"meta": {"status": "ok"}, "views": 2}
+
+    result = await engine.shots.update_many({"character_ids": "c1"}, {"$pull": {"character_ids": "c1"}})
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    assert (await engine.shots.find_one({"id": "b"}))["character_ids"] == ["c2"]
+
+    # run_compile_job's idempotent result push
+    await engine.compile_jobs.insert_one({"id": "j", "results": [], "completed": 0})
+    for _ in range(2):
+        result = await engine.compile_jobs.update_one(
+            {"id": "j", "results.shot_id": {"$ne": "s1"}}, {"$push": {"results": {"shot_id": "s1"}}, "$inc": {"completed": 1}})
+    assert result.matched_count == 0
+    job = await engine.compile_jobs.find_one({"id": "j"}, {"_id": 0})
+    assert (job["results"], job["completed"]) == ([{"shot_id": "s1"}], 1)
+
+    result = await engine.secrets.update_one({"key": "k"}, {"$set": {"key": "k", "value": "v"}}, upsert=True)
+    assert result.upserted_id is not None
+    assert await engine.secrets.count_documents({"key": "k", "value": "v"}) == 1
+
+    await engine.projects.insert_one({"id": "p", "revision": 0})
+    bumped = await engine.projects.find_one_and_update(
+        {"id": "p"}, {"$inc": {"revision": 1}}, projection={"_id": 0, "revision": 1}, return_document=ReturnDocument.AFTER)
+    assert bumped == {"revision": 1}
+
+    result = await engine.shots.bulk_write([UpdateOne({"id": sid}, {"$set": {"shot_number": i + 1}}) for i, sid in enumerate("abz")], ordered=False)
+    assert (result.matched_count, result.modified_count) == (2, 2)
+
+
+async def test_shot_totals_match_the_shots(engine):
+    project_id = (await server.seed_example_project())["project_id"]
+    shots = await engine.shots.find({"project_id": project_id}, {"_id": 0}).to_list(None)
+
+    totals = (await server._shot_totals_by_project([project_id]))[project_id]
+    assert totals["shot_count"] == len(shots)
+    assert totals["total_duration"] == sum(s.get("duration_target_sec") or 0 for s in shots)
+    for stage, n in totals["stage_counts"].items():
+        assert n == sum(s.get("production_status") == stage for s in shots)
+    assert (await server.get_project_stats([project_id]))[project_id] == totals
+
+
+async def test_llm_usage_report(engine):
+    now = datetime.now(timezone.utc)
+    today, yesterday = now.isoformat(), (now - timedelta(days=1)).isoformat()
+    calls = [
+        ("m1", 40, "ok", True, today), ("m1", 10, "error", True, today),
+        ("m1", 30, "ok", False, yesterday), ("m2", 20, "ok", True, yesterday),
+        ("m1", 99, "ok", True, (now - timedelta(days=40)).isoformat()),  # outside the window
+    ]
+    await engine.llm_calls.insert_many([
+        {"project_id": "p", "provider": "local", "model": model, "operation": "compile", "wall_ms": wall_ms, "outcome": outcome,
+         "parse_ok": parse_ok, "retries": 1, "prompt_chars": 100, "response_chars": 10, "timestamp": timestamp}
+        for model, wall_ms, outcome, parse_ok, timestamp in calls
+    ])
+
+    report = await server.llm_usage("p", days=30)
+    assert report["totals"] == {"calls": 4, "errors": 1, "parse_failures": 1, "retries": 4, "prompt_chars": 400,
+                                "response_chars": 40, "wall_ms_total": 100, "p50_ms": 20, "p95_ms": 30}
+    assert [(g["model"], g["calls"], g["p50_ms"]) for g in report["by_model"]] == [("m1", 3, 30), ("m2", 1, 20)]
+    assert [(g["day"], g["model"], g["calls"]) for g in report["by_day"]] == [
+        (yesterday[:10], "m1", 1), (yesterday[:10], "m2", 1), (today[:10], "m1", 2)]
+
+
+async def test_find_orphans(engine):
+    await engine.projects.insert_one({"id": "p"})
+    await engine.scenes.insert_many([{"id": "s1", "project_id": "p"}, {"id": "s2", "project_id": "gone"}, {"id": "s3", "project_id": ""}])
+    orphans = await server.find_orphans("scenes", "project_id", "projects")
+    assert [o["project_id"] for o in orphans] == ["gone"]
+
+
+async def test_text_search(engine):
+    project_id = (await server.seed_example_project())["project_id"]
+    shot = await engine.shots.find_one({"project_id": project_id, "description": {"$nin": [None, ""]}}, {"_id": 0})
+    word = max(re.findall(r"[a-z]+", shot["description"].lower()), key=len)
+
+    found = await server.search_project(project_id, q=word, types="shot", limit=20)
+    assert shot["id"] in [r["id"] for r in found["results"]]
+    scores = [r["score"] for r in found["results"]]
+    assert scores == sorted(scores, reverse=True)
+    assert (await server.search_project(project_id, q=f"{word} -{word}", types="shot", limit=20))["results"] == []
+
+
+async def test_unsupported_operations_fail_before_touching_data():
+    db = storage.MemoryClient()["unsupported"]
+    await db.shots.insert_many([{"id": "a", "n": 1}, {"id": "b", "n": 2}])
+
+    with pytest.raises(NotImplementedError, match=r"\$regex"):
+        db.shots.find({"id": {"$regex": "a"}})
+    with pytest.raises(NotImplementedError, match="regular expression"):
+        db.shots.find({"id": re.compile("a")})
+    with pytest.raises(NotImplementedError, match=r"\$unwind"):
+        db.shots.aggregate([{"$match": {}}, {"$unwind": "$tags"}])
+    with pytest.raises(NotImplementedError, match=r"\$avg"):
+        db.shots.aggregate([{"$group": {"_id": None, "n": {"$avg": "$n"}}}])
+    with pytest.raises(NotImplementedError, match=r"\$\$ROOT"):
+        db.shots.aggregate([{"$project": {"doc": "$$ROOT"}}])
+    with pytest.raises(NotImplementedError, match=r"\$lookup"):
+        db.shots.aggregate([{"$lookup": {"from": "scenes", "let": {}, "pipeline": [], "as": "s"}}])
+    with pytest.raises(NotImplementedError, match=r"\$text"):
+        db.shots.aggregate([{"$match": {}}, {"$match": {"$text": {"$search": "x"}}}])
+    with pytest.raises(NotImplementedError, match="Projection"):
+        db.shots.find({}, {"score": {"$meta": "searchScore"}})
+    with pytest.raises(WriteError):
+        await db.shots.update_one({"id": "a"}, {"n": 5})
+
+    with pytest.raises(NotImplementedError, match=r"\$unset"):
+        await db.shots.update_many({}, {"$set": {"n": 0}, "$unset": {"id": ""}})
+    with pytest.raises(NotImplementedError, match=r"\$each"):
+        await db.shots.update_many({}, {"$push": {"tags": {"$each": ["x"]}}})
+    with pytest.raises(NotImplementedError, match=r"\$min"):
+        await db.shots.bulk_write([UpdateOne({"id": "a"}, {"$set": {"n": 0}}), UpdateOne({"id": "b"}, {"$min": {"n": 0}})])
+    assert await db.shots.find({}, {"_id": 0}).to_list(None) == [{"id": "a", "n": 1}, {"id": "b", "n": 2}]
+
+
+async def test_api_runs_on_the_memory_engine(api, project_id):
+    shots = (await api.get(f"/projects/{project_id}/shots")).json()
+    shot_ids = [s["id"] for s in shots]
+
+    exported = await api.get(f"/projects/{project_id}/export")
+    assert exported.status_code == 200
+    imported = await api.post("/projects/import", json=exported.json())
+    assert imported.status_code == 200, imported.text
+    dashboard = (await api.get("/dashboard/stats")).json()
+    assert (dashboard["project_count"], dashboard["total_shots"]) == (2, 2 * len(shots))
+
+    for path in ("llm-usage", "continuity/gaps", "search?q=scene"):
+        assert (await api.get(f"/projects/{project_id}/{path}")).status_code == 200, path
+
+    assert (await api.post(f"/projects/{project_id}/shots/batch-status", json={"shot_ids": shot_ids[:3], "status": "final"})).json()["modified"] == 3
+    bulk = await api.patch(f"/projects/{project_id}/shots/bulk", json={"updates": [{"id": shot_ids[3], "production_status": "mixed"}]})
+    assert bulk.json()["results"][0]["status"] == "updated"
+    assert (await api.post(f"/projects/{project_id}/shots/reorder", json={"shot_ids": shot_ids[::-1]})).status_code == 200
+    assert (await api.delete(f"/projects/{project_id}/shots/{shot_ids[0]}")).status_code == 200
+    assert (await api.post("/maintenance/gc")).status_code == 200
+
+    project = (await api.get(f"/projects/{project_id}")).json()
+    assert project["shot_count"] == len(shots) - 1
+    assert project["stage_counts"]["final"] == 2 and project["stage_counts"]["mixed"] == 1